@@ -36,6 +36,11 @@ uint8_t LY2 = 0;     // Left  Stick Y
 uint8_t RX2 = 0;     // Right Stick X
 uint8_t RY2 = 0;     // Right Stick Y
 
+// Sequence number of the last applied frame, echoed in acks once the host sends 16 nibble frames.
+uint8_t seq = 0;
+bool seq_mode = false;
+static const char hex_digits[] = "0123456789abcdef";
+
 // Use a circular buffer for the serial comms.
 volatile uint8_t buffer[256];
 volatile uint8_t buffer_head = 0;
@@ -49,7 +54,7 @@ ISR(USART1_RX_vect) {
 
 void Serial_Task(void) {
 	static uint8_t l = 0;
-	static uint8_t b[7];
+	static uint8_t b[8];
 
 	uint8_t val;
 	char c;
@@ -59,13 +64,16 @@ void Serial_Task(void) {
 		c = buffer[buffer_tail];
 
 		if ((c == '\r' || c == '\n')) {
-			if(l == 14) {
+			if(l == 14 || l == 16) {
 				HAT2 = b[0];
 				buttons = (b[1] << 8) | b[2];
 				LX2 = b[3];
 				LY2 = b[4];
 				RX2 = b[5];
 				RY2 = b[6];
+				// 16 nibbles means the host appended a sequence number.
+				seq_mode = (l == 16);
+				seq = b[7];
 			}
 			l=0;
 			memset(b, 0, sizeof(b));
@@ -84,9 +92,12 @@ void Serial_Task(void) {
 			if (val == 0xff) {
 				// ignore none-hex and line endings
 				;
-			} else {
+			} else if (l < 16) {
 				b[l/2] |= val << (4*((l+1)%2)); // hex 2 bin
 				l += 1;
+			} else {
+				// too long for any frame, discard the whole line.
+				l = 0xff;
 			}
 		}
 		buffer_tail++;
@@ -228,8 +239,14 @@ void HID_Task(void) {
 		Endpoint_Write_Stream_LE(&JoystickInputData, sizeof(JoystickInputData), NULL);
 		// We then send an IN packet on this endpoint.
 		Endpoint_ClearIN();
-		// Inform host that a packet was sent.
-		printf("U");
+		// Inform host that a packet was sent, and which frame it carried.
+		if (seq_mode) {
+			putchar('S');
+			putchar(hex_digits[seq >> 4]);
+			putchar(hex_digits[seq & 0xf]);
+		} else {
+			printf("U");
+		}
 
 		/* Clear the report data afterwards */
 		// memset(&JoystickInputData, 0, sizeof(JoystickInputData));
@@ -2,18 +2,40 @@
 
 
 import argparse
-from contextlib import contextmanager
+import itertools
+import sys
+from contextlib import contextmanager, ExitStack
 
 import sdl2
 import sdl2.ext
 import struct
 import binascii
-import serial
-import math
+import numpy as np
 import time
 
 from tqdm import tqdm
 
+from controller.switchcontroller.busdaemon import BusDaemon
+from controller.switchcontroller.clock import VirtualClock, default_clock
+from controller.switchcontroller.filters import build_filter
+from controller.switchcontroller.flightrecorder import FlightRecorder, read_flight
+from controller.switchcontroller.frames import FrameEncoder, pack_state, parse_buttons, parse_fields
+from controller.switchcontroller.idlemode import IdleMode
+from controller.switchcontroller.ingest import SocketIngest
+from controller.switchcontroller.inputstack import InputStack
+from controller.switchcontroller.lockstep import LockstepPlayer
+from controller.switchcontroller.macros import build_macro, macro_states
+from controller.switchcontroller.preroll import PreRoll
+from controller.switchcontroller.profiler import (NullStageTimers, Profiler, stage_ack, stage_display, stage_encode,
+                                                  stage_input, stage_record, stage_write)
+from controller.switchcontroller.remote import RemoteIngest, remote_send
+from controller.switchcontroller.seriallink import SerialWatchdog
+from controller.switchcontroller.sinks import Tee, add_sink
+from controller.switchcontroller.statebus import StateBus
+from controller.switchcontroller.timing import analyze_timing
+
+clock = default_clock()
+
 curses_available = False
 
 try:
@@ -44,7 +66,7 @@ class KeyboardContext(object):
         if curses_available:
             return self.stdscr.getch()
         else:
-            return curses.ERR
+            return -1
 
 
 def enumerate_controllers():
@@ -106,11 +128,36 @@ hatmapping = [
 
 hatcodes = [8, 0, 2, 1, 4, 8, 3, 8, 6, 7, 8, 8, 5, 8, 8]
 
-axis_deadzone = 10000
-trigger_deadzone = 0
+def benchmark_encoding(frames=100000):
+    import tracemalloc
+
+    states = [(n % 9, n & 0x3fff, n & 0xff, (n >> 2) & 0xff, 128, 128) for n in range(256)]
+    encoder = FrameEncoder()
+
+    def old(hat, buttons, lx, ly, rx, ry):
+        return binascii.hexlify(struct.pack('>BHBBBB', hat, buttons, lx, ly, rx, ry)) + b'\n'
+
+    for name, encode in (('pack + hexlify', old), ('FrameEncoder', encoder.encode)):
+        start = time.perf_counter()
+        for n in range(frames):
+            encode(*states[n & 0xff])
+        elapsed = time.perf_counter() - start
+
+        hat, buttons, lx, ly, rx, ry = states[1]
+        encode(hat, buttons, lx, ly, rx, ry)
+        loop = itertools.repeat(None, 1000)
+        # tracing starts after the first call, so only what the loop allocates counts.
+        tracemalloc.start()
+        for _ in loop:
+            encode(hat, buttons, lx, ly, rx, ry)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
 
+        print('{:s}: {:.0f} ns/frame, {:d} bytes allocated at peak.'.format(name, elapsed * 1e9 / frames, peak))
 
-def controller_states(controller_id):
+trigger_deadzone = 0
+
+def controller_states(controller_id, input_filter=None):
 
     sdl2.SDL_Init(sdl2.SDL_INIT_GAMECONTROLLER)
 
@@ -122,18 +169,41 @@ def controller_states(controller_id):
     except AttributeError:
         print('Using controller {:s} for input.'.format(controller_id))
 
-    while True:
-        buttons = sum([sdl2.SDL_GameControllerGetButton(controller, b)<<n for n,b in enumerate(buttonmapping)])
-        buttons |=  (abs(sdl2.SDL_GameControllerGetAxis(controller, sdl2.SDL_CONTROLLER_AXIS_TRIGGERLEFT)) > trigger_deadzone) << 6
-        buttons |=  (abs(sdl2.SDL_GameControllerGetAxis(controller, sdl2.SDL_CONTROLLER_AXIS_TRIGGERRIGHT)) > trigger_deadzone) << 7
-
-        hat = hatcodes[sum([sdl2.SDL_GameControllerGetButton(controller, b)<<n for n,b in enumerate(hatmapping)])]
+    if input_filter is None:
+        input_filter = build_filter()
 
-        rawaxis = [sdl2.SDL_GameControllerGetAxis(controller, n) for n in axismapping]
-        axis = [((0 if abs(x) < axis_deadzone else x) >> 8) + 128 for x in rawaxis]
+    encoder = FrameEncoder()
+    get_button = sdl2.SDL_GameControllerGetButton
+    get_axis = sdl2.SDL_GameControllerGetAxis
+    button_bits = tuple((1 << n, b) for n, b in enumerate(buttonmapping))
+    hat_bits = tuple((1 << n, b) for n, b in enumerate(hatmapping))
+    lx_axis, ly_axis, rx_axis, ry_axis = axismapping
+    poll = 0
 
-        rawbytes = struct.pack('>BHBBBB', hat, buttons, *axis)
-        yield binascii.hexlify(rawbytes) + b'\n'
+    while True:
+        buttons = 0
+        for bit, b in button_bits:
+            if get_button(controller, b):
+                buttons |= bit
+        if abs(get_axis(controller, sdl2.SDL_CONTROLLER_AXIS_TRIGGERLEFT)) > trigger_deadzone:
+            buttons |= 1 << 6
+        if abs(get_axis(controller, sdl2.SDL_CONTROLLER_AXIS_TRIGGERRIGHT)) > trigger_deadzone:
+            buttons |= 1 << 7
+
+        hat = 0
+        for bit, b in hat_bits:
+            if get_button(controller, b):
+                hat |= bit
+
+        state = pack_state(hatcodes[hat], buttons,
+                           (get_axis(controller, lx_axis) >> 8) + 128, (get_axis(controller, ly_axis) >> 8) + 128,
+                           (get_axis(controller, rx_axis) >> 8) + 128, (get_axis(controller, ry_axis) >> 8) + 128)
+        state = input_filter(state, poll)
+        stages.lap(stage_input)
+        message = encoder.encode_state(state)
+        stages.lap(stage_encode)
+        yield message
+        poll += 1
 
 
 def replay_states(filename):
@@ -190,140 +260,53 @@ def example_macro():
     #     {'buttons': buttons_dict['not_pressed']},
     # ]
 
-    hues = range(30)
-    vividities = range(15)
-    brightnesses = range(15)
-
-    switch_controller_input_sequence = []
-    # assume starting at the bottom left of h/v/b
-    for hue in hues:
-
-        for vividness in vividities:
-            # since we're starting in the bottom left, loop brightness first
-            # for brightness in brightnesses:
-            #     switch_controller_input_sequence.extend([
-            #         {'buttons': buttons_dict['not_pressed'], 'press_duration': 10},
-            #         {'buttons': buttons_dict['capture'], 'press_duration': 20},
-            #         {'buttons': buttons_dict['not_pressed'], 'press_duration': 10},
-            #         {'hat': hats_dict['dpad_right'], 'press_duration': 10},
-            #         {'hat': hats_dict['not-pressed'], 'press_duration': 10},
-            #     ])
-
-            # after looping through all brightnesses, bring the brightness cursor back to zero
-            for brightness in brightnesses:
-                switch_controller_input_sequence.extend([
-                    {'hat': hats_dict['dpad_left'], 'press_duration': 10},
-                    {'hat': hats_dict['not-pressed'], 'press_duration': 10},
-                ])
-
-            # hop up to vividness, go to the next one, hop back down
-            switch_controller_input_sequence.extend([
-                {'hat': hats_dict['dpad_up'], 'press_duration': 10},
-                {'hat': hats_dict['not-pressed'], 'press_duration': 10},
-                {'hat': hats_dict['dpad_right'], 'press_duration': 10},
-                {'hat': hats_dict['not-pressed'], 'press_duration': 10},
-                {'hat': hats_dict['dpad_down'], 'press_duration': 10},
-                {'hat': hats_dict['not-pressed'], 'press_duration': 10},
-            ])
-
-        # after looping through all the vividities
-        # first bring it back up to vividness
-        switch_controller_input_sequence.extend([
-            {'hat': hats_dict['dpad_up'], 'press_duration': 10},
-            {'hat': hats_dict['not-pressed'], 'press_duration': 10},
-        ])
-
-        # then bring the vividness cursor back to zero
-        for vividness in vividities:
-            switch_controller_input_sequence.extend([
-                {'hat': hats_dict['dpad_left'], 'press_duration': 10},
-                {'hat': hats_dict['not-pressed'], 'press_duration': 10},
-            ])
-
-        # hop up to hues, go to the next one, hop all the way back down to brightness
-        switch_controller_input_sequence.extend([
-            {'hat': hats_dict['dpad_up'], 'press_duration': 10},
-            {'hat': hats_dict['not-pressed'], 'press_duration': 10},
-            {'hat': hats_dict['dpad_right'], 'press_duration': 10},
-            {'hat': hats_dict['not-pressed'], 'press_duration': 10},
-            {'hat': hats_dict['dpad_down'], 'press_duration': 10},
-            {'hat': hats_dict['not-pressed'], 'press_duration': 10},
-            {'hat': hats_dict['dpad_down'], 'press_duration': 10},
-            {'hat': hats_dict['not-pressed'], 'press_duration': 10},
-        ])
-
-    lx = 128
-    ly = 128
-    rx = 128
-    ry = 128
-    hat = hats_dict['not-pressed']
-    buttons = buttons_dict['not_pressed']
-    press_duration = 50
-    for switch_controller_input in switch_controller_input_sequence:
-        if 'buttons' in switch_controller_input:
-            buttons = switch_controller_input['buttons']
-
-        if 'press_duration' in switch_controller_input:
-            press_duration = switch_controller_input['press_duration']
-
-        if 'hat' in switch_controller_input:
-            hat = switch_controller_input['hat']
-
-        rawbytes = struct.pack('>BHBBBB', hat, buttons, lx, ly, rx, ry)
-        for blarg in range(press_duration):
-            yield binascii.hexlify(rawbytes) + b'\n'
-
-
-class InputStack(object):
-    def __init__(self, recordfilename=None):
-        self.l = []
-        self.recordfilename = recordfilename
-        self.recordfile = None
-        self.macrofile = None
+    # assume starting at the bottom left of h/v/b.
+    # after looping through all brightnesses, bring the brightness cursor back to zero
+    brightness_back = np.tile([hats_dict['dpad_left'], hats_dict['not-pressed']], 15)
+    # hop up to vividness, go to the next one, hop back down
+    next_vividness = [hats_dict['dpad_up'], hats_dict['not-pressed'], hats_dict['dpad_right'], hats_dict['not-pressed'],
+                      hats_dict['dpad_down'], hats_dict['not-pressed']]
+    # then bring the vividness cursor back to zero, hop up to hues, go to the next one,
+    # and hop all the way back down to brightness
+    vividness_back = np.tile([hats_dict['dpad_left'], hats_dict['not-pressed']], 15)
+    next_hue = [hats_dict['dpad_up'], hats_dict['not-pressed'], hats_dict['dpad_right'], hats_dict['not-pressed'],
+                hats_dict['dpad_down'], hats_dict['not-pressed'], hats_dict['dpad_down'], hats_dict['not-pressed']]
 
-    def __enter__(self):
-        if self.recordfilename is not None:
-            self.recordfile = open(self.recordfilename, 'wb')
-        return self
+    per_hue = np.concatenate([
+        np.tile(np.concatenate([brightness_back, next_vividness]), 15),
+        [hats_dict['dpad_up'], hats_dict['not-pressed']],
+        vividness_back,
+        next_hue,
+    ])
+    hats = np.tile(per_hue, 30)
 
-    def __exit__(self, *args):
-        if self.recordfile is not None:
-            self.recordfile.close()
-        self.macro_end()
+    steps = len(hats)
+    return macro_states(build_macro(hats, np.full(steps, buttons_dict['not_pressed']), np.full((steps, 4), 128), np.full(steps, 10)))
 
-    def macro_start(self, filename):
-        if self.macrofile is None:
-            self.macrofile = open(filename, 'wb')
-        else:
-            print('ERROR: Already recording a macro.')
 
-    def macro_end(self):
-        if self.macrofile is not None:
-            self.macrofile.close()
-            self.macrofile = None
+def benchmark_macro():
+    start = time.perf_counter()
+    frames = sum(1 for message in example_macro())
+    elapsed = time.perf_counter() - start
+    print('example_macro: {:d} frames generated and streamed in {:.3f} s.'.format(frames, elapsed))
 
-    def push(self, it):
-        self.l.append(it)
+    steps = 1000000
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    table = build_macro(rng.integers(0, 9, steps), rng.integers(0, 1 << 14, steps),
+                        rng.integers(0, 256, (steps, 4)), rng.integers(1, 4, steps))
+    elapsed = time.perf_counter() - start
+    print('build_macro: {:d} steps, {:d} frames built in {:.3f} s.'.format(steps, len(table), elapsed))
 
-    def pop(self):
-        self.l.pop()
 
-    def __iter__(self):
-        return self
+def print_flight(filename):
+    for wall_ns, port, frame in read_flight(filename):
+        print('{:s}.{:06d} port {:d}: {:s}'.format(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(wall_ns // 1000000000)),
+                                                  wall_ns // 1000 % 1000000, port, frame.rstrip().decode('utf8', 'replace')))
 
-    def __next__(self):
-        while True:
-            try:
-                message = next(self.l[-1])
-                if self.recordfile is not None:
-                    self.recordfile.write(message)
-                if self.macrofile is not None:
-                    self.macrofile.write(message)
-                return message
-            except StopIteration:
-                self.l.pop()
-            except IndexError:
-                raise StopIteration
+
+# main loop stage timers, replaced by the profiler's with --profile stages.
+stages = NullStageTimers()
 
 
 if __name__ == '__main__':
@@ -334,18 +317,149 @@ if __name__ == '__main__':
     parser.add_argument('-b', '--baud-rate', type=int, default=115200, help='Baud rate. Default: 115200.')
     parser.add_argument('-p', '--port', type=str, default='/dev/ttyUSB0', help='Serial port. Default: /dev/ttyUSB0.')
     parser.add_argument('-R', '--record', type=str, default=None, help='Record events to file.')
+    parser.add_argument('-T', '--record-timing', type=str, default=None, help='Write write/ack timestamps of recorded frames to this sidecar file. Requires --record. Default: None.')
+    parser.add_argument('--analyze-timing', type=str, default=None, help='Report jitter, missed polls and poll rate from a timing sidecar, then exit.')
+    parser.add_argument('--flight-minutes', type=float, default=10, help='Minutes of sent frames the flight recorder keeps in memory. 0 disables it. Default: 10.')
+    parser.add_argument('--flight-file', type=str, default='flight-%Y%m%d-%H%M%S.bin', help='Where the flight recorder dumps to, on crash, SIGUSR1 or the f key. strftime codes are expanded. Default: flight-%%Y%%m%%d-%%H%%M%%S.bin.')
+    parser.add_argument('--read-flight', type=str, default=None, help='Print the frames in a flight recorder dump, then exit.')
     parser.add_argument('-P', '--playback', type=str, default=None, help='Play back events from file.')
+    parser.add_argument('-L', '--lockstep', type=str, action='append', default=[], help='Play --playback on this serial port too, in lockstep with --port. May be repeated.')
+    parser.add_argument('--lockstep-tolerance', type=int, default=2, help='In lockstep playback a board more than this many frames ahead of the slowest one holds its frame until the others catch up. Default: 2.')
     parser.add_argument('-d', '--dontexit', action='store_true', help='Switch to live input when playback finishes, instead of exiting. Default: False.')
     parser.add_argument('-q', '--quiet', action='store_true', help='Disable speed meter. Default: False.')
     parser.add_argument('-M', '--load-macros', type=str, default=None, help='Load in-line macro definition file. Default: None')
+    parser.add_argument('--ack-timeout', type=float, default=0.05, help='Seconds to wait for the board to ask for a frame before resyncing. Default: 0.05.')
+    parser.add_argument('--resync-attempts', type=int, default=3, help='Resyncs to try before checking that the serial port still exists and reopening it if not. Errors on the port reopen it at once. Default: 3.')
+    parser.add_argument('--sequenced', action='store_true', help='Number every frame and have the board echo the number, to measure frame loss and latency exactly. Needs the matching firmware. Default: False.')
+    parser.add_argument('--emulate', action='store_true', help='Talk to a built-in firmware emulator instead of a serial port. Default: False.')
+    parser.add_argument('--deadzone', type=int, default=39, help='Stick deadzone, out of 128. Stick values from 128-N up to but not including 128+N are centred. The default matches the old raw cutoff of 10000. Default: 39.')
+    parser.add_argument('--curve', type=float, default=1.0, help='Stick response exponent outside the deadzone. Above 1 gives finer control near the centre. Default: 1.0.')
+    parser.add_argument('--remap', type=str, default='', help='Comma separated button remaps like a=b,b=a. Default: none.')
+    parser.add_argument('--disable-buttons', type=str, default='', help='Comma separated buttons that are never sent, like home,capture. Default: none.')
+    parser.add_argument('--turbo', type=str, default='', help='Comma separated buttons that rapid-fire while held. Default: none.')
+    parser.add_argument('--turbo-period', type=int, default=4, help='Polls per turbo press and release cycle. Default: 4.')
+    parser.add_argument('--virtual-clock', action='store_true', help='With --emulate, run on virtual time so playback finishes as fast as possible. Default: False.')
+    parser.add_argument('-S', '--sink', type=str, action='append', default=[], help='Also send every frame to this sink: serial:PORT, file:PATH, unix:PATH, udp:HOST:PORT, bus:NAME:SLOT or null. Append @block, @drop or @latest to pick a backpressure policy. Default: @latest for serial and sockets, @block for files. May be repeated.')
+    parser.add_argument('--preroll', type=float, default=30, help='Seconds of sent frames to keep for the r (record from the past) and i (instant replay) keys. 0 disables it. Default: 30.')
+    parser.add_argument('--preroll-file', type=str, default='preroll-%Y%m%d-%H%M%S.txt', help='Where the r key records to. strftime codes are expanded. Default: preroll-%%Y%%m%%d-%%H%%M%%S.txt.')
+    parser.add_argument('--idle-after', type=float, default=0, help='Seconds of unchanged live input before the loop parks until the controller or keyboard wakes it. Not while recording with --record or keeping a --preroll, which need a frame for every poll. 0 disables it. Default: 0.')
+    parser.add_argument('--profile', type=str, choices=['cprofile', 'sample', 'stages'], default=None, help='Profile the main loop: cprofile runs cProfile, sample snapshots stacks from a timer thread, stages times input, encode, write, ack wait, record and display. The summary is written on exit. Default: None.')
+    parser.add_argument('--profile-frames', type=int, default=10000, help='Frames to profile before exiting. 0 profiles until exit. Default: 10000.')
+    parser.add_argument('--profile-output', type=str, default=None, help='Write the profile summary to this file instead of the console. Default: None.')
+    parser.add_argument('--profile-interval', type=float, default=0.001, help='Seconds between stack samples with --profile sample. Default: 0.001.')
+    parser.add_argument('--bus', type=str, default=None, help='Create a shared memory StateBus with this name and run as its output daemon, sending each slot to a serial port. Default: None.')
+    parser.add_argument('--bus-port', type=str, action='append', default=[], help='SLOT:PORT pair for --bus. May be repeated. Default: slot 0 on --port.')
+    parser.add_argument('--bus-slots', type=int, default=4, help='Slots in the StateBus created by --bus. Default: 4.')
+    parser.add_argument('--benchmark-encoding', action='store_true', help='Compare frame encoding speed and allocations, then exit.')
+    parser.add_argument('--benchmark-macro', action='store_true', help='Time macro frame table generation, then exit.')
+    parser.add_argument('-I', '--ingest', type=str, default=None, help='Accept raw 7-byte states from other processes on this UNIX datagram socket path. Default: None.')
+    parser.add_argument('--ingest-priority', type=int, default=1, help='InputStack priority of the ingest socket. Live input and playback use 0. Default: 1.')
+    parser.add_argument('--ingest-fields', type=str, default='all', help='Fields the ingest socket controls: all, hat, buttons, lstick, rstick or button names, comma separated. The rest comes from lower priority input. Default: all.')
+    parser.add_argument('--macro-fields', type=str, default='all', help='Fields macros and instant replays control, like --ingest-fields. buttons,hat lets a macro press buttons while you keep the sticks. Default: all.')
+    parser.add_argument('--remote-listen', type=str, default=None, help='Accept remote play from remote_send senders on this UDP [HOST:]PORT. Default: None.')
+    parser.add_argument('--remote-priority', type=int, default=1, help='InputStack priority of remote play. Default: 1.')
+    parser.add_argument('--remote-hold', type=float, default=0.5, help='Seconds without remote packets before remote play defers to other input. Default: 0.5.')
+    parser.add_argument('--remote-max-depth', type=int, default=16, help='Most frames the remote play jitter buffer may hold back. Default: 16.')
+    parser.add_argument('--remote-send', type=str, default=None, help='Send --playback, or live input, to a --remote-listen bridge at HOST:PORT instead of a board. Default: None.')
+    parser.add_argument('--remote-rate', type=float, default=125, help='Frames per second sent by --remote-send. Default: 125.')
+    parser.add_argument('--remote-redundancy', type=int, default=3, help='Earlier frames repeated in every --remote-send packet, to ride out packet loss. Default: 3.')
+    parser.add_argument('--remote-loss', type=float, default=0, help='Fraction of --remote-send packets to drop on purpose, for testing. Default: 0.')
+    parser.add_argument('--remote-jitter', type=float, default=0, help='Delay --remote-send packets by up to this many seconds on purpose, for testing. Default: 0.')
+    parser.add_argument('--ingest-hold', type=float, default=0.5, help='Seconds to hold the last ingested state before deferring to other input. Default: 0.5.')
 
     args = parser.parse_args()
 
+    if args.record_timing is not None and args.record is None:
+        parser.error('--record-timing requires --record.')
+
+    if args.virtual_clock:
+        if not args.emulate:
+            parser.error('--virtual-clock requires --emulate.')
+        clock = VirtualClock()
+
+    if args.benchmark_encoding:
+        benchmark_encoding()
+        exit(0)
+
+    if args.benchmark_macro:
+        benchmark_macro()
+        exit(0)
+
+    if args.analyze_timing is not None:
+        analyze_timing(args.analyze_timing)
+        exit(0)
+
+    if args.read_flight is not None:
+        print_flight(args.read_flight)
+        exit(0)
+
+    recorder = None
+    if args.flight_minutes > 0:
+        # ports are numbered 0 for --port, then each --lockstep port in order.
+        recorder = FlightRecorder(args.flight_minutes * 60, path=args.flight_file, clock=clock)
+        recorder.install()
+
     if args.list_controllers:
         sdl2.SDL_Init(sdl2.SDL_INIT_GAMECONTROLLER)
         enumerate_controllers()
         exit(0)
 
+    # live input is filtered the same way whether it goes to a board or to a remote bridge.
+    remap = {}
+    for pair in args.remap.split(','):
+        if pair:
+            src, dst = pair.split('=')
+            remap[parse_buttons(src)] = parse_buttons(dst)
+    input_filter = build_filter(remap, 0xffff & ~parse_buttons(args.disable_buttons), args.deadzone,
+                                args.curve, parse_buttons(args.turbo), args.turbo_period)
+
+    if args.lockstep:
+        if args.playback is None:
+            parser.error('--lockstep requires --playback.')
+        if args.sequenced or args.emulate:
+            parser.error('--lockstep works with plain serial ports only.')
+        if args.lockstep_tolerance < 0:
+            parser.error('--lockstep-tolerance must not be negative.')
+        with ExitStack() as links:
+            player = LockstepPlayer(args.playback, [
+                links.enter_context(SerialWatchdog(port, args.baud_rate, args.ack_timeout, args.resync_attempts, clock=clock))
+                for port in [args.port] + args.lockstep], args.lockstep_tolerance, recorder, clock=clock)
+            try:
+                player.run()
+            except KeyboardInterrupt:
+                print('\nExiting due to keyboard interrupt.')
+            player.print_stats()
+        exit(0)
+
+    if args.remote_send is not None:
+        host, _, port = args.remote_send.rpartition(':')
+        if args.playback is not None:
+            frames = replay_states(args.playback)
+        else:
+            frames = controller_states(args.controller, input_filter)
+        try:
+            remote_send((host, int(port)), frames, args.remote_rate, args.remote_redundancy, args.remote_loss,
+                        args.remote_jitter, pump=sdl2.SDL_PumpEvents if args.playback is None else None, clock=clock)
+        except KeyboardInterrupt:
+            print('\nExiting due to keyboard interrupt.')
+        exit(0)
+
+    if args.bus is not None:
+        if args.sequenced or args.emulate:
+            parser.error('--bus works with plain serial ports only.')
+        ports = [spec.split(':', 1) for spec in args.bus_port] or [('0', args.port)]
+        with StateBus(args.bus, args.bus_slots, create=True) as bus, ExitStack() as links:
+            daemon = BusDaemon(bus, [
+                links.enter_context(SerialWatchdog(port, args.baud_rate, args.ack_timeout, args.resync_attempts, clock=clock))
+                for slot, port in ports], [int(slot) for slot, port in ports], recorder, clock=clock)
+            print('Serving StateBus {:s} with {:d} slots.'.format(args.bus, bus.slots))
+            try:
+                daemon.run(args.quiet)
+            except KeyboardInterrupt:
+                print('\nExiting due to keyboard interrupt.')
+            daemon.print_stats()
+        exit(0)
+
     macros = {
         'c': example_macro()
     }
@@ -356,20 +470,48 @@ if __name__ == '__main__':
     #             if len(line) == 2:
     #                 macros[line[0]] = line[1]
 
-    with KeyboardContext() as kb:
+    with KeyboardContext() as kb, SerialWatchdog(args.port, args.baud_rate, args.ack_timeout, args.resync_attempts,
+                                                         sequenced=args.sequenced, emulate=args.emulate, clock=clock) as link:
 
-        ser = serial.Serial(args.port, args.baud_rate, bytesize=serial.EIGHTBITS, parity=serial.PARITY_NONE, stopbits=serial.STOPBITS_ONE, timeout=None)
-        print('Using {:s} at {:d} baud for comms.'.format(args.port, args.baud_rate))
+        with Tee() as tee, InputStack(tee, args.record, args.record_timing) as input_stack, ExitStack() as resources:
 
-        with InputStack(args.record) as input_stack:
+            tee.add(link, args.port)
+            preroll = None
+            if args.preroll > 0:
+                preroll = PreRoll(args.preroll)
+                tee.add(preroll, 'pre-roll')
+            for spec in args.sink:
+                add_sink(tee, spec, args.baud_rate)
 
             if args.playback is None or args.dontexit:
-                live = controller_states(args.controller)
+                live = controller_states(args.controller, input_filter)
                 next(live)
-                input_stack.push(live)
+                live_source = input_stack.push(live)
+            playback = None
             if args.playback is not None:
-                input_stack.push(replay_states(args.playback))
-
+                playback = input_stack.push(replay_states(args.playback))
+            if args.ingest is not None:
+                ingest = resources.enter_context(SocketIngest(args.ingest, args.ingest_hold, clock=clock))
+                input_stack.push(ingest.states(), args.ingest_priority, parse_fields(args.ingest_fields))
+            if args.remote_listen is not None:
+                host, _, port = args.remote_listen.rpartition(':')
+                remote = resources.enter_context(RemoteIngest((host or '0.0.0.0', int(port)), args.remote_hold,
+                                                              max_depth=args.remote_max_depth, clock=clock))
+                input_stack.push(remote.states(), args.remote_priority)
+            macro_fields = parse_fields(args.macro_fields)
+
+            idle = None
+            if args.idle_after > 0 and (args.playback is None or args.dontexit):
+                if args.record is not None or preroll is not None:
+                    # recordings and the pre-roll hold a frame per poll, parking would cut the idle stretches out.
+                    print('Not parking when idle while recording or keeping a pre-roll.')
+                else:
+                    idle = IdleMode(args.idle_after, clock=clock, stdin=sys.stdin if curses_available else None)
+
+            profiler = resources.enter_context(Profiler(args.profile, args.profile_frames, args.profile_output, args.profile_interval))
+            stages = profiler.stages
+
+            shown = bytearray()
             with tqdm(unit=' updates', disable=args.quiet) as pbar:
                 try:
 
@@ -383,14 +525,31 @@ if __name__ == '__main__':
                             if event.type == sdl2.SDL_JOYBUTTONDOWN:
                                # if we click in the left stick
                                if event.jbutton.button == 11:
-                                   input_stack.push(example_macro())
+                                   input_stack.push(example_macro(), mask=macro_fields)
                             # or play from file:
                             #        input_stack.push(replay_states(filename))
 
                             pass
 
-                        try:
-                            c = chr(kb.getch())
+                        key = kb.getch()
+                        if key >= 0:
+                            c = chr(key)
+
+                            if c == 'f' and recorder is not None:
+                                recorder.dump()
+                            elif c == 'r' and preroll is not None:
+                                # first press records from the start of the pre-roll, second press stops.
+                                if input_stack.macrosink is None:
+                                    input_stack.macro_start(time.strftime(args.preroll_file), preroll)
+                                else:
+                                    input_stack.macro_end()
+                            elif c == 'i' and preroll is not None:
+                                input_stack.push(preroll.replay(), mask=macro_fields)
+                            elif c == 'p' and playback is not None:
+                                if playback.paused:
+                                    input_stack.resume(playback)
+                                else:
+                                    input_stack.pause(playback)
 
                             # if c in macros:
                             #     input_stack.push(macros[c])
@@ -399,26 +558,42 @@ if __name__ == '__main__':
                             #     input_stack.macro_start(macros[c.lower()])
                             # elif c == ' ':
                             #     input_stack.macro_end()
-                        except ValueError:
-                            pass
 
                         try:
                             message = next(input_stack)
-                            ser.write(message)
+                            stages.lap(stage_input)
+                            write_ns = clock.monotonic_ns()
+                            tee.write(message)
+                            stages.lap(stage_write)
+                            if recorder is not None:
+                                recorder.record(0, message)
+                                stages.lap(stage_record)
                         except StopIteration:
                             break
 
-                        # update speed meter on console.
-                        pbar.set_description('Sent {:s}'.format(message[:-1].decode('utf8')))
+                        # update speed meter on console, only formatting the frame when it changes.
+                        if message != shown:
+                            shown[:] = message
+                            pbar.set_description('Sent {:s}'.format(shown[:-1].decode('utf8')))
                         pbar.update()
+                        stages.lap(stage_display)
+
+                        # wait for the arduino to request another state.
+                        link.wait_ack()
+                        stages.lap(stage_ack)
+                        input_stack.record_timing(write_ns, clock.monotonic_ns())
+                        stages.lap(stage_record)
 
-                        while True:
-                            # wait for the arduino to request another state.
-                            response = ser.read(1)
-                            if response == b'U':
-                                break
-                            elif response == b'X':
-                                print('Arduino reported buffer overrun.')
+                        if profiler.count():
+                            break
+
+                        # only live input can be parked, anything else has frames to play out.
+                        if idle is not None and len(input_stack.l) == 1 and input_stack.l[0] is live_source \
+                                and idle.unchanged(message):
+                            idle.park(link)
 
                 except KeyboardInterrupt:
                     print('\nExiting due to keyboard interrupt.')
+
+            if idle is not None:
+                idle.print_stats()
@@ -4,6 +4,9 @@
 import time
 from evdev import InputDevice, categorize, ecodes
 import serial
+from switchcontroller.clock import default_clock
+
+clock = default_clock()
 
 dev = InputDevice('/dev/input/event8')
 
@@ -27,11 +30,11 @@ print(dev)
 
 previousCommand = "800000000000000 126 126 126 126"
 
-#start = time.time()
+#start = clock.monotonic()
 recordFlag = False
 playFlag = False
 
-startPlay = time.time()
+startPlay = clock.monotonic()
 lineRead = file.readline()
 lineTime = float(file.readline())
 
@@ -39,16 +42,19 @@ while True:
 #    stringCommand = ''.join(str(x) for x in command) + " " + str(lx) + " " + str(ly) + " " + str(rx) + " " + str(ry)
 
 
-    nowPlay = time.time()
-    if (nowPlay-startPlay>lineTime):
-        print(lineRead)
-        ser.write('%s'.encode('utf-8') % lineRead);
-        startPlay = nowPlay
-        lineRead = file.readline().rstrip()
-        lineTime = float(file.readline())
-        stringCommand = lineRead
-        print stringCommand
-        send(stringCommand)
+    nowPlay = clock.monotonic()
+    if (nowPlay-startPlay<lineTime):
+        # sleep until the next line is due, a virtual clock only moves when something waits.
+        clock.sleep(startPlay+lineTime-nowPlay)
+        nowPlay = clock.monotonic()
+    print(lineRead)
+    ser.write('%s'.encode('utf-8') % lineRead);
+    startPlay = nowPlay
+    lineRead = file.readline().rstrip()
+    lineTime = float(file.readline())
+    stringCommand = lineRead
+    print(stringCommand)
+    send(stringCommand)
 
 
 
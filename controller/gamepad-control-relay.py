@@ -2,15 +2,29 @@
 #https://stackoverflow.com/questions/44934309/how-to-access-the-joysticks-of-a-gamepad-using-python-evdev
 
 #import time
+import argparse
 from evdev import InputDevice, categorize, ecodes
 import serial
+from switchcontroller.statebus import StateBus, text_state
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--bus', type=str, default=None, help='Publish to this StateBus (bridge.py --bus) instead of opening /dev/ttyACM0.')
+parser.add_argument('--bus-slot', type=int, default=0, help='StateBus slot to publish to. Default: 0.')
+args = parser.parse_args()
 
 dev = InputDevice('/dev/input/event8')
 
-ser = serial.Serial('/dev/ttyACM0', 250000)
+bus = None
+if args.bus is not None:
+    bus = StateBus(args.bus)
+else:
+    ser = serial.Serial('/dev/ttyACM0', 250000)
 
 def send(msg):
-    ser.write('%s\r\n'.encode('utf-8') % msg);
+    if bus is not None:
+        bus.publish(args.bus_slot, text_state(msg))
+    else:
+        ser.write('%s\r\n'.encode('utf-8') % msg);
 
 command = [0]*15
 dpad = [0]*4
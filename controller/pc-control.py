@@ -13,7 +13,15 @@ import time
 from math import sqrt
 
 from switchcontroller.switchcontroller import *
+from switchcontroller.statebus import StateBus
+from switchcontroller.clock import default_clock
 
+clock = default_clock()
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--bus', type=str, default=None, help='Publish to this StateBus (bridge.py --bus) instead of opening COM6.')
+parser.add_argument('--bus-slot', type=int, default=0, help='StateBus slot to publish to. Default: 0.')
+args = parser.parse_args()
 screenWidth, screenHeight = pyautogui.size()
 x = screenWidth/2
 y = screenHeight/2
@@ -22,9 +30,12 @@ prevY = 0
 
 
 controller = SwitchController()
-controller.connect("COM6")
+if args.bus is not None:
+	controller.connectBus(StateBus(args.bus), args.bus_slot)
+else:
+	controller.connect("COM6")
 
-start = time.clock()
+start = clock.monotonic()
 
 
 while True:
@@ -114,15 +125,19 @@ while True:
 	# so I don't get stuck:
 	if(win32api.GetAsyncKeyState(win32con.VK_ESCAPE)):
 		controller.send("RELEASE")
-		controller.ser.close()
+		if controller.bus is None:
+			controller.ser.close()
 		exit()
 
 	controller.getOutput()
 
-	end = time.clock()
+	end = clock.monotonic()
 	diffInSeconds = end - start
 	diffInMilliSeconds = diffInSeconds*1000
 
-	if(diffInMilliSeconds > 80):
-		start = time.clock()
-		controller.send(controller.output)
\ No newline at end of file
+	if(diffInMilliSeconds >= 80):
+		start = end
+		controller.send(controller.output)
+
+	# sleep until the next send is due instead of spinning, the keys are read again right before it.
+	clock.sleep(start + 0.08 - clock.monotonic())
\ No newline at end of file
@@ -0,0 +1,124 @@
+import itertools
+import threading
+from contextlib import ExitStack
+
+from .clock import Clock
+from .frames import full_mask, neutral_state, pack_state
+from .inputstack import InputStack, StateSource
+from .seriallink import SerialWatchdog
+from .sinks import Tee, add_sink
+
+
+class Bridge():
+	"""The serial link, InputStack, recording and stats of bridge.py as an
+	object, to drive a board from another program without spawning bridge.py.
+
+		with Bridge('/dev/ttyUSB0') as bridge:
+			bridge.push_state(8, button_names['a'], 128, 128, 128, 128, hold=0.1)
+
+	start() opens the port and runs the frame loop in a thread, and stop() ends
+	it and prints the usual stats. push_state, release_state, push_source and
+	remove_source may be called from any thread. Callbacks added with on_ack
+	run in the loop thread after every ack as callback(frame, write_ns, ack_ns),
+	so they must be quick and must copy the frame if they keep it.
+	"""
+
+	def __init__(self, port='/dev/ttyUSB0', baud_rate=115200, ack_timeout=0.05, resync_attempts=3, sequenced=False,
+				 emulate=False, record=None, record_timing=None, sinks=(), recorder=None, clock=None):
+		self.clock = Clock() if clock is None else clock
+		self.link = SerialWatchdog(port, baud_rate, ack_timeout, resync_attempts, sequenced=sequenced, emulate=emulate, clock=self.clock)
+		self.baud_rate = baud_rate
+		self.record = record
+		self.record_timing = record_timing
+		self.sinks = sinks
+		self.recorder = recorder
+		self.lock = threading.Lock()
+		self.callbacks = []
+		self.state_sources = {}
+		self.resources = None
+		self.thread = None
+		self.running = False
+		self.frames = 0
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *args):
+		self.stop()
+
+	def start(self):
+		with ExitStack() as resources:
+			resources.enter_context(self.link)
+			self.tee = resources.enter_context(Tee())
+			self.tee.add(self.link, self.link.port)
+			for spec in self.sinks:
+				add_sink(self.tee, spec, self.baud_rate)
+			self.input_stack = resources.enter_context(InputStack(self.tee, self.record, self.record_timing))
+			# the InputStack stops when it runs out of sources, so keep a neutral one at the bottom.
+			self.input_stack.push(itertools.repeat(neutral_state), -1)
+			self.resources = resources.pop_all()
+		self.running = True
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+		return self
+
+	def stop(self):
+		self.running = False
+		if self.thread is not None:
+			# the link gives up waiting for acks or for the port to come back.
+			self.link.cancel()
+			self.thread.join(self.link.timeout + self.link.max_backoff + 1)
+			if self.thread.is_alive():
+				print('Bridge on {:s} did not stop in time.'.format(self.link.port))
+			self.thread = None
+		if self.resources is not None:
+			self.resources.close()
+			self.resources = None
+
+	def run(self):
+		link = self.link
+		while self.running:
+			with self.lock:
+				message = next(self.input_stack)
+			write_ns = self.clock.monotonic_ns()
+			self.tee.write(message)
+			if self.recorder is not None:
+				self.recorder.record(0, message)
+			if not link.wait_ack():
+				break
+			ack_ns = self.clock.monotonic_ns()
+			self.input_stack.record_timing(write_ns, ack_ns)
+			self.frames += 1
+			for callback in self.callbacks:
+				callback(message, write_ns, ack_ns)
+
+	def on_ack(self, callback):
+		self.callbacks.append(callback)
+
+	def push_source(self, it, priority=0, mask=full_mask):
+		with self.lock:
+			return self.input_stack.push(it, priority, mask)
+
+	def remove_source(self, source):
+		with self.lock:
+			# sources that ran out are already gone.
+			if source in self.input_stack.l:
+				self.input_stack.remove(source)
+
+	def push_state(self, hat, buttons, lx, ly, rx, ry, priority=1, hold=None, mask=full_mask):
+		"""Sets the state held at `priority`, replacing the last one pushed there.
+		`mask` takes effect the first time a priority is used."""
+		state = pack_state(hat, buttons, lx, ly, rx, ry)
+		with self.lock:
+			source = self.state_sources.get(priority)
+			if source is None:
+				source = self.state_sources[priority] = StateSource(clock=self.clock)
+				self.input_stack.push(source.states(), priority, mask)
+			# the loop reads state, hold and time together under the lock.
+			source.set(state, hold)
+
+	def release_state(self, priority=1):
+		with self.lock:
+			source = self.state_sources.get(priority)
+			if source is not None:
+				source.clear()
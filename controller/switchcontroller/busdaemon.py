@@ -0,0 +1,74 @@
+import selectors
+
+from tqdm import tqdm
+
+from .clock import Clock
+from .frames import FrameEncoder, neutral_state
+from .seriallink import watch_link
+
+
+class BusDaemon():
+	"""Output daemon for a StateBus: owns one serial port per bus slot and
+	answers every poll from a board with the newest state published to its
+	slot. Frontends publish with StateBus.publish and never open a port.
+	"""
+
+	def __init__(self, bus, links, slots, recorder=None, clock=None):
+		self.bus = bus
+		self.links = links
+		self.slots = slots
+		self.recorder = recorder
+		self.clock = Clock() if clock is None else clock
+		self.encoders = [FrameEncoder() for link in links]
+		self.states = [bytearray(7) for link in links]
+		self.seqs = [None] * len(links)
+		self.frames = [neutral_state] * len(links)
+		self.written = [0] * len(links)
+		self.changes = [0] * len(links)
+
+	def write(self, n):
+		seq = self.bus.read(self.slots[n], self.states[n])
+		if seq != self.seqs[n]:
+			# only re-encode when a frontend has published something new.
+			self.seqs[n] = seq
+			self.changes[n] += 1
+			self.frames[n] = self.encoders[n].encode_raw(self.states[n])
+		self.links[n].write(self.frames[n])
+		self.written[n] += 1
+		if self.recorder is not None:
+			self.recorder.record(n, self.frames[n])
+
+	def run(self, quiet=False):
+		selector = selectors.DefaultSelector()
+		last_ack = [self.clock.monotonic()] * len(self.links)
+		watched = [(None, None)] * len(self.links)
+		for n, link in enumerate(self.links):
+			watch_link(selector, watched, n, link)
+			self.write(n)
+
+		with tqdm(unit=' frames', disable=quiet) as pbar:
+			while True:
+				for key, events in selector.select(self.links[0].timeout):
+					n = key.data
+					link = self.links[n]
+					for response in link.read_waiting():
+						if response == ord('U'):
+							link.acked()
+							self.write(n)
+							last_ack[n] = self.clock.monotonic()
+							pbar.update()
+						elif response == ord('X'):
+							print('{:s} reported buffer overrun.'.format(link.port))
+					watch_link(selector, watched, n, link)
+				now = self.clock.monotonic()
+				for n, link in enumerate(self.links):
+					if now - last_ack[n] > link.timeout:
+						link.missed()
+						watch_link(selector, watched, n, link)
+						last_ack[n] = now
+
+	def print_stats(self):
+		for n, link in enumerate(self.links):
+			print('{:s} (slot {:d}): {:d} frames, {:d} state changes.'.format(
+				link.port, self.slots[n], self.written[n], self.changes[n]))
+		print('StateBus {:s}: {:d} torn reads retried.'.format(self.bus.name, self.bus.retries))
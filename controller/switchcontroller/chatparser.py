@@ -0,0 +1,121 @@
+import functools
+import random
+import time
+
+
+class ChatPlan():
+	"""What one chat message asks for: the commands to queue (when valid), how
+	many times it toggles lockon, and the first vote it casts."""
+
+	__slots__ = ('commands', 'valid', 'lockon', 'vote')
+
+	def __init__(self, commands, valid, lockon, vote):
+		self.commands = commands
+		self.valid = valid
+		self.lockon = lockon
+		self.vote = vote
+
+
+class ChatParser():
+	"""Turns chat messages into ChatPlans in one pass over their commands.
+
+	`commands` is every command chat may send. `rules` are (substring, role)
+	pairs: a command containing the substring needs a user in `roles[role]`.
+	Roles are sets, read on every message, so changes to them apply at once.
+	`compound(part)` says whether a part of an "a+b" command is valid.
+	"""
+
+	def __init__(self, commands, rules, roles, compound=None, max_commands=20, votes=None):
+		self.commands = frozenset(commands)
+		self.rules = tuple(rules)
+		self.roles = roles
+		self.compound = compound
+		self.max_commands = max_commands
+		self.votes = {'voteyea': 'yea', 'yea': 'yea', 'votenay': 'nay', 'nay': 'nay'} if votes is None else votes
+		# the roles every known command needs, worked out once.
+		self.needs = {command: self.requirements(command) for command in self.commands}
+		# compounds are made up by chat, so only the most recent ones are kept.
+		self.compound_needs = functools.lru_cache(maxsize=1024)(self.compound_requirements)
+
+	def requirements(self, command):
+		return frozenset(role for substring, role in self.rules if substring in command)
+
+	def compound_requirements(self, command):
+		if self.compound is None:
+			return None
+		for part in command.split("+"):
+			if not self.compound(part.strip()):
+				return None
+		return self.requirements(command)
+
+	def split(self, message):
+		if ("," in message):
+			return [x.strip() for x in message.split(",")]
+		return [x.strip() for x in message.split(" ")]
+
+	def parse(self, username, message):
+		commands = self.split(message)
+		valid = len(commands) <= self.max_commands
+		lockon = 0
+		vote = None
+		needs = self.needs
+		for cmd in commands:
+			need = needs.get(cmd)
+			if need is None:
+				need = self.compound_needs(cmd) if "+" in cmd else None
+				if need is None:
+					valid = False
+					need = ()
+			for role in need:
+				if username not in self.roles[role]:
+					valid = False
+			if "lockon" in cmd:
+				lockon += 1
+			if vote is None:
+				vote = self.votes.get(cmd)
+		return ChatPlan(commands, valid, lockon, vote)
+
+
+if __name__ == '__main__':
+	# raid-level flood: lots of users, mostly moves, some spam, compounds and mod commands.
+	moves = ["a", "b", "x", "y", "l", "r", "zl", "zr", "up", "down", "left", "right", "hup", "hleft", "sl", "ssl", "sssl",
+			 "look up", "look left", "dive", "spin", "long jump", "backflip", "plus", "minus", "home", "lockon", "yea"]
+	commands = moves + ["!goto " + str(n) for n in range(100)] + ["!restartserver", "!restartscript", "!flightdump"]
+	parts = {"a", "b", "x", "y", "l", "r", "zl", "zr", "up", "down", "left", "rigt"}
+	rules = [("plus", "plus"), ("home", "mod"), ("!restartserver", "mod"), ("!restartscript", "mod"), ("!flightdump", "mod")]
+	roles = {"plus": {"user{:d}".format(n) for n in range(0, 5000, 7)}, "mod": {"user{:d}".format(n) for n in range(0, 5000, 97)}}
+	parser = ChatParser(commands, rules, roles, lambda part: part.replace("s", "").replace("h", "") in parts)
+
+	rng = random.Random(0)
+	spam = ["lol", "POGGERS", "what is this game", "a a a a a", "kappa kappa", "!restartscript"]
+	messages = []
+	for n in range(200000):
+		pick = rng.random()
+		if pick < 0.6:
+			message = " ".join(rng.choice(moves) for i in range(rng.randint(1, 5)))
+		elif pick < 0.75:
+			message = ", ".join(rng.choice(moves) for i in range(rng.randint(1, 25)))
+		elif pick < 0.85:
+			message = "+".join(rng.choice(sorted(parts)) for i in range(rng.randint(2, 3)))
+		else:
+			message = rng.choice(spam)
+		messages.append(("user{:d}".format(rng.randrange(5000)), message))
+
+	# what handleChat did before: list scans for commands and roles.
+	commandList = commands + commands
+	roleLists = {role: sorted(users) for role, users in roles.items()}
+	def scan(username, message):
+		valid = True
+		for cmd in parser.split(message):
+			if (cmd not in commandList and "+" not in cmd):
+				valid = False
+			for substring, role in rules:
+				if (substring in cmd and username not in roleLists[role]):
+					valid = False
+		return valid
+
+	for name, parse in (("list scans", scan), ("ChatParser", lambda username, message: parser.parse(username, message).valid)):
+		start = time.perf_counter()
+		valid = sum(parse(username, message) for username, message in messages)
+		elapsed = time.perf_counter() - start
+		print("{:s}: {:d} messages, {:d} valid, {:.0f} messages/s.".format(name, len(messages), valid, len(messages) / elapsed))
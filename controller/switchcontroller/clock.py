@@ -0,0 +1,63 @@
+import math
+import os
+import threading
+import time
+
+
+class Clock():
+	"""Wall clock time. Everything that waits or timestamps goes through a clock
+	so that a VirtualClock can stand in for it."""
+
+	def monotonic(self):
+		return time.monotonic()
+
+	def monotonic_ns(self):
+		return time.monotonic_ns()
+
+	def sleep(self, seconds):
+		if seconds > 0:
+			time.sleep(seconds)
+
+	def busy_sleep(self, seconds):
+		# spin instead of sleeping, for waits shorter than the OS scheduler can do.
+		end = time.perf_counter() + seconds
+		while time.perf_counter() < end:
+			pass
+
+
+class VirtualClock(Clock):
+	"""Time that only moves when somebody waits, and then moves instantly.
+
+	Waiting for an hour takes no time at all, so macros, TAS files and the
+	firmware emulator's poll ticks can be run much faster than real time, and
+	always produce the same timestamps.
+	"""
+
+	def __init__(self, start=0):
+		self.now_ns = start
+		self.lock = threading.Lock()
+
+	def monotonic(self):
+		return self.now_ns / 1e9
+
+	def monotonic_ns(self):
+		return self.now_ns
+
+	def advance(self, seconds):
+		if seconds > 0:
+			with self.lock:
+				# round up, so waiting until a deadline always reaches it.
+				self.now_ns += math.ceil(seconds * 1e9)
+
+	def sleep(self, seconds):
+		self.advance(seconds)
+
+	def busy_sleep(self, seconds):
+		self.advance(seconds)
+
+
+def default_clock():
+	# SWITCH_VIRTUAL_CLOCK=1 runs a script against virtual time.
+	if os.environ.get("SWITCH_VIRTUAL_CLOCK"):
+		return VirtualClock()
+	return Clock()
@@ -0,0 +1,96 @@
+import collections
+
+from .clock import Clock
+
+
+class CommandQueue():
+	"""Chat commands waiting to be played, served round robin between users.
+
+	Each user has their own FIFO, capped at `per_user` commands, and users take
+	turns: one command from each in the order they started queueing. Commands
+	older than `max_age` seconds are dropped instead of played, so the queue
+	never falls far behind chat. All operations are O(1) amortized.
+	"""
+
+	def __init__(self, per_user=20, max_total=2000, max_age=15.0, clock=None):
+		self.per_user = per_user
+		self.max_total = max_total
+		self.max_age = max_age
+		self.clock = Clock() if clock is None else clock
+		self.queues = {}
+		self.order = collections.deque()
+		self.depth = 0
+		self.pushed = 0
+		self.played = 0
+		self.dropped_full = 0
+		self.dropped_stale = 0
+		self.wait_total = 0
+		self.wait_max = 0
+		self.wait_last = 0
+
+	def __len__(self):
+		return self.depth
+
+	def push(self, user, command):
+		"""Queues `command` for `user`. Returns False if it was dropped because
+		the user or the whole queue is full."""
+		queue = self.queues.get(user)
+		if queue is None:
+			queue = self.queues[user] = collections.deque()
+			self.order.append(user)
+		if len(queue) >= self.per_user or self.depth >= self.max_total:
+			self.dropped_full += 1
+			return False
+		queue.append((self.clock.monotonic(), command))
+		self.depth += 1
+		self.pushed += 1
+		return True
+
+	def pop(self):
+		"""The next command to play, or None when there is nothing fresh enough."""
+		now = self.clock.monotonic()
+		order = self.order
+		while order:
+			user = order.popleft()
+			queue = self.queues[user]
+			while queue and now - queue[0][0] > self.max_age:
+				queue.popleft()
+				self.depth -= 1
+				self.dropped_stale += 1
+			if not queue:
+				del self.queues[user]
+				continue
+			queued, command = queue.popleft()
+			self.depth -= 1
+			if queue:
+				order.append(user)
+			else:
+				del self.queues[user]
+			wait = now - queued
+			self.played += 1
+			self.wait_total += wait
+			self.wait_max = max(self.wait_max, wait)
+			self.wait_last = wait
+			return command
+		return None
+
+	def clear(self):
+		self.queues.clear()
+		self.order.clear()
+		self.depth = 0
+
+	def metrics(self):
+		return {
+			'depth': self.depth,
+			'users': len(self.queues),
+			'pushed': self.pushed,
+			'played': self.played,
+			'dropped_full': self.dropped_full,
+			'dropped_stale': self.dropped_stale,
+			'wait_last': self.wait_last,
+			'wait_mean': self.wait_total / self.played if self.played else 0,
+			'wait_max': self.wait_max,
+		}
+
+	def summary(self):
+		return "queue: {depth:d} commands from {users:d} users, waited {wait_last:.1f}s (mean {wait_mean:.1f}s, max {wait_max:.1f}s), dropped {dropped_full:d} over the limit and {dropped_stale:d} stale.".format(**self.metrics())
@@ -0,0 +1,61 @@
+import math
+
+
+def axis_table(deadzone=0, curve=1.0):
+	# stick values are the raw axis >> 8, which rounds down. Centring -deadzone up to but
+	# not including +deadzone matches the old raw cutoff (abs(raw) < 256 * deadzone) to within a few raw values.
+	table = []
+	for v in range(256):
+		d = v - 128
+		if -deadzone <= d < deadzone:
+			d = 0
+		elif curve != 1.0:
+			# rescale what's left outside the deadzone, then bend it.
+			limit, edge = (127, max(deadzone - 1, 0)) if d > 0 else (128, deadzone)
+			x = (abs(d) - edge) / (limit - edge)
+			d = int(round(math.copysign(limit * x ** curve, d)))
+		table.append(d + 128)
+	return table
+
+
+def build_filter(remap=None, mask=0xffff, deadzone=0, curve=1.0, turbo=0, turbo_period=4):
+	"""Fuse the input filter stages into a single function of (state, poll).
+
+	States are packed integers (see pack_state). Remapping, the button mask
+	and turbo are folded into two pairs of 256-entry tables for the low and
+	high button bytes, one pair for each half of the turbo cycle. Deadzone
+	and response curve are folded into one 256-entry table per stick axis.
+	Everything is computed here, so a filtered frame is only table lookups.
+	Turbo buttons are released for the second half of every `turbo_period`
+	polls.
+	"""
+	remap = remap or {}
+
+	def buttons_table(shift, released):
+		table = []
+		for byte in range(256):
+			out = 0
+			for bit in range(8):
+				src = 1 << (bit + shift)
+				if byte & (1 << bit):
+					out |= remap.get(src, src)
+			out &= mask & ~released
+			table.append(out << 32)
+		return table
+
+	phases = tuple((buttons_table(0, released), buttons_table(8, released)) for released in (0, turbo))
+	half = max(turbo_period // 2, 1)
+	axis = axis_table(deadzone, curve)
+	lx_table = [v << 24 for v in axis]
+	ly_table = [v << 16 for v in axis]
+	rx_table = [v << 8 for v in axis]
+	ry_table = axis
+	hat_mask = 0xff << 48
+
+	def apply(state, poll):
+		lo, hi = phases[(poll // half) & 1]
+		return ((state & hat_mask) | lo[(state >> 32) & 0xff] | hi[(state >> 40) & 0xff]
+				| lx_table[(state >> 24) & 0xff] | ly_table[(state >> 16) & 0xff]
+				| rx_table[(state >> 8) & 0xff] | ry_table[state & 0xff])
+
+	return apply
@@ -0,0 +1,101 @@
+import signal
+import sys
+import threading
+import time
+from struct import Struct
+
+from .clock import Clock
+
+
+# dump file: header, then the recorded frames oldest first.
+flight_magic = b'SCFR'
+flight_version = 1
+flight_header = Struct('<4sHHIQqq')   # magic, version, record size, records, frames ever recorded, wall ns, monotonic ns
+flight_entry = Struct('<QBB')         # monotonic ns, port, length, then the frame bytes
+flight_payload = 38                   # fits a bridge frame (15) and a SwitchController line (33)
+flight_record_size = flight_entry.size + flight_payload
+
+
+class FlightRecorder():
+	"""Keeps the last frames written to each board, for post-mortems.
+
+	Every frame goes into a preallocated ring of fixed-width binary records, so
+	recording is a pack_into and a slice copy. Nothing touches the disk until
+	dump() is called, by hand, on a signal, or from an uncaught exception.
+	"""
+
+	def __init__(self, seconds=600, rate=125, path='flight-%Y%m%d-%H%M%S.bin', clock=None):
+		self.capacity = max(int(seconds * rate), 1)
+		self.buf = bytearray(self.capacity * flight_record_size)
+		# Timer threads record too, so slots are claimed under a lock.
+		self.lock = threading.Lock()
+		self.total = 0
+		self.path = path
+		self.clock = Clock() if clock is None else clock
+
+	def record(self, port, message):
+		with self.lock:
+			n = self.total
+			self.total = n + 1
+		offset = (n % self.capacity) * flight_record_size
+		length = min(len(message), flight_payload)
+		flight_entry.pack_into(self.buf, offset, self.clock.monotonic_ns(), port, length)
+		offset += flight_entry.size
+		if length < len(message):
+			message = message[:length]
+		self.buf[offset:offset + length] = message
+
+	def dump(self, filename=None):
+		if filename is None:
+			filename = time.strftime(self.path)
+		# no lock here: dump() runs from signal handlers, which may interrupt record().
+		# A frame being recorded by another thread right now may come out half written.
+		total = self.total
+		records = min(total, self.capacity)
+		buf = memoryview(self.buf)
+		with open(filename, 'wb') as f:
+			f.write(flight_header.pack(flight_magic, flight_version, flight_record_size, records, total,
+									   time.time_ns(), self.clock.monotonic_ns()))
+			if total > self.capacity:
+				# the ring has wrapped, the oldest record is the next one to be overwritten.
+				split = (total % self.capacity) * flight_record_size
+				f.write(buf[split:])
+				f.write(buf[:split])
+			else:
+				f.write(buf[:records * flight_record_size])
+		print("Flight recorder: dumped {:d} frames to {:s}.".format(records, filename))
+		return filename
+
+	def install(self, signum=None):
+		"""Dump on `signum` (SIGUSR1, or Ctrl+Break on Windows) and on uncaught
+		exceptions in any thread. Call from the main thread."""
+		if signum is None:
+			signum = getattr(signal, 'SIGUSR1', None) or getattr(signal, 'SIGBREAK')
+		signal.signal(signum, lambda *args: self.dump())
+
+		excepthook = sys.excepthook
+		def crashed(*args):
+			self.dump()
+			excepthook(*args)
+		sys.excepthook = crashed
+
+		thread_excepthook = threading.excepthook
+		def thread_crashed(args):
+			self.dump()
+			thread_excepthook(args)
+		threading.excepthook = thread_crashed
+
+
+def read_flight(filename):
+	"""Returns (wall ns, port, frame bytes) for every record in a dump."""
+	with open(filename, 'rb') as f:
+		data = f.read()
+	magic, version, size, records, total, wall_ns, mono_ns = flight_header.unpack_from(data)
+	if magic != flight_magic or version != flight_version:
+		raise Exception('{:s} is not a flight recorder dump.'.format(filename))
+	frames = []
+	for offset in range(flight_header.size, flight_header.size + records * size, size):
+		ns, port, length = flight_entry.unpack_from(data, offset)
+		offset += flight_entry.size
+		frames.append((wall_ns - mono_ns + ns, port, data[offset:offset + length]))
+	return frames
@@ -0,0 +1,84 @@
+import struct
+
+
+# a frame is the state packed like struct.pack('>BHBBBB', hat, buttons, lx, ly, rx, ry),
+# in lowercase hex, and a newline.
+neutral_state = b'08000080808080\n'
+
+# each byte value mapped to its two lowercase hex digits as one big-endian 16-bit word.
+hex_words = [int.from_bytes(b'%02x' % n, 'big') for n in range(256)]
+hex_line = struct.Struct('>7H')
+hex_word = struct.Struct('>H')
+hex_values = {c: int(chr(c), 16) for c in b'0123456789abcdefABCDEF'}
+
+
+class FrameEncoder():
+	"""Encodes states into a single preallocated line buffer.
+
+	Both encode methods return a memoryview of that buffer, which is only valid
+	until the next call. Anything that keeps frames around has to copy them.
+	"""
+
+	def __init__(self):
+		self.line = bytearray(15)
+		self.line[14] = ord('\n')
+		self.view = memoryview(self.line)
+
+	def encode(self, hat, buttons, lx, ly, rx, ry):
+		t = hex_words
+		hex_line.pack_into(self.line, 0, t[hat], t[buttons >> 8], t[buttons & 0xff], t[lx], t[ly], t[rx], t[ry])
+		return self.view
+
+	def encode_state(self, state):
+		t = hex_words
+		hex_line.pack_into(self.line, 0, t[state >> 48], t[(state >> 40) & 0xff], t[(state >> 32) & 0xff],
+						   t[(state >> 24) & 0xff], t[(state >> 16) & 0xff], t[(state >> 8) & 0xff], t[state & 0xff])
+		return self.view
+
+	def encode_raw(self, data, offset=0):
+		t = hex_words
+		hex_line.pack_into(self.line, 0, t[data[offset]], t[data[offset + 1]], t[data[offset + 2]],
+						   t[data[offset + 3]], t[data[offset + 4]], t[data[offset + 5]], t[data[offset + 6]])
+		return self.view
+
+
+# switch button bits, see JoystickButtons_t in Joystick.h.
+button_names = {
+	'y': 0x01, 'b': 0x02, 'a': 0x04, 'x': 0x08,
+	'l': 0x10, 'r': 0x20, 'zl': 0x40, 'zr': 0x80,
+	'minus': 0x100, 'plus': 0x200, 'lclick': 0x400, 'rclick': 0x800,
+	'home': 0x1000, 'capture': 0x2000,
+}
+
+
+def parse_buttons(names):
+	bits = 0
+	for name in names.split(','):
+		if name:
+			bits |= button_names[name.strip().lower()]
+	return bits
+
+
+# fields of a packed state, for giving an InputStack source only part of the controller.
+full_mask = (1 << 56) - 1
+field_masks = {
+	'all': full_mask, 'hat': 0xff << 48, 'buttons': 0xffff << 32,
+	'lstick': 0xffff << 16, 'rstick': 0xffff,
+}
+
+
+def parse_fields(names):
+	# field names and button names, like 'buttons,hat' or 'a,b,rstick'.
+	mask = 0
+	for name in names.split(','):
+		name = name.strip().lower()
+		if name in field_masks:
+			mask |= field_masks[name]
+		elif name:
+			mask |= button_names[name] << 32
+	return mask
+
+
+def pack_state(hat, buttons, lx, ly, rx, ry):
+	# the same layout as struct.pack('>BHBBBB', ...), as one integer.
+	return hat << 48 | buttons << 32 | lx << 24 | ly << 16 | rx << 8 | ry
@@ -0,0 +1,100 @@
+import os
+import select
+import threading
+import time
+
+import sdl2
+
+from .clock import Clock
+
+
+class IdleMode():
+	"""Parks the live loop while the controller state doesn't change.
+
+	Once live input has sent the same frame for `after` seconds, no more frames
+	are sent (the board keeps reporting the last one) and the loop blocks in
+	SDL_WaitEventTimeout until the controller or the keyboard has something
+	new. A thread blocked on the keyboard pushes an SDL event to wake it at
+	once. Every `interval` seconds it wakes to drain the board's acks, so the
+	watchdog still notices a dead link. CPU time is tracked while parked and
+	while active, to report what parking saved.
+	"""
+
+	def __init__(self, after=5.0, interval=0.05, clock=None, stdin=None):
+		self.after = after
+		self.interval = interval
+		self.clock = Clock() if clock is None else clock
+		# a keypress on `stdin`, if given, wakes the loop too.
+		self.stdin = stdin
+		self.last = bytearray()
+		self.since = self.clock.monotonic()
+		self.parks = 0
+		self.parked_time = 0
+		self.parked_cpu = 0
+		self.active_time = 0
+		self.active_cpu = 0
+		self.mark = self.clock.monotonic()
+		self.mark_cpu = time.process_time()
+
+	def unchanged(self, message):
+		now = self.clock.monotonic()
+		if message != self.last:
+			self.last[:] = message
+			self.since = now
+			return False
+		return now - self.since >= self.after
+
+	def park(self, link):
+		now = self.clock.monotonic()
+		cpu = time.process_time()
+		self.active_time += now - self.mark
+		self.active_cpu += cpu - self.mark_cpu
+		self.parks += 1
+
+		if self.stdin is not None:
+			stop, stopping = os.pipe()
+			waker = threading.Thread(target=self.wake_on_key, args=(stop,), name='idle waker', daemon=True)
+			waker.start()
+
+		try:
+			quiet = 0
+			# a NULL event leaves the event in the queue for the main loop.
+			while not sdl2.SDL_WaitEventTimeout(None, int(self.interval * 1000)):
+				if self.stdin is not None and select.select([self.stdin], [], [], 0)[0]:
+					break
+				if link.drain():
+					quiet = 0
+				else:
+					quiet += self.interval
+					if quiet > link.timeout:
+						link.missed()
+						quiet = 0
+			link.drain()
+		finally:
+			if self.stdin is not None:
+				os.write(stopping, b'x')
+				waker.join()
+				os.close(stop)
+				os.close(stopping)
+
+		self.mark = self.clock.monotonic()
+		self.mark_cpu = time.process_time()
+		self.parked_time += self.mark - now
+		self.parked_cpu += self.mark_cpu - cpu
+
+	def wake_on_key(self, stop):
+		if self.stdin in select.select([self.stdin, stop], [], [])[0]:
+			# the main loop ignores user events, this one only ends the wait.
+			event = sdl2.SDL_Event()
+			event.type = sdl2.SDL_USEREVENT
+			sdl2.SDL_PushEvent(event)
+
+	def print_stats(self):
+		if not self.parks:
+			return
+		self.active_time += self.clock.monotonic() - self.mark
+		self.active_cpu += time.process_time() - self.mark_cpu
+		# what the parked time would have cost at the active CPU rate.
+		would_have = self.parked_time * self.active_cpu / max(self.active_time, 1e-9)
+		print('Idle: parked {:d} times for {:.1f} s, using {:.3f} s CPU instead of about {:.3f} s, saving {:.3f} s.'.format(
+			self.parks, self.parked_time, self.parked_cpu, would_have, would_have - self.parked_cpu))
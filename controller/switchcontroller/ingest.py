@@ -0,0 +1,100 @@
+import os
+import socket
+
+from .clock import Clock
+from .frames import FrameEncoder
+
+
+class IngestClientStats():
+	def __init__(self):
+		self.datagrams = 0
+		self.received = 0
+		self.sent = 0
+		self.coalesced = 0
+		self.bad = 0
+
+
+class SocketIngest():
+	"""Accept controller states from other local processes over a UNIX datagram socket.
+
+	Each datagram holds one raw 7-byte state (the '>BHBBBB' layout used everywhere
+	else) or a run of several states back to back, which is played out one state
+	per frame. The newest datagram replaces anything still queued (latest wins).
+	The last state is held for `hold` seconds, after which the source defers to
+	whatever sits below it in the InputStack.
+	"""
+
+	state_size = 7
+
+	def __init__(self, path, hold=0.5, clock=None):
+		self.path = path
+		self.hold = hold
+		self.clock = Clock() if clock is None else clock
+		self.sock = None
+		self.clients = {}
+		self.pending = b''
+		self.pos = 0
+		self.owner = None
+		self.encoder = FrameEncoder()
+		self.last = None
+		self.last_time = 0
+
+	def __enter__(self):
+		if os.path.exists(self.path):
+			os.unlink(self.path)
+		self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+		self.sock.bind(self.path)
+		self.sock.setblocking(False)
+		print('Accepting input on {:s}.'.format(self.path))
+		return self
+
+	def __exit__(self, *args):
+		self.sock.close()
+		if os.path.exists(self.path):
+			os.unlink(self.path)
+		self.print_stats()
+
+	def print_stats(self):
+		for client, stats in self.clients.items():
+			if isinstance(client, bytes):
+				# abstract namespace addresses come back as bytes starting with a NUL, shown as @name.
+				client = '@' + client[1:].decode('utf8', 'replace')
+			print('Ingest client {:s}: {:d} datagrams, {:d} states received, {:d} sent, {:d} coalesced, {:d} bad datagrams.'.format(
+				client, stats.datagrams, stats.received, stats.sent, stats.coalesced, stats.bad))
+
+	def poll(self):
+		while True:
+			try:
+				data, addr = self.sock.recvfrom(65536)
+			except BlockingIOError:
+				return
+			# unbound client sockets have no address, so they share one entry.
+			client = addr or '<unbound>'
+			stats = self.clients.get(client)
+			if stats is None:
+				stats = self.clients[client] = IngestClientStats()
+			stats.datagrams += 1
+			if len(data) == 0 or len(data) % self.state_size:
+				stats.bad += 1
+				continue
+			stats.received += len(data) // self.state_size
+			if self.owner is not None:
+				self.owner.coalesced += (len(self.pending) - self.pos) // self.state_size
+			self.pending = data
+			self.pos = 0
+			self.owner = stats
+
+	def states(self):
+		while True:
+			self.poll()
+			if self.pos < len(self.pending):
+				self.last = self.encoder.encode_raw(self.pending, self.pos)
+				self.last_time = self.clock.monotonic()
+				self.pos += self.state_size
+				self.owner.sent += 1
+				yield self.last
+			elif self.last is not None and self.clock.monotonic() - self.last_time < self.hold:
+				yield self.last
+			else:
+				# nothing to say this frame, let lower sources through.
+				yield None
@@ -0,0 +1,170 @@
+import bisect
+
+from .clock import Clock
+from .frames import FrameEncoder, full_mask, neutral_state
+from .sinks import FileSink
+from .timing import timing_header, timing_magic, timing_record, timing_version
+
+
+class InputSource():
+	def __init__(self, it, priority, mask):
+		self.it = it
+		self.priority = priority
+		self.mask = mask
+		self.keep = ~mask
+		self.paused = False
+		# the last frame this source gave and its masked packed state, so merging an
+		# unchanged frame is bitmask operations only.
+		self.frame = bytearray()
+		self.state = 0
+
+
+class InputStack():
+	"""Arbitrates between input sources.
+
+	Sources are generators of encoded frames, kept sorted by priority, with
+	equal priorities stacking LIFO. Each source owns the fields in its mask
+	(see parse_fields). Every frame, each field comes from the highest
+	source that owns it and has something to say; sources may yield None to
+	defer. Sources that are completely covered, or paused, are not advanced,
+	so they resume where they left off once uncovered. A source that owns
+	everything is passed straight through. Partial sources are merged with
+	bitmasks on packed states, and their frames are only parsed when they change.
+	"""
+
+	def __init__(self, tee, recordfilename=None, timingfilename=None):
+		self.l = []
+		self.priorities = []
+		self.tee = tee
+		self.encoder = FrameEncoder()
+		self.neutral = int(neutral_state[:14], 16)
+		self.recordfilename = recordfilename
+		self.recordsink = None
+		self.timingfilename = timingfilename
+		self.timingfile = None
+		self.timingbuf = bytearray(timing_record.size)
+		self.macrosink = None
+
+	def __enter__(self):
+		if self.recordfilename is not None:
+			self.recordsink = self.tee.add(FileSink(self.recordfilename), self.recordfilename)
+			if self.timingfilename is not None:
+				self.timingfile = open(self.timingfilename, 'wb')
+				self.timingfile.write(timing_header.pack(timing_magic, timing_version))
+		return self
+
+	def __exit__(self, *args):
+		if self.recordsink is not None:
+			self.tee.remove(self.recordsink)
+		if self.timingfile is not None:
+			self.timingfile.close()
+		self.macro_end()
+
+	def record_timing(self, write_ns, ack_ns):
+		if self.timingfile is not None:
+			timing_record.pack_into(self.timingbuf, 0, write_ns, ack_ns)
+			self.timingfile.write(self.timingbuf)
+
+	def macro_start(self, filename, preroll=None):
+		if self.macrosink is None:
+			sink = FileSink(filename)
+			if preroll is not None:
+				# the recording starts with whatever the pre-roll still holds.
+				frames = preroll.save(sink.f)
+				print('Recording to {:s}, starting {:d} frames in the past.'.format(filename, frames))
+			self.macrosink = self.tee.add(sink, filename)
+		else:
+			print('ERROR: Already recording a macro.')
+
+	def macro_end(self):
+		if self.macrosink is not None:
+			self.tee.remove(self.macrosink)
+			self.macrosink = None
+
+	def push(self, it, priority=0, mask=full_mask):
+		# sources stay sorted by priority, equal priorities stack LIFO.
+		source = InputSource(it, priority, mask)
+		n = bisect.bisect_right(self.priorities, priority)
+		self.l.insert(n, source)
+		self.priorities.insert(n, priority)
+		return source
+
+	def pop(self):
+		self.l.pop()
+		self.priorities.pop()
+
+	def remove(self, source):
+		n = self.l.index(source)
+		del self.l[n]
+		del self.priorities[n]
+
+	def pause(self, source):
+		source.paused = True
+
+	def resume(self, source):
+		source.paused = False
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		if not self.l:
+			raise StopIteration
+		n = len(self.l) - 1
+		remaining = full_mask
+		merged = 0
+		while n >= 0 and remaining:
+			source = self.l[n]
+			n -= 1
+			if source.paused or not source.mask & remaining:
+				continue
+			try:
+				message = next(source.it)
+			except StopIteration:
+				del self.l[n + 1]
+				del self.priorities[n + 1]
+				if not self.l:
+					raise
+				continue
+			if message is None:
+				# a source may yield None to defer to the ones below it.
+				continue
+			if remaining == full_mask and source.mask == full_mask:
+				return message
+			if source.frame != message:
+				source.frame[:] = message
+				# encoded frames are the packed state in hex.
+				source.state = int(bytes(message[:14]), 16) & source.mask
+			merged |= source.state & remaining
+			remaining &= source.keep
+		if remaining == full_mask:
+			return neutral_state
+		return self.encoder.encode_state(merged | self.neutral & remaining)
+
+
+class StateSource():
+	"""An InputStack source holding a state set from code, for `hold` seconds
+	or until it is replaced or cleared. Defers to lower sources otherwise."""
+
+	def __init__(self, clock=None):
+		self.clock = Clock() if clock is None else clock
+		self.encoder = FrameEncoder()
+		self.state = None
+		self.hold = None
+		self.time = 0
+
+	def set(self, state, hold=None):
+		self.time = self.clock.monotonic()
+		self.hold = hold
+		self.state = state
+
+	def clear(self):
+		self.state = None
+
+	def states(self):
+		while True:
+			state = self.state
+			if state is None or (self.hold is not None and self.clock.monotonic() - self.time > self.hold):
+				yield None
+			else:
+				yield self.encoder.encode_state(state)
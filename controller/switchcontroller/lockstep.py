@@ -0,0 +1,84 @@
+import selectors
+
+from tqdm import tqdm
+
+from .clock import Clock
+from .seriallink import watch_link
+
+
+class LockstepPlayer():
+	"""Play one recording on several boards at once, keeping them in step.
+
+	The recording is read once and shared. Each board advances on its own 'U'
+	acks, but a board more than `tolerance` frames ahead of the slowest one
+	holds its current frame (the firmware keeps reporting the last state) until
+	the others catch up. Boards that stop acking are resynced by their watchdog.
+	"""
+
+	def __init__(self, filename, links, tolerance=2, recorder=None, clock=None):
+		with open(filename, 'rb') as replay:
+			self.frames = replay.readlines()
+		self.links = links
+		self.recorder = recorder
+		self.tolerance = tolerance
+		self.clock = Clock() if clock is None else clock
+		self.positions = [0] * len(links)
+		self.stalls = [0] * len(links)
+		self.max_lead = [0] * len(links)
+		self.lead_total = [0] * len(links)
+		self.acks = [0] * len(links)
+
+	def advance(self, n):
+		self.acks[n] += 1
+		slowest = min(self.positions)
+		lead = self.positions[n] - slowest
+		self.lead_total[n] += lead
+		self.max_lead[n] = max(self.max_lead[n], lead)
+		if self.positions[n] + 1 >= len(self.frames):
+			self.positions[n] = len(self.frames)
+		elif lead > self.tolerance:
+			self.stalls[n] += 1
+		else:
+			self.positions[n] += 1
+			self.write(n, self.frames[self.positions[n]])
+
+	def write(self, n, frame):
+		self.links[n].write(frame)
+		if self.recorder is not None:
+			self.recorder.record(n, frame)
+
+	def run(self):
+		if not self.frames:
+			return
+		selector = selectors.DefaultSelector()
+		last_ack = [self.clock.monotonic()] * len(self.links)
+		watched = [(None, None)] * len(self.links)
+		for n, link in enumerate(self.links):
+			watch_link(selector, watched, n, link)
+			self.write(n, self.frames[0])
+
+		with tqdm(total=len(self.frames), unit=' frames') as pbar:
+			while min(self.positions) < len(self.frames):
+				for key, events in selector.select(self.links[0].timeout):
+					n = key.data
+					link = self.links[n]
+					for response in link.read_waiting():
+						if response == ord('U') and self.positions[n] < len(self.frames):
+							link.acked()
+							self.advance(n)
+							last_ack[n] = self.clock.monotonic()
+						elif response == ord('X'):
+							print('{:s} reported buffer overrun.'.format(link.port))
+					watch_link(selector, watched, n, link)
+				now = self.clock.monotonic()
+				for n, link in enumerate(self.links):
+					if self.positions[n] < len(self.frames) and now - last_ack[n] > link.timeout:
+						link.missed()
+						watch_link(selector, watched, n, link)
+						last_ack[n] = now
+				pbar.update(min(self.positions) - pbar.n)
+
+	def print_stats(self):
+		for n, link in enumerate(self.links):
+			print('{:s}: {:d} acks, {:d} stalls, max lead {:d} frames, mean lead {:.2f} frames.'.format(
+				link.port, self.acks[n], self.stalls[n], self.max_lead[n], self.lead_total[n] / max(self.acks[n], 1)))
@@ -0,0 +1,36 @@
+import numpy as np
+
+
+frame_dtype = np.dtype([('hat', 'u1'), ('buttons', '>u2'), ('lx', 'u1'), ('ly', 'u1'), ('rx', 'u1'), ('ry', 'u1')])
+hex_digits = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+
+
+def build_macro(hats, buttons, axes, durations):
+	"""Build the encoded frame table of a macro in one pass.
+
+	hats, buttons and durations hold one entry per step, axes holds one
+	(lx, ly, rx, ry) row per step. Step n is held for durations[n] frames.
+	Returns a (frames, 15) uint8 array with one encoded line per row.
+	"""
+	axes = np.asarray(axes)
+	steps = np.empty(len(durations), dtype=frame_dtype)
+	steps['hat'] = hats
+	steps['buttons'] = buttons
+	steps['lx'] = axes[:, 0]
+	steps['ly'] = axes[:, 1]
+	steps['rx'] = axes[:, 2]
+	steps['ry'] = axes[:, 3]
+
+	# encode each step once, then repeat the encoded lines.
+	raw = steps.view(np.uint8).reshape(-1, frame_dtype.itemsize)
+	lines = np.empty((len(steps), 15), dtype=np.uint8)
+	lines[:, 0:14:2] = hex_digits[raw >> 4]
+	lines[:, 1:14:2] = hex_digits[raw & 0xf]
+	lines[:, 14] = ord('\n')
+	return np.repeat(lines, durations, axis=0)
+
+
+def macro_states(table):
+	view = memoryview(np.ascontiguousarray(table).reshape(-1))
+	for n in range(0, len(view), 15):
+		yield view[n:n + 15]
@@ -0,0 +1,65 @@
+import itertools
+
+
+class PreRoll():
+	"""Always-on ring of the last `seconds` of sent frames, so a recording can
+	start in the past. Memory is fixed at construction: the ring, and a
+	snapshot of it that replay() plays from while the ring keeps filling.
+	Writing a frame copies it into the ring and allocates nothing.
+	"""
+
+	line_size = 15
+
+	def __init__(self, seconds=30, rate=125):
+		self.capacity = max(int(seconds * rate), 1)
+		self.ring = bytearray(self.capacity * self.line_size)
+		self.pos = 0
+		self.count = 0
+		self.snapshot = bytearray(len(self.ring))
+		# views into the snapshot are made once, so replaying doesn't allocate either.
+		view = memoryview(self.snapshot)
+		self.views = [view[n:n + self.line_size] for n in range(0, len(self.snapshot), self.line_size)]
+		self.generation = 0
+		self.dropped = 0
+
+	def write(self, message):
+		if len(message) != self.line_size:
+			# recordings with CRLF or trailing spaces are kept with a plain newline.
+			message = bytes(message).rstrip() + b'\n'
+			if len(message) != self.line_size:
+				self.dropped += 1
+				return
+		self.ring[self.pos:self.pos + self.line_size] = message
+		self.pos += self.line_size
+		if self.pos == len(self.ring):
+			self.pos = 0
+		self.count += 1
+
+	def close(self):
+		if self.dropped:
+			print('Pre-roll: dropped {:d} frames that were not {:d} hex digits.'.format(self.dropped, self.line_size - 1))
+
+	def frames(self):
+		# the ring oldest first, as one or two memoryviews.
+		ring = memoryview(self.ring)
+		if self.count < self.capacity:
+			return [ring[:self.pos]]
+		return [ring[self.pos:], ring[:self.pos]]
+
+	def save(self, f):
+		for part in self.frames():
+			f.write(part)
+		return min(self.count, self.capacity)
+
+	def replay(self):
+		# a newer replay takes over the snapshot, so this one stops.
+		self.generation += 1
+		generation = self.generation
+		n = 0
+		for part in self.frames():
+			self.snapshot[n:n + len(part)] = part
+			n += len(part)
+		for view in itertools.islice(self.views, n // self.line_size):
+			if self.generation != generation:
+				return
+			yield view
@@ -0,0 +1,68 @@
+import itertools
+
+
+class PressEngine():
+	"""Presses buttons and lets go of them later from a Scheduler, so holding a
+	button for seconds doesn't hold up anything else.
+
+	A press owns the fields it changes until it is released or a later press
+	changes them, so presses on different fields and controllers overlap
+	freely. A press with reset=0 leaves its fields held, and the next press on
+	that controller that resets lets go of them too, the way the steps of one
+	move build on each other. Call it from the scheduler's thread.
+	"""
+
+	def __init__(self, scheduler, neutral=None):
+		self.scheduler = scheduler
+		# where released fields go back to, by default a new controller's values.
+		self.neutral = neutral
+		self.ids = itertools.count(1)
+		self.owners = {}
+		self.held = {}
+		self.pending = 0
+
+	def press(self, controller, changes, duration, reset=1, output=None):
+		"""Applies `changes` ((field, value) pairs) to `controller` and sends it,
+		then releases them `duration` seconds later if `reset`. `output` is a
+		prebuilt line to send instead of calling getOutput(). Returns when the
+		press ends."""
+		press = next(self.ids)
+		owners = self.owners.setdefault(controller, {})
+		fields = []
+		for field, value in changes:
+			setattr(controller, field, value)
+			owners[field] = press
+			fields.append(field)
+		self.send(controller, output)
+		if reset:
+			for field in self.held.pop(controller, ()):
+				if field in owners and owners[field] != press:
+					owners[field] = press
+					fields.append(field)
+			self.pending += 1
+			self.scheduler.after(duration, lambda: self.release(controller, press, fields))
+		else:
+			self.held.setdefault(controller, set()).update(fields)
+		return self.scheduler.clock.monotonic() + duration
+
+	def release(self, controller, press, fields):
+		self.pending -= 1
+		if self.neutral is None:
+			self.neutral = type(controller)()
+		owners = self.owners[controller]
+		released = False
+		for field in fields:
+			# a later press on this field keeps it.
+			if owners.get(field) == press:
+				del owners[field]
+				setattr(controller, field, getattr(self.neutral, field))
+				released = True
+		if released:
+			self.send(controller)
+
+	def send(self, controller, output=None):
+		if output is None:
+			controller.getOutput()
+		else:
+			controller.output = output
+		controller.send(controller.output)
@@ -0,0 +1,135 @@
+import collections
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+
+
+# main loop stages, for --profile stages.
+stage_input, stage_encode, stage_write, stage_ack, stage_record, stage_display = range(6)
+stage_names = ('input', 'encode', 'write', 'ack wait', 'record', 'display')
+
+
+class NullStageTimers():
+	def lap(self, stage):
+		pass
+
+
+class StageTimers():
+	"""Cumulative time per main loop stage. Each lap charges the time since
+	the previous lap to a stage, so the stages add up to the whole loop."""
+
+	def __init__(self):
+		self.totals = [0] * len(stage_names)
+		self.last = time.perf_counter_ns()
+
+	def lap(self, stage):
+		now = time.perf_counter_ns()
+		self.totals[stage] += now - self.last
+		self.last = now
+
+	def summary(self, frames):
+		total = max(sum(self.totals), 1)
+		lines = ['Stage timers over {:d} frames:'.format(frames)]
+		for name, ns in zip(stage_names, self.totals):
+			lines.append('  {:<8s} {:10.3f} ms {:10.3f} us/frame {:6.1f}%'.format(
+				name, ns / 1e6, ns / 1e3 / max(frames, 1), 100 * ns / total))
+		return '\n'.join(lines)
+
+
+class StackSampler():
+	"""Snapshots the main thread's stack every `interval` seconds from a
+	timer thread. The sampler can only run when the main thread lets go of the
+	GIL, so samples land in blocking calls (serial reads, SDL, sleeps). That
+	shows where wall time goes; use cprofile or stages for Python CPU time."""
+
+	def __init__(self, interval=0.001):
+		self.interval = interval
+		self.thread_id = threading.get_ident()
+		self.samples = collections.Counter()
+		self.stopped = threading.Event()
+		self.thread = threading.Thread(target=self.run, daemon=True)
+
+	def start(self):
+		self.thread.start()
+
+	def stop(self):
+		self.stopped.set()
+		self.thread.join()
+
+	def run(self):
+		while not self.stopped.wait(self.interval):
+			frame = sys._current_frames().get(self.thread_id)
+			stack = []
+			while frame is not None:
+				code = frame.f_code
+				stack.append('{:s} ({:s}:{:d})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+				frame = frame.f_back
+			self.samples[tuple(stack)] += 1
+
+	def summary(self, top=20):
+		count = max(sum(self.samples.values()), 1)
+		own = collections.Counter()
+		inclusive = collections.Counter()
+		for stack, n in self.samples.items():
+			if stack:
+				own[stack[0]] += n
+			for function in set(stack):
+				inclusive[function] += n
+		lines = ['{:d} stack samples.'.format(count), 'Own time:']
+		for function, n in own.most_common(top):
+			lines.append('  {:6.1f}%  {:s}'.format(100 * n / count, function))
+		lines.append('Including callees:')
+		for function, n in inclusive.most_common(top):
+			lines.append('  {:6.1f}%  {:s}'.format(100 * n / count, function))
+		return '\n'.join(lines)
+
+
+class Profiler():
+	"""--profile: cprofile, sample or stages, or nothing if mode is None.
+	Stops the main loop after `frames` frames, if given, and writes its
+	summary to `output`, or stdout, on exit."""
+
+	def __init__(self, mode=None, frames=0, output=None, interval=0.001):
+		self.mode = mode
+		self.limit = frames if mode is not None else 0
+		self.frames = 0
+		self.output = output
+		self.profile = cProfile.Profile() if mode == 'cprofile' else None
+		self.sampler = StackSampler(interval) if mode == 'sample' else None
+		self.stages = StageTimers() if mode == 'stages' else NullStageTimers()
+
+	def __enter__(self):
+		if self.profile is not None:
+			self.profile.enable()
+		if self.sampler is not None:
+			self.sampler.start()
+		return self
+
+	def __exit__(self, *args):
+		if self.profile is not None:
+			self.profile.disable()
+			stream = io.StringIO()
+			pstats.Stats(self.profile, stream=stream).sort_stats('cumulative').print_stats(30)
+			summary = 'cProfile over {:d} frames:\n{:s}'.format(self.frames, stream.getvalue())
+		elif self.sampler is not None:
+			self.sampler.stop()
+			summary = self.sampler.summary()
+		elif self.mode == 'stages':
+			summary = self.stages.summary(self.frames)
+		else:
+			return
+		if self.output is None:
+			print(summary)
+		else:
+			with open(self.output, 'w') as f:
+				f.write(summary + '\n')
+			print('Profile written to {:s}.'.format(self.output))
+
+	def count(self):
+		# true once the frame limit is reached.
+		self.frames += 1
+		return self.frames == self.limit
@@ -0,0 +1,259 @@
+import binascii
+import collections
+import heapq
+import math
+import random
+import socket
+from struct import Struct, error as StructError
+
+from .clock import Clock
+from .frames import FrameEncoder, neutral_state
+
+
+# remote play packets: a header, then the newest frame and the ones before it, oldest
+# first, each as a byte saying which of the 7 state bytes changed since the previous
+# frame followed by those bytes. The oldest frame is a delta from the neutral state.
+remote_header = Struct('<IIqB')   # sender session, newest seq, sender monotonic ns, frames
+remote_neutral = bytes.fromhex(neutral_state[:14].decode('utf8'))
+
+
+def remote_packet(session, seq, send_ns, frames):
+	packet = bytearray(remote_header.pack(session, seq, send_ns, len(frames)))
+	prev = remote_neutral
+	for frame in frames:
+		changed = 0
+		for n in range(7):
+			if frame[n] != prev[n]:
+				changed |= 1 << n
+		packet.append(changed)
+		packet += bytes(frame[n] for n in range(7) if changed & 1 << n)
+		prev = frame
+	return packet
+
+
+def remote_frames(packet):
+	session, seq, send_ns, count = remote_header.unpack_from(packet)
+	frames = []
+	state = bytearray(remote_neutral)
+	pos = remote_header.size
+	for i in range(count):
+		changed = packet[pos]
+		pos += 1
+		for n in range(7):
+			if changed & 1 << n:
+				state[n] = packet[pos]
+				pos += 1
+		frames.append(bytes(state))
+	return session, seq, send_ns, frames
+
+
+class RemoteStats():
+	def __init__(self):
+		self.packets = 0
+		self.bad = 0
+		self.frames = 0
+		self.recovered = 0
+		self.late = 0
+		self.restarts = 0
+		self.lost = 0
+		self.underruns = 0
+		self.skipped = 0
+		self.delay_total = 0
+		self.delay_max = 0
+		self.jitter_total = 0
+		self.depth_total = 0
+
+
+class RemoteIngest():
+	"""Accept controller states from remote players over UDP.
+
+	Each packet carries the sender's newest frame plus the few before it, so
+	a lost packet is covered by the next one. Frames go into a jitter buffer
+	indexed by sequence number and are played out one per poll, which puts
+	them on the board's clock rather than the network's. Playout runs
+	`target` frames behind the newest frame received. The target follows
+	the measured interarrival jitter (RFC 3550 style), so a steady link gets
+	a short buffer and a bursty one a deeper buffer. A missing frame repeats
+	the last one. When the buffer runs too far ahead, frames are skipped to
+	catch up. After `hold` seconds without packets the source defers to
+	whatever sits below it in the InputStack. Every run of remote_send picks
+	a new session id, and a packet from a new session starts over, since its
+	sequence numbers start over too.
+	"""
+
+	def __init__(self, address, hold=0.5, period=0.008, max_depth=16, clock=None):
+		self.address = address
+		self.hold = hold
+		self.period_ns = round(period * 1e9)
+		self.max_depth = max_depth
+		self.clock = Clock() if clock is None else clock
+		self.sock = None
+		self.encoder = FrameEncoder()
+		self.slots = [bytearray(7) for n in range(256)]
+		self.stats = RemoteStats()
+		self.reset()
+
+	def reset(self, session=None):
+		self.session = session
+		self.slot_seqs = [-1] * 256
+		self.newest = None
+		self.play_seq = None
+		self.last = remote_neutral
+		self.last_time = 0
+		self.last_transit = None
+		self.min_transit = None
+		self.jitter = 0
+		self.target = 1
+
+	def __enter__(self):
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.sock.bind(self.address)
+		self.sock.setblocking(False)
+		print('Accepting remote play on udp {:s}:{:d}.'.format(*self.address))
+		return self
+
+	def __exit__(self, *args):
+		self.sock.close()
+		self.print_stats()
+
+	def print_stats(self):
+		stats = self.stats
+		if not stats.packets:
+			return
+		print('Remote play: {:d} packets, {:d} bad, {:d} frames played, {:d} lost, {:d} recovered from redundant copies, '
+			  '{:d} late, {:d} underruns, {:d} skipped, {:d} sender restarts.'.format(
+				  stats.packets, stats.bad, stats.frames, stats.lost, stats.recovered, stats.late, stats.underruns,
+				  stats.skipped, stats.restarts))
+		print('Remote play: network delay above best case mean {:.3f} ms, max {:.3f} ms, mean jitter {:.3f} ms, mean buffer {:.2f} frames.'.format(
+			stats.delay_total / stats.packets / 1e6, stats.delay_max / 1e6, stats.jitter_total / stats.packets / 1e6,
+			stats.depth_total / max(stats.frames, 1)))
+
+	def receive(self, packet, arrival_ns):
+		try:
+			session, seq, send_ns, frames = remote_frames(packet)
+		except (StructError, IndexError):
+			self.stats.bad += 1
+			return
+		stats = self.stats
+		stats.packets += 1
+		if session != self.session:
+			# a sender that restarted numbers its frames from 1 again.
+			if self.session is not None:
+				stats.restarts += 1
+			self.reset(session)
+
+		# sender and receiver clocks differ by an unknown offset, so delays are
+		# measured against the best transit time seen so far.
+		transit = arrival_ns - send_ns
+		if self.min_transit is None or transit < self.min_transit:
+			self.min_transit = transit
+		delay = transit - self.min_transit
+		stats.delay_total += delay
+		stats.delay_max = max(stats.delay_max, delay)
+		if self.last_transit is not None:
+			self.jitter += (abs(transit - self.last_transit) - self.jitter) / 16
+		self.last_transit = transit
+		stats.jitter_total += self.jitter
+		self.target = max(1, min(self.max_depth, math.ceil(3 * self.jitter / self.period_ns) + 1))
+
+		if self.play_seq is not None and seq <= self.play_seq:
+			# the whole packet came too late to be played, and doesn't count as the player being there.
+			stats.late += 1
+			return
+		first = seq - len(frames) + 1
+		for n, frame in enumerate(frames):
+			frame_seq = first + n
+			if self.play_seq is not None and frame_seq <= self.play_seq:
+				continue
+			slot = frame_seq & 0xff
+			if self.slot_seqs[slot] != frame_seq:
+				self.slots[slot][:] = frame
+				self.slot_seqs[slot] = frame_seq
+				if frame_seq != seq:
+					# this frame's own packet went missing or is still on its way.
+					stats.recovered += 1
+		if self.newest is None or seq > self.newest:
+			self.newest = seq
+		if self.play_seq is None:
+			# start playing `target` frames behind the newest.
+			self.play_seq = max(first, seq - self.target) - 1
+		self.last_time = self.clock.monotonic()
+
+	def poll(self):
+		while True:
+			try:
+				packet = self.sock.recv(2048)
+			except BlockingIOError:
+				return
+			self.receive(packet, self.clock.monotonic_ns())
+
+	def states(self):
+		stats = self.stats
+		while True:
+			self.poll()
+			if self.newest is None or self.clock.monotonic() - self.last_time > self.hold:
+				if self.newest is not None:
+					# the player went away, start over when they come back.
+					self.reset(self.session)
+				yield None
+				continue
+
+			depth = self.newest - self.play_seq
+			if depth > self.target + 2:
+				# too far behind the sender, skip ahead to cut the delay.
+				stats.skipped += depth - self.target - 1
+				self.play_seq = self.newest - self.target - 1
+				depth = self.target + 1
+			if depth <= 0:
+				# nothing new yet, hold the last frame.
+				stats.underruns += 1
+			else:
+				self.play_seq += 1
+				slot = self.play_seq & 0xff
+				if self.slot_seqs[slot] == self.play_seq:
+					self.last = self.slots[slot]
+				else:
+					stats.lost += 1
+				stats.frames += 1
+				stats.depth_total += depth - 1
+			yield self.encoder.encode_raw(self.last)
+
+
+def remote_send(address, frames, rate=125, redundancy=3, loss=0.0, jitter=0.0, pump=None, clock=None):
+	"""Send encoded frames to a RemoteIngest at `rate` frames per second. `loss`
+	and `jitter` drop and delay packets on purpose, for testing over loopback.
+	`pump`, if given, is called before every frame, for live input that needs
+	its events pumped."""
+	clock = Clock() if clock is None else clock
+	sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	session = random.getrandbits(32)
+	recent = collections.deque(maxlen=redundancy + 1)
+	delayed = []
+	seq = 0
+	sent = 0
+	dropped = 0
+	period = 1 / rate
+	next_time = clock.monotonic()
+	try:
+		for line in frames:
+			if pump is not None:
+				pump()
+			seq += 1
+			recent.append(binascii.a2b_hex(bytes(line[:14])))
+			now = clock.monotonic()
+			if random.random() < loss:
+				dropped += 1
+			else:
+				packet = remote_packet(session, seq, clock.monotonic_ns(), recent)
+				heapq.heappush(delayed, (now + random.uniform(0, jitter), seq, packet))
+			while delayed and delayed[0][0] <= now:
+				sock.sendto(heapq.heappop(delayed)[2], address)
+				sent += 1
+			next_time += period
+			clock.sleep(next_time - clock.monotonic())
+	finally:
+		for send_time, n, packet in sorted(delayed):
+			sock.sendto(packet, address)
+			sent += 1
+		sock.close()
+		print('Remote send: {:d} frames, {:d} packets sent, {:d} dropped on purpose.'.format(seq, sent, dropped))
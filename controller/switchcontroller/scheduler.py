@@ -0,0 +1,101 @@
+import heapq
+import itertools
+import selectors
+
+from .clock import Clock, VirtualClock
+
+
+class Scheduled():
+	"""A callback waiting in a Scheduler. Repeating ones keep their phase: each
+	run is due one interval after the last one was due, not after it ran."""
+
+	def __init__(self, due, interval, callback):
+		self.due = due
+		self.interval = interval
+		self.callback = callback
+		self.cancelled = False
+		self.runs = 0
+		self.late_total = 0
+		self.late_max = 0
+
+	def cancel(self):
+		self.cancelled = True
+
+
+class Scheduler():
+	"""Runs timers from a heap and callbacks for readable sockets, and sleeps in
+	select() in between, so an idle loop costs no CPU.
+
+	The wait is always until the next timer is due, so timers are late by no
+	more than the OS wakes a sleeping thread late (about 1 ms, or 15 ms on
+	Windows without timeBeginPeriod).
+	"""
+
+	def __init__(self, clock=None):
+		self.clock = Clock() if clock is None else clock
+		# virtual time doesn't pass while blocked in select(), it has to be slept.
+		self.virtual = isinstance(self.clock, VirtualClock)
+		self.heap = []
+		self.counter = itertools.count()
+		self.selector = selectors.DefaultSelector()
+		self.running = False
+
+	def schedule(self, scheduled):
+		heapq.heappush(self.heap, (scheduled.due, next(self.counter), scheduled))
+		return scheduled
+
+	def after(self, delay, callback):
+		return self.schedule(Scheduled(self.clock.monotonic() + delay, None, callback))
+
+	def every(self, interval, callback, delay=None):
+		"""Calls `callback` every `interval` seconds, first after `delay`
+		(default one interval)."""
+		delay = interval if delay is None else delay
+		return self.schedule(Scheduled(self.clock.monotonic() + delay, interval, callback))
+
+	def watch(self, fileobj, callback):
+		self.selector.register(fileobj, selectors.EVENT_READ, callback)
+
+	def unwatch(self, fileobj):
+		self.selector.unregister(fileobj)
+
+	def run_once(self, max_wait=None):
+		heap = self.heap
+		while heap and heap[0][2].cancelled:
+			heapq.heappop(heap)
+		timeout = max_wait
+		if heap:
+			until = max(0, heap[0][0] - self.clock.monotonic())
+			timeout = until if timeout is None else min(timeout, until)
+
+		if self.selector.get_map() and not self.virtual:
+			events = self.selector.select(timeout)
+		else:
+			events = self.selector.select(0) if self.selector.get_map() else []
+			if not events:
+				self.clock.sleep(60 if timeout is None else timeout)
+		for key, mask in events:
+			key.data()
+
+		now = self.clock.monotonic()
+		while heap and heap[0][0] <= now:
+			due, n, scheduled = heapq.heappop(heap)
+			if scheduled.cancelled:
+				continue
+			late = now - due
+			scheduled.runs += 1
+			scheduled.late_total += late
+			scheduled.late_max = max(scheduled.late_max, late)
+			if scheduled.interval is not None:
+				# skip runs that were missed entirely rather than bursting to catch up.
+				scheduled.due = due + scheduled.interval * (1 + int(late // scheduled.interval))
+				self.schedule(scheduled)
+			scheduled.callback()
+
+	def run(self):
+		self.running = True
+		while self.running:
+			self.run_once()
+
+	def stop(self):
+		self.running = False
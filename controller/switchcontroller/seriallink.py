@@ -0,0 +1,361 @@
+import binascii
+import os
+import selectors
+import threading
+
+import serial
+
+from .clock import Clock, VirtualClock
+from .frames import hex_values, hex_word, hex_words, neutral_state
+
+
+def write_serial(ser, message):
+	# pyserial copies anything that isn't bytes before writing, so go straight to the fd where we can.
+	fd = getattr(ser, 'fd', None)
+	if fd is None:
+		ser.write(message)
+		return
+	try:
+		written = os.write(fd, message)
+	except BlockingIOError:
+		# pyserial opens ports non-blocking. When the output buffer is full its write() waits for room.
+		written = 0
+	if written < len(message):
+		ser.write(message[written:])
+
+
+class FirmwareEmulator():
+	"""Stands in for the board on the other end of the serial port.
+
+	Frames are parsed the way Serial_Task in Joystick.c parses them, and every
+	USB poll, one per `period` seconds, is acked the way HID_Task acks it. Reads
+	honour `timeout` like pyserial. The state the console would see is kept in
+	`state`, in the same 7-byte layout the host packs.
+	"""
+
+	def __init__(self, timeout=None, period=0.008, clock=None):
+		self.clock = Clock() if clock is None else clock
+		self.timeout = timeout
+		self.period = period
+		# ticks are counted in integer ns, float seconds drift off a poll boundary.
+		self.period_ns = round(period * 1e9)
+		self.state = bytearray(7)
+		self.b = bytearray(8)
+		self.l = 0
+		self.seq = 0
+		self.seq_mode = False
+		self.out = bytearray()
+		self.start = self.clock.monotonic_ns()
+		self.polls = 0
+
+	def poll(self):
+		due = (self.clock.monotonic_ns() - self.start) // self.period_ns
+		while self.polls < due:
+			self.polls += 1
+			if self.seq_mode:
+				self.out += b'S%02x' % self.seq
+			else:
+				self.out += b'U'
+
+	def write(self, data):
+		# polls that happened before this write saw the old state.
+		self.poll()
+		for c in bytes(data):
+			if c == 13 or c == 10:
+				if self.l == 14 or self.l == 16:
+					self.state[:] = self.b[:7]
+					self.seq_mode = self.l == 16
+					self.seq = self.b[7]
+				self.l = 0
+				self.b[:] = bytes(8)
+			else:
+				val = hex_values.get(c)
+				if val is None:
+					# ignore none-hex and line endings
+					continue
+				elif self.l < 16:
+					self.b[self.l // 2] |= val << (4 * ((self.l + 1) % 2))
+					self.l += 1
+				else:
+					self.l = 0xff
+		return len(data)
+
+	def read(self, size=1):
+		deadline = None if self.timeout is None else self.clock.monotonic_ns() + round(self.timeout * 1e9)
+		self.poll()
+		while len(self.out) < size:
+			wait = self.start + (self.polls + 1) * self.period_ns - self.clock.monotonic_ns()
+			if deadline is not None:
+				wait = min(wait, deadline - self.clock.monotonic_ns())
+			if wait > 0:
+				self.clock.sleep(wait / 1e9)
+			self.poll()
+			if deadline is not None and self.clock.monotonic_ns() >= deadline:
+				break
+		data = bytes(self.out[:size])
+		del self.out[:size]
+		return data
+
+	@property
+	def in_waiting(self):
+		self.poll()
+		return len(self.out)
+
+	def reset_input_buffer(self):
+		self.poll()
+		del self.out[:]
+
+	def close(self):
+		pass
+
+
+class SerialWatchdog():
+	"""Owns the primary serial port and keeps the link to the board alive.
+
+	wait_ack() waits at most `timeout` seconds for a 'U'. When none arrives the
+	link is resynchronised: a newline terminates any half-received line on the
+	board, stale input is dropped and the last frame is sent again. The port is
+	only closed and reopened when it errors, or when it has vanished (an
+	unplugged adapter) after `attempts` failed resyncs. Reopens back off
+	exponentially, across the whole outage, up to `max_backoff` seconds.
+
+	With `sequenced` set every frame carries a sequence number, which the board
+	echoes in its acks as 'S' and two hex digits. That makes it possible to
+	count frames that were never applied and to time each frame's write to its
+	own ack. With `emulate` set a FirmwareEmulator replaces the serial port.
+
+	cancel() makes a wait for an ack, or for the port to come back, give up,
+	for another thread that wants the link's user to stop.
+	"""
+
+	def __init__(self, port, baud_rate, timeout=0.05, attempts=3, max_backoff=2.0, sequenced=False, emulate=False, clock=None):
+		self.port = port
+		self.baud_rate = baud_rate
+		self.timeout = timeout
+		self.attempts = attempts
+		self.max_backoff = max_backoff
+		self.sequenced = sequenced
+		self.emulate = emulate
+		self.clock = Clock() if clock is None else clock
+		self.ser = None
+		self.last = neutral_state
+		self.seq = 0
+		self.seqline = bytearray(17)
+		self.seqline[16] = ord('\n')
+		self.seqview = memoryview(self.seqline)
+		self.seq_applied = True
+		self.seq_sent_ns = 0
+		self.sent = 0
+		self.applied = 0
+		self.lost = 0
+		self.latency_total = 0
+		self.latency_max = 0
+		self.misses = 0
+		self.outage_start = None
+		self.outage_reopens = 0
+		self.backoff = 0
+		self.resyncs = 0
+		self.reopens = 0
+		self.outages = []
+		self.cancelled = threading.Event()
+
+	def __enter__(self):
+		self.cancelled.clear()
+		self.open()
+		print('Using {:s} at {:d} baud for comms.'.format(self.port, self.baud_rate))
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+		if self.outages or self.resyncs:
+			print('Serial watchdog on {:s}: {:d} outages, {:d} resyncs, {:d} reopens, longest outage {:.3f} s, total {:.3f} s.'.format(
+				self.port, len(self.outages), self.resyncs, self.reopens, max(self.outages, default=0), sum(self.outages)))
+		if self.emulate:
+			print('Emulated {:d} polls, {:.3f} s. Final state: {:s}.'.format(
+				self.ser.polls, self.ser.polls * self.ser.period, binascii.hexlify(self.ser.state).decode('utf8')))
+		if self.sequenced and self.sent:
+			print('Sequenced frames on {:s}: {:d} sent, {:d} applied, {:d} lost, latency mean {:.3f} ms, max {:.3f} ms.'.format(
+				self.port, self.sent, self.applied, self.lost, self.latency_total / max(self.applied, 1) / 1e6, self.latency_max / 1e6))
+
+	def open(self):
+		if self.emulate:
+			self.ser = FirmwareEmulator(self.timeout, clock=self.clock)
+			return
+		self.ser = serial.Serial(self.port, self.baud_rate, bytesize=serial.EIGHTBITS, parity=serial.PARITY_NONE, stopbits=serial.STOPBITS_ONE, timeout=self.timeout)
+
+	def close(self):
+		if self.ser is not None:
+			self.ser.close()
+
+	def fail(self, reason):
+		if self.outage_start is None:
+			self.outage_start = self.clock.monotonic()
+			print('Serial link to {:s} lost ({:s}).'.format(self.port, reason))
+
+	def cancel(self):
+		self.cancelled.set()
+
+	def pause(self, seconds):
+		# on real time, wait on the cancel event so that cancel() cuts a backoff short.
+		if isinstance(self.clock, VirtualClock):
+			self.clock.sleep(seconds)
+		elif seconds > 0:
+			self.cancelled.wait(seconds)
+
+	def reopen(self):
+		# one loop rather than reopen and resync calling each other, so a port
+		# that keeps opening but fails every write can't exhaust the stack.
+		while not self.cancelled.is_set():
+			self.close()
+			# the backoff carries over between reopens, so a port that opens but
+			# fails straight away isn't reopened in a tight loop.
+			self.pause(self.backoff)
+			self.backoff = min(max(self.backoff * 2, 0.01), self.max_backoff)
+			try:
+				self.open()
+			except (serial.SerialException, OSError):
+				continue
+			self.reopens += 1
+			self.outage_reopens += 1
+			self.misses = 0
+			if self.send_last():
+				self.resyncs += 1
+				return
+
+	def resync(self):
+		if self.send_last():
+			self.resyncs += 1
+		else:
+			self.fail('write failed')
+			self.reopen()
+
+	def send_last(self):
+		# a newline ends any half-received line, then the last frame goes again.
+		try:
+			self.ser.write(b'\n')
+			self.ser.reset_input_buffer()
+			write_serial(self.ser, self.last)
+		except (serial.SerialException, OSError):
+			return False
+		return True
+
+	def write(self, message):
+		if self.sequenced:
+			if not self.seq_applied:
+				# replaced before the console ever saw it.
+				self.lost += 1
+			self.seq = (self.seq + 1) & 0xff
+			self.seqline[0:14] = message[0:14]
+			hex_word.pack_into(self.seqline, 14, hex_words[self.seq])
+			self.seq_applied = False
+			self.seq_sent_ns = self.clock.monotonic_ns()
+			self.sent += 1
+			message = self.seqview
+		self.last = message
+		try:
+			write_serial(self.ser, message)
+		except (serial.SerialException, OSError):
+			self.fail('write failed')
+			self.reopen()
+
+	def wait_ack(self):
+		"""Waits for the board to ask for the next frame. Returns False if
+		cancelled first."""
+		while not self.cancelled.is_set():
+			try:
+				response = self.ser.read(1)
+				# an 'S' ack is followed by the sequence number, read under the same guard.
+				digits = self.ser.read(2) if response == b'S' else None
+			except (serial.SerialException, OSError):
+				self.fail('read failed')
+				self.reopen()
+				continue
+			if response == b'U':
+				self.acked()
+				return True
+			elif response == b'S':
+				try:
+					seq = int(digits, 16)
+				except ValueError:
+					continue
+				self.acked()
+				if seq == self.seq and not self.seq_applied:
+					latency = self.clock.monotonic_ns() - self.seq_sent_ns
+					self.latency_total += latency
+					self.latency_max = max(self.latency_max, latency)
+					self.seq_applied = True
+					self.applied += 1
+				return True
+			elif response == b'X':
+				print('Arduino reported buffer overrun.')
+			elif response == b'':
+				self.missed()
+		return False
+
+	def drain(self):
+		"""Drops acks that piled up while no frames were sent, and returns how
+		many bytes there were. In sequenced mode the last frame's ack may be
+		among them."""
+		try:
+			waiting = self.ser.in_waiting
+			data = self.ser.read(waiting) if waiting else b''
+		except (serial.SerialException, OSError):
+			self.fail('read failed')
+			self.reopen()
+			return 0
+		if waiting:
+			self.acked()
+			if self.sequenced and not self.seq_applied and b'S%02x' % self.seq in data:
+				self.seq_applied = True
+				self.applied += 1
+		return waiting
+
+	def read_waiting(self):
+		"""Reads the acks the board has sent, waiting up to `timeout` for the
+		first. The port is reopened if it errors, so callers selecting on its
+		fd must check `reopens`."""
+		try:
+			return self.ser.read(self.ser.in_waiting or 1)
+		except (serial.SerialException, OSError):
+			self.fail('read failed')
+			self.reopen()
+			return b''
+
+	def acked(self):
+		self.misses = 0
+		self.backoff = 0
+		if self.outage_start is not None:
+			outage = self.clock.monotonic() - self.outage_start
+			self.outages.append(outage)
+			self.outage_start = None
+			print('Serial link to {:s} recovered after {:.3f} s, {:d} reopens.'.format(self.port, outage, self.outage_reopens))
+			self.outage_reopens = 0
+
+	def vanished(self):
+		# serial ports on Windows aren't files, so only a failed open tells there.
+		return os.name == 'posix' and not self.emulate and not os.path.exists(self.port)
+
+	def missed(self):
+		self.fail('no ack for {:.3f} s'.format(self.timeout))
+		self.misses += 1
+		if self.misses > self.attempts and self.vanished():
+			self.reopen()
+		else:
+			# a board that stopped acking is resynced, reopening a working port doesn't help it.
+			self.resync()
+
+
+def watch_link(selector, watched, n, link):
+	"""Keeps link `n` registered with `selector` under its current fd. The
+	watchdog gets a new fd, maybe with the old number, whenever it reopens
+	the port, so `watched` holds each link's reopen count and fd as last
+	registered, starting from (None, None)."""
+	reopens, fd = watched[n]
+	if reopens == link.reopens:
+		return
+	if fd is not None:
+		# the old fd is closed, the selector only has to forget it.
+		selector.unregister(fd)
+	fd = link.ser.fileno()
+	selector.register(fd, selectors.EVENT_READ, n)
+	watched[n] = (link.reopens, fd)
@@ -0,0 +1,77 @@
+import threading
+import time
+
+import serial
+
+
+class SerialWriter():
+	"""Writes to one serial port from its own thread.
+
+	send() only leaves the line in a one-slot mailbox and returns, so a slow or
+	stalled port never holds up the caller or the other ports. The board only
+	cares about the latest state, so a line that is still waiting when the next
+	one arrives is replaced rather than queued.
+	"""
+
+	def __init__(self, ser, name=None):
+		self.ser = ser
+		self.name = ser.port if name is None else name
+		self.condition = threading.Condition()
+		self.pending = None
+		self.running = True
+		self.writes = 0
+		self.replaced = 0
+		self.errors = 0
+		self.lastError = None
+		self.latencyTotal = 0
+		self.latencyMax = 0
+		self.thread = threading.Thread(target=self.run, name="writer " + self.name, daemon=True)
+		self.thread.start()
+
+	def send(self, data):
+		with self.condition:
+			if self.pending is not None:
+				self.replaced += 1
+			self.pending = (data, time.perf_counter())
+			self.condition.notify()
+
+	def run(self):
+		while True:
+			with self.condition:
+				while self.pending is None and self.running:
+					self.condition.wait()
+				if not self.running:
+					return
+				data, queued = self.pending
+				self.pending = None
+			try:
+				self.ser.write(data)
+			except (serial.SerialException, OSError) as e:
+				self.errors += 1
+				self.lastError = e
+				continue
+			# from send() to the write returning, including time spent waiting for the port.
+			latency = time.perf_counter() - queued
+			self.writes += 1
+			self.latencyTotal += latency
+			self.latencyMax = max(self.latencyMax, latency)
+
+	def close(self):
+		with self.condition:
+			self.running = False
+			self.condition.notify()
+		self.thread.join()
+
+	def stats(self):
+		return {
+			"writes": self.writes,
+			"replaced": self.replaced,
+			"errors": self.errors,
+			"latency_mean": self.latencyTotal / self.writes if self.writes else 0,
+			"latency_max": self.latencyMax,
+		}
+
+	def summary(self):
+		stats = self.stats()
+		return "{:s}: {:d} writes, {:d} replaced, {:d} errors, latency {:.2f} ms mean, {:.2f} ms max.".format(
+			self.name, stats["writes"], stats["replaced"], stats["errors"], stats["latency_mean"] * 1000, stats["latency_max"] * 1000)
@@ -0,0 +1,237 @@
+import binascii
+import collections
+import socket
+import threading
+import time
+
+import serial
+
+from .seriallink import write_serial
+from .statebus import StateBus
+
+
+class NullSink():
+	def write(self, message):
+		pass
+
+	def close(self):
+		pass
+
+
+class FileSink():
+	def __init__(self, filename):
+		self.f = open(filename, 'wb')
+
+	def write(self, message):
+		self.f.write(message)
+
+	def close(self):
+		self.f.close()
+
+
+class SerialSink():
+	def __init__(self, ser):
+		self.ser = ser
+
+	def write(self, message):
+		write_serial(self.ser, message)
+		if self.ser.in_waiting:
+			# nobody waits for a mirror's acks, so don't let them pile up.
+			self.ser.reset_input_buffer()
+
+	def close(self):
+		self.ser.close()
+
+
+class BusSink():
+	"""Publishes every frame to a StateBus slot, for a bus daemon to send."""
+
+	def __init__(self, bus, slot):
+		self.bus = bus
+		self.slot = slot
+
+	def write(self, message):
+		self.bus.publish(self.slot, binascii.a2b_hex(message[:14]))
+
+	def close(self):
+		self.bus.close()
+
+
+class DatagramSink():
+	def __init__(self, family, address):
+		self.sock = socket.socket(family, socket.SOCK_DGRAM)
+		self.sock.connect(address)
+
+	def write(self, message):
+		try:
+			self.sock.send(message)
+		except ConnectionRefusedError:
+			# nobody listening yet, datagrams are fire and forget anyway.
+			pass
+
+	def close(self):
+		self.sock.close()
+
+
+def open_sink(spec, baud_rate=115200):
+	"""Build a sink from a spec like 'serial:/dev/ttyUSB1', 'file:out.txt', 'unix:/tmp/sock', 'udp:host:port',
+	'bus:name:slot' or 'null'."""
+	kind, _, target = spec.partition(':')
+	if kind == 'serial':
+		return SerialSink(serial.Serial(target, baud_rate, bytesize=serial.EIGHTBITS, parity=serial.PARITY_NONE, stopbits=serial.STOPBITS_ONE))
+	elif kind == 'file':
+		return FileSink(target)
+	elif kind == 'unix':
+		return DatagramSink(socket.AF_UNIX, target)
+	elif kind == 'udp':
+		host, _, port = target.rpartition(':')
+		return DatagramSink(socket.AF_INET, (host, int(port)))
+	elif kind == 'bus':
+		name, _, slot = target.rpartition(':')
+		return BusSink(StateBus(name), int(slot))
+	elif kind == 'null':
+		return NullSink()
+	raise Exception('Unknown sink: {:s}'.format(spec))
+
+
+def add_sink(tee, spec, baud_rate=115200):
+	# a spec for open_sink, optionally followed by @block, @drop or @latest.
+	spec, _, policy = spec.partition('@')
+	if not policy:
+		policy = 'block' if spec.startswith(('file', 'null')) else 'latest'
+	return tee.add(open_sink(spec, baud_rate), spec, policy)
+
+
+class SinkStats():
+	def __init__(self):
+		self.written = 0
+		self.dropped = 0
+		self.errors = 0
+		self.max_write_ns = 0
+
+
+class BlockingSink():
+	"""Writes in the caller's thread. Errors propagate to the caller."""
+
+	def __init__(self, sink, name):
+		self.sink = sink
+		self.name = name
+		self.stats = SinkStats()
+
+	def write(self, message):
+		start = time.monotonic_ns()
+		self.sink.write(message)
+		self.stats.max_write_ns = max(self.stats.max_write_ns, time.monotonic_ns() - start)
+		self.stats.written += 1
+
+	def close(self):
+		self.sink.close()
+
+
+class ThreadedSink():
+	"""Writes from a worker thread so a slow sink never stalls the others.
+
+	With the 'drop' policy new frames are discarded while `depth` frames are
+	already waiting. With 'latest' the oldest waiting frame is discarded instead.
+	Frames are copied into preallocated slots because encoders reuse their
+	buffers. Write errors are counted rather than raised.
+	"""
+
+	def __init__(self, sink, name, policy, depth=1):
+		self.sink = sink
+		self.name = name
+		self.policy = policy
+		self.depth = depth
+		self.stats = SinkStats()
+		# one slot more than depth, for the frame the worker is writing.
+		self.free = [bytearray(15) for n in range(depth + 1)]
+		self.pending = collections.deque()
+		self.cond = threading.Condition()
+		self.running = True
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+
+	def write(self, message):
+		with self.cond:
+			if len(self.pending) == self.depth:
+				self.stats.dropped += 1
+				if self.policy == 'drop':
+					return
+				slot = self.pending.popleft()
+			else:
+				slot = self.free.pop()
+			slot[:] = message
+			self.pending.append(slot)
+			self.cond.notify()
+
+	def run(self):
+		while True:
+			with self.cond:
+				while self.running and not self.pending:
+					self.cond.wait()
+				if not self.pending:
+					return
+				slot = self.pending.popleft()
+			start = time.monotonic_ns()
+			try:
+				self.sink.write(slot)
+			except (OSError, serial.SerialException):
+				self.stats.errors += 1
+			else:
+				self.stats.max_write_ns = max(self.stats.max_write_ns, time.monotonic_ns() - start)
+				self.stats.written += 1
+			with self.cond:
+				self.free.append(slot)
+
+	def close(self):
+		with self.cond:
+			self.running = False
+			self.cond.notify()
+		self.thread.join()
+		self.sink.close()
+
+
+class Tee():
+	"""Deliver each encoded frame to any number of sinks.
+
+	Every sink receives the very same buffer, so adding sinks costs no extra
+	encoding. Each sink has its own backpressure policy: 'block' writes inline,
+	'drop' and 'latest' hand off to a worker thread.
+	"""
+
+	policies = ('block', 'drop', 'latest')
+
+	def __init__(self):
+		self.sinks = []
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		for sink in self.sinks:
+			sink.close()
+		self.print_stats()
+		self.sinks = []
+
+	def add(self, sink, name, policy='block', depth=1):
+		if policy == 'block':
+			stage = BlockingSink(sink, name)
+		elif policy in self.policies:
+			stage = ThreadedSink(sink, name, policy, depth)
+		else:
+			raise Exception('Unknown sink policy: {:s}'.format(policy))
+		self.sinks.append(stage)
+		return stage
+
+	def remove(self, stage):
+		self.sinks.remove(stage)
+		stage.close()
+
+	def write(self, message):
+		for sink in self.sinks:
+			sink.write(message)
+
+	def print_stats(self):
+		for sink in self.sinks:
+			print('Sink {:s}: {:d} written, {:d} dropped, {:d} errors, slowest write {:.3f} ms.'.format(
+				sink.name, sink.stats.written, sink.stats.dropped, sink.stats.errors, sink.stats.max_write_ns / 1e6))
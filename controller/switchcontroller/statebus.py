@@ -0,0 +1,115 @@
+import os
+from multiprocessing import shared_memory
+from struct import Struct
+
+
+# shared memory layout: a header, then one fixed-size slot per controller.
+bus_magic = b'SCSB'
+bus_version = 1
+bus_header = Struct('<4sHH')      # magic, version, slots
+bus_seq = Struct('=I')            # even when the slot is stable, odd while it is being written
+bus_state = Struct('>BHBBBB')     # hat, buttons, lx, ly, rx, ry, the layout bridge.py sends
+bus_slot_size = 16                # seq, state, padding
+
+neutral_state = bus_state.pack(8, 0, 128, 128, 128, 128)
+
+# bits of the buttons field, in the order the text protocol lists them after the dpad:
+# lstick, l, zl, minus, capture, a, b, x, y, rstick, r, zr, plus, home.
+text_buttons = (0x400, 0x10, 0x40, 0x100, 0x2000, 0x04, 0x02, 0x08, 0x01, 0x800, 0x20, 0x80, 0x200, 0x1000)
+
+
+def text_state(line):
+	"""Packs a text protocol line like "800000000000000 128 128 128 128" into a
+	bus state. Anything else (like "RELEASE") is the neutral state."""
+	fields = line.split()
+	if len(fields) != 5 or len(fields[0]) != 1 + len(text_buttons):
+		return neutral_state
+	buttons = 0
+	for bit, pressed in zip(text_buttons, fields[0][1:]):
+		if pressed == '1':
+			buttons |= bit
+	lx, ly, rx, ry = (max(0, min(255, int(v))) for v in fields[1:])
+	return bus_state.pack(int(fields[0][0]), buttons, lx, ly, rx, ry)
+
+
+class StateBus():
+	"""One controller state per slot in shared memory, guarded by a seqlock.
+
+	Frontends publish() to their own slot, an output daemon (bridge.py --bus)
+	reads every slot and owns the serial ports. Each slot must have a single
+	publisher. Readers never block a publisher, they retry if a slot changed
+	while they were copying it.
+	"""
+
+	def __init__(self, name='switch-controller', slots=4, create=False):
+		self.name = name
+		self.create = create
+		if create:
+			self.shm = shared_memory.SharedMemory(name, create=True, size=bus_header.size + slots * bus_slot_size)
+			bus_header.pack_into(self.shm.buf, 0, bus_magic, bus_version, slots)
+			for slot in range(slots):
+				offset = bus_header.size + slot * bus_slot_size + bus_seq.size
+				self.shm.buf[offset:offset + bus_state.size] = neutral_state
+		else:
+			self.shm = shared_memory.SharedMemory(name)
+			if os.name == 'posix':
+				# attaching must not unlink the segment when this process exits, only the creator may.
+				from multiprocessing import resource_tracker
+				resource_tracker.unregister(self.shm._name, 'shared_memory')
+		magic, version, self.slots = bus_header.unpack_from(self.shm.buf)
+		if magic != bus_magic or version != bus_version:
+			raise Exception('{:s} is not a controller state bus.'.format(name))
+		self.seqs = [0] * self.slots
+		# struct.pack_into clears a field before writing it byte by byte, so a reader
+		# could catch a sequence number that was never published. A cast view loads
+		# and stores each one as a single aligned word.
+		self.seq_words = self.shm.buf.cast('I')
+		# a copy only reaches the caller once the sequence number shows it is whole.
+		self.scratch = bytearray(bus_state.size)
+		self.retries = 0
+
+	def publish(self, slot, state):
+		offset = bus_header.size + slot * bus_slot_size
+		word = offset // bus_seq.size
+		seq = self.seqs[slot]
+		if seq == 0:
+			# pick up where an earlier publisher of this slot left off.
+			seq = self.seq_words[word] & ~1
+		self.seq_words[word] = (seq + 1) & 0xffffffff
+		self.shm.buf[offset + bus_seq.size:offset + bus_seq.size + bus_state.size] = state
+		seq = (seq + 2) & 0xffffffff
+		self.seq_words[word] = seq
+		self.seqs[slot] = seq
+
+	def read(self, slot, out):
+		"""Copies the state in `slot` into `out` and returns its sequence number,
+		which changes every time the slot is published to. If the slot stays
+		mid-write, `out` keeps what it held and the odd sequence number is returned."""
+		offset = bus_header.size + slot * bus_slot_size
+		word = offset // bus_seq.size
+		buf = self.shm.buf
+		words = self.seq_words
+		scratch = self.scratch
+		for attempt in range(1000):
+			seq = words[word]
+			if not seq & 1:
+				scratch[:] = buf[offset + bus_seq.size:offset + bus_seq.size + bus_state.size]
+				if words[word] == seq:
+					out[:] = scratch
+					return seq
+			self.retries += 1
+		# the publisher died or stalled halfway through a write. What is there may
+		# be torn, so leave the caller the last whole state it read.
+		return seq | 1
+
+	def close(self):
+		self.seq_words.release()
+		self.shm.close()
+		if self.create:
+			self.shm.unlink()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
@@ -9,9 +9,11 @@ import win32con
 
 # for time delaying the input:
 from threading import Timer
-import time
 from math import sqrt
 
+from .serialwriter import SerialWriter
+from .statebus import bus_state, text_state
+
 
 STICK_MIN		= 0
 STICK_MAX		= 255
@@ -27,6 +29,7 @@ DPAD_LEFT        = 0x06
 DPAD_UP_LEFT     = 0x07
 DPAD_CENTER      = 0x08
 
+
 class SwitchController():
 
 	def __init__(self):
@@ -60,6 +63,17 @@ class SwitchController():
 
 		self.output = ""
 
+		# optional FlightRecorder, and the port number to record under.
+		self.recorder = None
+		self.recorderPort = 0
+
+		# set by connectBus, to publish to a StateBus instead of a serial port.
+		self.bus = None
+		self.busSlot = 0
+
+		# set by connect(port, threaded=True), to write from a SerialWriter thread.
+		self.writer = None
+
 	def reset(self):
 
 		self.dpad 		= DPAD_CENTER
@@ -115,13 +129,37 @@ class SwitchController():
 		self.output += " " + str(self.RX)
 		self.output += " " + str(self.RY)
 
+	def getState(self):
+		# the packed state bridge.py and the StateBus use.
+		buttons = 0
+		for bit, pressed in enumerate((self.y, self.b, self.a, self.x, self.l, self.r, self.zl, self.zr,
+									   self.minus, self.plus, self.lstick, self.rstick, self.home, self.capture)):
+			if pressed:
+				buttons |= 1 << bit
+		return bus_state.pack(self.dpad, buttons, self.LX, self.LY, self.RX, self.RY)
+
 	def send(self, msg):
+		data = f'{msg}\r\n'.encode('utf-8')
+		if self.recorder is not None:
+			self.recorder.record(self.recorderPort, data)
+		if self.bus is not None:
+			self.bus.publish(self.busSlot, self.getState() if msg == self.output else text_state(msg))
+			return
+		if self.writer is not None:
+			self.writer.send(data)
+			return
 		try:
-			self.ser.write(f'{msg}\r\n'.encode('utf-8'));
+			self.ser.write(data);
 		except:
 			print("some write error")
 			pass
 
 
-	def connect(self, port):
-		self.ser = serial.Serial(port, 38400)
\ No newline at end of file
+	def connect(self, port, threaded=False):
+		self.ser = serial.Serial(port, 38400)
+		if threaded:
+			self.writer = SerialWriter(self.ser)
+
+	def connectBus(self, bus, slot):
+		self.bus = bus
+		self.busSlot = slot
\ No newline at end of file
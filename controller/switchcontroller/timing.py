@@ -0,0 +1,48 @@
+import statistics
+from struct import Struct
+
+
+# timing sidecar: a header, then one (write, ack) pair of monotonic ns per recorded frame.
+timing_magic = b'SCTM'
+timing_version = 1
+timing_header = Struct('<4sI')
+timing_record = Struct('<QQ')
+
+
+def read_timing(filename):
+	with open(filename, 'rb') as f:
+		data = f.read()
+	magic, version = timing_header.unpack_from(data)
+	if magic != timing_magic or version != timing_version:
+		raise Exception('Not a timing sidecar: {:s}'.format(filename))
+	return list(timing_record.iter_unpack(data[timing_header.size:]))
+
+
+def analyze_timing(filename, worst=5):
+	records = read_timing(filename)
+	if len(records) < 2:
+		print('Not enough frames in {:s}.'.format(filename))
+		return
+
+	writes = [w for w, a in records]
+	acks = [a for w, a in records]
+	intervals = [b - a for a, b in zip(acks, acks[1:])]
+	latencies = [a - w for w, a in records]
+
+	# the median ack interval is the poll period the console settled on.
+	period = statistics.median(intervals)
+	missed = 0
+	for interval in intervals:
+		if interval > 1.5 * period:
+			missed += round(interval / period) - 1
+	rate = len(intervals) * 1e9 / (acks[-1] - acks[0])
+
+	print('{:d} frames over {:.3f} s.'.format(len(records), (acks[-1] - writes[0]) / 1e9))
+	print('Effective poll rate: {:.2f} Hz, nominal period {:.3f} ms.'.format(rate, period / 1e6))
+	print('Ack interval: mean {:.3f} ms, jitter (stdev) {:.3f} ms, min {:.3f} ms, max {:.3f} ms.'.format(
+		statistics.mean(intervals) / 1e6, statistics.pstdev(intervals) / 1e6, min(intervals) / 1e6, max(intervals) / 1e6))
+	print('Write to ack: mean {:.3f} ms, max {:.3f} ms.'.format(statistics.mean(latencies) / 1e6, max(latencies) / 1e6))
+	print('Missed polls: {:d}.'.format(missed))
+	print('Longest gaps:')
+	for n in sorted(range(len(intervals)), key=intervals.__getitem__, reverse=True)[:worst]:
+		print('  frame {:d}: {:.3f} ms'.format(n + 1, intervals[n] / 1e6))
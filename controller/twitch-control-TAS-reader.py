@@ -6,6 +6,11 @@ from time import sleep
 
 # switch controller:
 from switchcontroller.switchcontroller import *
+from switchcontroller.clock import default_clock
+
+# SWITCH_VIRTUAL_CLOCK=1 runs everything below against virtual time.
+clock = default_clock()
+sleep = clock.sleep
 
 # twitch:
 from twitchbot.twitchbot import *
@@ -34,7 +39,7 @@ controller.connect("COM6")
 twitchBot = TwitchBot()
 twitchBot.connect(HOST, PASS2, PORT, CHAN, NICK2)
 
-start = time.clock()
+start = clock.monotonic()
 
 def delayed_reset(delay=0.1):
 	Timer(delay, controller.reset).start()
@@ -42,17 +47,8 @@ def delayed_reset(delay=0.1):
 
 
 def accurateSleep(duration):
-	s = time.clock()
-	e = time.clock()
-
-	diffInSeconds = 0
-	diffInMilliSeconds = 0
-
-	while (diffInMilliSeconds < duration):
-		e = time.clock()
-		diffInSeconds = e - s
-		diffInMilliSeconds = diffInSeconds*1000
-		#sleep(0.0000001)
+	# duration is in milliseconds.
+	clock.busy_sleep(duration / 1000)
 
 def send_and_reset(duration=0.1, reset=1):
 	controller.getOutput()
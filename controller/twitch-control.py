@@ -1,11 +1,24 @@
 
 # time
 from threading import Timer
+import collections
+import functools
 import time
 from time import sleep
 
 # switch controller:
 from switchcontroller.switchcontroller import *
+from switchcontroller.clock import default_clock
+from switchcontroller.flightrecorder import FlightRecorder
+from switchcontroller.statebus import StateBus
+from switchcontroller.chatparser import ChatParser
+from switchcontroller.commandqueue import CommandQueue
+from switchcontroller.scheduler import Scheduler
+from switchcontroller.pressengine import PressEngine
+
+# SWITCH_VIRTUAL_CLOCK=1 runs everything below against virtual time.
+clock = default_clock()
+sleep = clock.sleep
 
 # twitch:
 from twitchbot.twitchbot import *
@@ -46,6 +59,12 @@ import numpy as np
 # save info
 import pickle
 
+import argparse
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--bus', type=str, default=None, help='Publish to this StateBus (bridge.py --bus) instead of opening the COM ports.')
+args = parser.parse_args()
+
 
 screenWidth, screenHeight = pyautogui.size()
 x = screenWidth/2
@@ -58,29 +77,43 @@ controller2 = SwitchController()
 controller3 = SwitchController()
 controller4 = SwitchController()
 
-try:
-	controller1.connect("COM3")
-except:
-	print("controller1 error")
-
-try:
-	controller2.connect("COM6")
-except:
-	print("controller2 error")
-	pass
+if args.bus is not None:
+	# bridge.py --bus owns the serial ports, controllers publish to slots 0-3.
+	bus = StateBus(args.bus)
+	for n, controller in enumerate([controller1, controller2, controller3, controller4]):
+		controller.connectBus(bus, n)
+else:
+	# each port gets its own writer thread, so a stalled board doesn't hold up the others.
+	try:
+		controller1.connect("COM3", threaded=True)
+	except:
+		print("controller1 error")
+
+	try:
+		controller2.connect("COM6", threaded=True)
+	except:
+		print("controller2 error")
+		pass
 
-try:
-	controller3.connect("COM9")
-except:
-	print("controller3 error")
-	pass
+	try:
+		controller3.connect("COM9", threaded=True)
+	except:
+		print("controller3 error")
+		pass
 
-try:
-	controller4.connect("COM10")
-except:
-	print("controller4 error")
-	pass
+	try:
+		controller4.connect("COM10", threaded=True)
+	except:
+		print("controller4 error")
+		pass
 
+# keeps the last 10 minutes of everything sent to the boards, dumped on a crash,
+# on Ctrl+Break, or with !flightdump.
+recorder = FlightRecorder(60 * 10, clock=clock)
+recorder.install()
+for n, controller in enumerate([controller1, controller2, controller3, controller4]):
+	controller.recorder = recorder
+	controller.recorderPort = n
 
 twitchBot = TwitchBot()
 twitchBot.connect(HOST, PASS2, PORT, CHAN, NICK2)
@@ -90,13 +123,8 @@ def delayed_reset(delay=0.1):
 
 
 def accurateSleep(duration):
-	s = time.clock()
-	e = time.clock()
-	diffInMilliSeconds = 0
-
-	while (diffInMilliSeconds < duration):
-		e = time.clock()
-		diffInMilliSeconds = (e - s)*1000
+	# duration is in milliseconds.
+	clock.busy_sleep(duration / 1000)
 
 def send_and_reset(duration=0.1, reset=1, cNum=0):
 	controller = None
@@ -111,8 +139,9 @@ def send_and_reset(duration=0.1, reset=1, cNum=0):
 
 	controller.getOutput()
 	controller.send(controller.output)
-	accurateSleep(duration)
 	if(reset):
+		# duration is in seconds. This blocks, chat moves go through the PressEngine instead.
+		accurateSleep(duration * 1000)
 		controller.reset()
 		controller.getOutput()
 		controller.send(controller.output)
@@ -123,30 +152,225 @@ def round_down(num, divisor):
 
 
 gotoList = ["snipperclips", "mk8", "human", "shovel", "octopath", "explosion", "jackbox4", "jackbox3", "fallout", "skyrim", "splatoon2", "celeste", "smo", "rocketleague", "pokemonquest", "wizard", "sonic", "arms", "kirby", "fortnite", "torquel", "botw"]
-validCommands = ["!setforfeitlength", "!setturnlength", "!banlist", "!disableinternet", "!enableinternet", "!forcerefresh", "nay", "yea", "!enablechat", "!disablechat", "!enablegoto", "!disablegoto", "!unmod", "!mod", "!fixcontrollers", "!goto snipperclips", "!pluslist", "!unban", "!ban", "!removeplus", "!giveplus", "!goto human", "!goto shovel", "!goto octopath", "!goto explosion", "!goto jackbox4", "!goto jackbox3", "!commands", "!goto fallout", "!goto fortnite", "!goto torquel", "!goto pokemonquest", "!restart", "!restart1", "!restart2", "!restart3", "!restartscript", "!restartserver", "!help", "votenay", "voteyea", "!goto wizard", "!goto cave", "!goto sonic", "!goto skyrim", "!goto rocketleague", "!goto arms", "!goto celeste", "!goto mk8", "!goto splatoon2", "!goto isaac", "!goto mario", "!goto botw", "!goto kirby", "!goto smo", "!goto", "lockon", "hhsprint", "hsprint", "sprint", "!controls", "!goto", "home", "lstick", "rstick", "spin", "swim", "back flip", "ground pound", "groundpound", "gp", "bf", "cap bounce", "sdive", "sdive2", "hdive", "hdive2", "hdive3", "dive", "dive2", "dive3", "roll", "roll2", "backflip", "backflip2", "sssu", "sssd", "sssl", "sssr", "sb", "suu", "", "up", "down", "left", "right", "u", "d", "l", "r", "hup", "hdown", "hleft", "hright", "hhup", "hhdown", "hhleft", "hhright", "hu", "hd", "hl", "hr", "su", "sd", "sl", "sr", "sup", "sdown", "sleft", "sright", "ssu", "ssd", "ssl", "ssr", "ssup", "ssdown", "ssleft", "ssright", "look up", "look down", "look left", "look right", "lu", "ld", "ll", "lr", "hlu", "hld", "hll", "hlr", "slu", "sld", "sll", "slr", "dup", "ddown", "dleft", "dright", "du", "dd", "dl", "dr", "a", "b", "x", "y", "ha", "hb", "hx", "hy", "hhb", "hhhb", "l", "zl", "r", "zr", "plus", "minus", "long jump", "long jump2", "long jump3", "jump forward", "jump forward2", "jump back", "jump back2", "dive", "dive2"]
-pluslist = []
-modlist = ["alua2020", "ogcristofer", "stravos96", "yanchan230", "silvermagpi", "twitchplaysconsoles", "fosseisanerd", "tpnsbot"]
+validCommands = ["!portstats", "!queuestats", "!flightdump", "!setforfeitlength", "!setturnlength", "!banlist", "!disableinternet", "!enableinternet", "!forcerefresh", "nay", "yea", "!enablechat", "!disablechat", "!enablegoto", "!disablegoto", "!unmod", "!mod", "!fixcontrollers", "!goto snipperclips", "!pluslist", "!unban", "!ban", "!removeplus", "!giveplus", "!goto human", "!goto shovel", "!goto octopath", "!goto explosion", "!goto jackbox4", "!goto jackbox3", "!commands", "!goto fallout", "!goto fortnite", "!goto torquel", "!goto pokemonquest", "!restart", "!restart1", "!restart2", "!restart3", "!restartscript", "!restartserver", "!help", "votenay", "voteyea", "!goto wizard", "!goto cave", "!goto sonic", "!goto skyrim", "!goto rocketleague", "!goto arms", "!goto celeste", "!goto mk8", "!goto splatoon2", "!goto isaac", "!goto mario", "!goto botw", "!goto kirby", "!goto smo", "!goto", "lockon", "hhsprint", "hsprint", "sprint", "!controls", "!goto", "home", "lstick", "rstick", "spin", "swim", "back flip", "ground pound", "groundpound", "gp", "bf", "cap bounce", "sdive", "sdive2", "hdive", "hdive2", "hdive3", "dive", "dive2", "dive3", "roll", "roll2", "backflip", "backflip2", "sssu", "sssd", "sssl", "sssr", "sb", "suu", "", "up", "down", "left", "right", "u", "d", "l", "r", "hup", "hdown", "hleft", "hright", "hhup", "hhdown", "hhleft", "hhright", "hu", "hd", "hl", "hr", "su", "sd", "sl", "sr", "sup", "sdown", "sleft", "sright", "ssu", "ssd", "ssl", "ssr", "ssup", "ssdown", "ssleft", "ssright", "look up", "look down", "look left", "look right", "lu", "ld", "ll", "lr", "hlu", "hld", "hll", "hlr", "slu", "sld", "sll", "slr", "dup", "ddown", "dleft", "dright", "du", "dd", "dl", "dr", "a", "b", "x", "y", "ha", "hb", "hx", "hy", "hhb", "hhhb", "l", "zl", "r", "zr", "plus", "minus", "long jump", "long jump2", "long jump3", "jump forward", "jump forward2", "jump back", "jump back2", "dive", "dive2"]
+pluslist = set()
+modlist = {"alua2020", "ogcristofer", "stravos96", "yanchan230", "silvermagpi", "twitchplaysconsoles", "fosseisanerd", "tpnsbot"}
 adminlist = ["silvermagpi", "twitchplaysconsoles", "fosseisanerd"]
 banlist = []
 sublist = []
-voted = []
+voted = set()
 singlePlayerGames = ["The Legend of Zelda: Breath of the Wild"]
 
-commandQueue = []
-nextCommands = []
+# chat commands, played fairly between users, and the rest of the move being played.
+commandQueue = CommandQueue(clock=clock)
+nextCommands = collections.deque()
 #lockon = False
 oldArgs = "800000000000000 128 128 128 128"
 
 
+# chat moves: names, controller fields to set, seconds to hold them, whether to
+# reset afterwards (None keeps the default) and moves to queue after this one.
+# A name listed twice gets both entries applied in order, later ones winning.
+spinDuration = 0.001
+moveTable = [
+	(("sssleft", "sssl"), {"LX": STICK_MIN}, 0.01, 1, ()),
+	(("sssright", "sssr"), {"LX": STICK_MAX}, 0.01, 1, ()),
+	(("sssup", "sssu"), {"LY": STICK_MIN}, 0.01, 1, ()),
+	(("sssdown", "sssd"), {"LY": STICK_MAX}, 0.01, 1, ()),
+
+	(("ssleft", "ssl"), {"LX": STICK_MIN}, 0.1, 1, ()),
+	(("ssright", "ssr"), {"LX": STICK_MAX}, 0.1, 1, ()),
+	(("ssup", "ssu"), {"LY": STICK_MIN}, 0.1, 1, ()),
+	(("ssdown", "ssd"), {"LY": STICK_MAX}, 0.1, 1, ()),
+
+	(("sleft", "sl"), {"LX": STICK_MIN}, 0.3, 1, ()),
+	(("sright", "sr"), {"LX": STICK_MAX}, 0.3, 1, ()),
+	(("sup", "su"), {"LY": STICK_MIN}, 0.3, 1, ()),
+	(("sdown", "sd"), {"LY": STICK_MAX}, 0.3, 1, ()),
+
+	(("left", "l"), {"LX": STICK_MIN}, 0.6, 1, ()),
+	(("right", "r"), {"LX": STICK_MAX}, 0.6, 1, ()),
+	(("up", "u"), {"LY": STICK_MIN}, 0.6, 1, ()),
+	(("down", "d"), {"LY": STICK_MAX}, 0.6, 1, ()),
+
+	(("hleft", "hl"), {"LX": STICK_MIN}, 1.5, 1, ()),
+	(("hright", "hr"), {"LX": STICK_MAX}, 1.5, 1, ()),
+	(("hup", "hu"), {"LY": STICK_MIN}, 1.5, 1, ()),
+	(("hdown", "hd"), {"LY": STICK_MAX}, 1.5, 1, ()),
+
+	(("hhleft",), {"LX": STICK_MIN}, 4.0, 1, ()),
+	(("hhright",), {"LX": STICK_MAX}, 4.0, 1, ()),
+	(("hhup",), {"LY": STICK_MIN}, 4.0, 1, ()),
+	(("hhdown",), {"LY": STICK_MAX}, 4.0, 1, ()),
+
+	(("dleft", "dl"), {"dpad": DPAD_LEFT}, 0.3, 1, ()),
+	(("dright", "dr"), {"dpad": DPAD_RIGHT}, 0.3, 1, ()),
+	(("dup", "du"), {"dpad": DPAD_UP}, 0.3, 1, ()),
+	(("ddown", "dd"), {"dpad": DPAD_DOWN}, 0.3, 1, ()),
+
+	(("slook left", "sll"), {"RX": STICK_MIN}, 0.1, 1, ()),
+	(("slook right", "slr"), {"RX": STICK_MAX}, 0.1, 1, ()),
+	(("slook up", "slu"), {"RY": STICK_MIN}, 0.1, 1, ()),
+	(("slook down", "sld"), {"RY": STICK_MAX}, 0.1, 1, ()),
+
+	(("look left", "ll"), {"RX": STICK_MIN}, 0.3, 1, ()),
+	(("look right", "lr"), {"RX": STICK_MAX}, 0.3, 1, ()),
+	(("look up", "lu"), {"RY": STICK_MIN}, 0.3, 1, ()),
+	(("look down", "ld"), {"RY": STICK_MAX}, 0.3, 1, ()),
+
+	(("hlook left", "hll"), {"RX": STICK_MIN}, 0.6, 1, ()),
+	(("hlook right", "hlr"), {"RX": STICK_MAX}, 0.6, 1, ()),
+	(("hlook up", "hlu"), {"RY": STICK_MIN}, 0.6, 1, ()),
+	(("hlook down", "hld"), {"RY": STICK_MAX}, 0.6, 1, ()),
+
+	(("a",), {"a": 1}, 0.3, 1, ()),
+	(("ha",), {"a": 1}, 0.5, 1, ()),
+	(("sb",), {"b": 1}, 0.1, 1, ()),
+	(("b",), {"b": 1}, 0.4, 1, ()),
+	(("hb",), {"b": 1}, 0.5, 1, ()),
+	(("hhb",), {"b": 1}, 0.8, 1, ()),
+	(("hhhb",), {"b": 1}, 1.8, 1, ()),
+	(("x",), {"x": 1}, 0.3, 1, ()),
+	(("hx",), {"x": 1}, 0.5, 1, ()),
+	(("y",), {"y": 1}, 0.3, 1, ()),
+	(("hy",), {"y": 1}, 0.7, 1, ()),
+	(("lstick",), {"lstick": 1}, 0.1, 1, ()),
+	(("rstick",), {"rstick": 1}, 0.1, 1, ()),
+	(("l",), {"l": 1}, 0.1, 1, ()),
+	(("r",), {"r": 1}, 0.1, 1, ()),
+	(("hr",), {"r": 1}, 1, 1, ()),
+	(("zl",), {"zl": 1}, 0.1, 1, ()),
+	(("zr",), {"zr": 1}, 0.1, 1, ()),
+	(("minus",), {"minus": 1}, 0.1, 1, ()),
+	(("plus",), {"plus": 1}, 0.1, 1, ()),
+	(("home",), {"home": 1}, 0.1, 1, ()),
+
+	(("long jump",), {"LY": STICK_MIN}, 0.6, 0, ("long jump2",)),
+	(("long jump2",), {"LY": STICK_MIN, "zl": 1}, 0.01, 0, ("long jump3",)),
+	(("long jump3",), {"LY": STICK_MIN, "b": 1}, 0.1, 0, ("long jump4",)),
+	(("long jump4",), {"LY": STICK_MIN, "b": 1, "zl": 0}, 1, 1, ()),
+
+	(("jump forward",), {"LY": STICK_MIN}, 0.3, 0, ("jump forward2",)),
+	(("jump forward2",), {"LY": STICK_MIN, "b": 1}, 0.4, 1, ()),
+
+	(("jump back",), {"LY": STICK_MAX}, 0.3, 0, ("jump forward2",)),
+	(("jump back2",), {"LY": STICK_MAX, "b": 1}, 0.4, 1, ()),
+
+	(("cap bounce",), {}, 0, None, ("b", "y", "sdive", "hy", "y", "sdive")),
+	(("swim",), {}, 0, None, ("b", "b", "b", "b")),
+
+	(("sdive",), {"zl": 1}, 0.1, 0, ("sdive2",)),
+	(("sdive2",), {"y": 1}, 0.1, 1, ()),
+
+	(("dive",), {"b": 1}, 0.1, 0, ("dive2",)),
+	(("dive2",), {"zl": 1}, 0.01, 0, ("dive3",)),
+	(("dive3",), {"y": 1}, 0.1, 1, ()),
+
+	(("hdive",), {"b": 1}, 0.2, 0, ("hdive2",)),
+	(("hdive2",), {"zl": 1}, 0.01, 0, ("hdive3",)),
+	(("hdive3",), {"y": 1}, 0.1, 1, ()),
+
+	(("roll",), {"zl": 1}, 0.01, 0, ("roll2",)),
+	(("roll2",), {"y": 1}, 0.1, 1, ()),
+
+	(("backflip", "bf", "back flip"), {"zl": 1}, 0.01, 0, ("backflip2",)),
+	(("backflip2",), {"b": 1}, 0.1, 1, ()),
+
+	(("ground pound", "gp", "groundpound"), {"b": 1}, 0.01, 0, ("ground pound2",)),
+	(("ground pound2",), {"zl": 1}, 0.1, 1, ()),
+
+	(("sprint",), {"LY": STICK_MIN, "b": 1}, 0.6, 1, ()),
+	(("hsprint",), {"LY": STICK_MIN, "b": 1}, 1.5, 1, ()),
+	(("hhsprint",), {"LY": STICK_MIN, "b": 1}, 3, 1, ()),
+]
+
+# spin: sixteen stick positions round the circle, each queueing the next.
+spinPositions = [(STICK_CENTER, STICK_MIN), (STICK_MAX, STICK_MIN), (STICK_MAX, STICK_CENTER), (STICK_CENTER, STICK_MAX),
+				 (STICK_MIN, STICK_MAX), (STICK_MIN, STICK_CENTER), (STICK_MIN, STICK_MIN), (STICK_CENTER, STICK_MIN)]
+for n, (LX, LY) in enumerate(spinPositions + spinPositions):
+	name = "spin" if n == 0 else "spin{:d}".format(n + 1)
+	then = ("spin{:d}".format(n + 2),) if n < 15 else ()
+	moveTable.append(((name,), {"LX": LX, "LY": LY}, spinDuration, 0 if then else 1, then))
+
+# "+" combos hold several buttons at once, and "s"/"h" in a part change the duration.
+comboFields = {"left": ("LX", STICK_MIN), "rigt": ("LX", STICK_MAX), "up": ("LY", STICK_MIN), "down": ("LY", STICK_MAX),
+			   "dleft": ("dpad", DPAD_LEFT), "drigt": ("dpad", DPAD_RIGHT), "dup": ("dpad", DPAD_UP), "ddown": ("dpad", DPAD_DOWN),
+			   "look left": ("RX", STICK_MIN), "look rigt": ("RX", STICK_MAX), "look up": ("RY", STICK_MIN), "look down": ("RY", STICK_MAX),
+			   "a": ("a", 1), "b": ("b", 1), "x": ("x", 1), "y": ("y", 1), "l": ("l", 1), "r": ("r", 1),
+			   "zl": ("zl", 1), "zr": ("zr", 1), "minu": ("minus", 1)}
+
+
+def comboPart(btn):
+	# the name a part is looked up by in comboFields, without its "s"/"h" modifiers.
+	return btn.replace("s","").replace("h","")
+
+
+class Move():
+
+	def __init__(self, changes, duration, reset, then):
+		self.changes = tuple(changes.items())
+		self.duration = duration
+		self.reset = reset
+		# reversed, for nextCommands.extendleft() to put them first in order.
+		self.then = list(reversed(then))
+		# the line to send when the controller starts out neutral.
+		scratch = SwitchController()
+		for field, value in self.changes:
+			setattr(scratch, field, value)
+		scratch.getOutput()
+		self.frame = scratch.output
+
+
+def compileMoves(table):
+	merged = {}
+	for names, changes, duration, reset, then in table:
+		for name in names:
+			oldChanges, oldDuration, oldReset, oldThen = merged.get(name, ({}, 0, None, ()))
+			merged[name] = ({**oldChanges, **changes}, duration, reset, oldThen + tuple(then))
+	return {name: Move(*move) for name, move in merged.items()}
+
+
+@functools.lru_cache(maxsize=1024)
+def comboMove(cmd):
+	changes = {}
+	duration = 0.3
+	for btn in (x.strip() for x in cmd.split("+")):
+		duration = 0.3
+		if("s" in btn):
+			duration = 0.01
+		if("h" in btn):
+			duration = 0.6
+		if("hh" in btn):
+			duration = 1.5
+		if("hhh" in btn):
+			duration = 5
+		field = comboFields.get(comboPart(btn))
+		if field is not None:
+			changes[field[0]] = field[1]
+	return Move(changes, duration, 1, ())
+
+
+moves = compileMoves(moveTable)
+neutralController = SwitchController()
+neutralController.getOutput()
+neutralOutput = neutralController.output
+
+
 # load plus list:
 if(os.path.exists("pluslist.pkl")):
     with open("pluslist.pkl", "rb") as f:
-        pluslist = pickle.load(f)[0]
+        pluslist = set(pickle.load(f)[0])
 # load ban list:
 if(os.path.exists("banlist.pkl")):
     with open("banlist.pkl", "rb") as f:
         banlist = pickle.load(f)[0]
 
+# commands containing one of these need the user to be in the list for that role.
+chatRules = [("plus", "plus"), ("home", "mod"), ("!restartserver", "mod"), ("!restartscript", "mod"), ("!flightdump", "mod"),
+			 ("!enablegoto", "mod"), ("!disablegoto", "mod")]
+chatParser = ChatParser(validCommands, chatRules, {"plus": pluslist, "mod": modlist},
+						lambda part: comboPart(part) in comboFields)
+
 
 class Client(object):
 
@@ -160,24 +384,16 @@ class Client(object):
 		self.socketio.on("turnTimesLeft", self.on_turn_times_left)
 		self.socketio.emit("joinSecure", {"room": "controller", "password": ROOM_SECRET})
 		self.socketio.emit("banlist", banlist)
-		self.socketio.emit("modlist", modlist)
-		self.socketio.emit("pluslist", pluslist)
+		self.socketio.emit("modlist", sorted(modlist))
+		self.socketio.emit("pluslist", sorted(pluslist))
 		self.socketio.emit("sublist", sublist)
 
 		self.receive_events_thread = Thread(target=self._receive_events_thread)
 		self.receive_events_thread.daemon = True
 		self.receive_events_thread.start()
 
-		self.start = time.clock()
-		self.end = time.clock()
-		
-		self.botstart = time.clock()
-		self.botend = time.clock()
-
-		self.controllerStart = time.clock()
-		self.controllerEnd = time.clock()
-
 		self.lockon = False
+		self.moveEnd = 0
 
 		self.yeaVotes = 0
 		self.nayVotes = 0
@@ -221,8 +437,6 @@ class Client(object):
 		if (cNum > 0 and client.currentGame in singlePlayerGames):
 			return
 
-		print("controller state" + str(cNum) + ":", state)
-
 		client.oldArgs2 = state
 
 		controller = None
@@ -404,7 +618,7 @@ class Client(object):
 		self.controllerEnabled = False
 		self.chatEnabled = False
 		# set voted players to none
-		del voted[:]
+		voted.clear()
 
 		# get to game selection screen:
 		controller1.reset()
@@ -716,7 +930,7 @@ class Client(object):
 
 		self.voting = False
 
-		del voted[:]
+		voted.clear()
 
 		if(leaving):
 			self.goto_game(imagefile, delay, nameofgame)
@@ -753,11 +967,8 @@ class Client(object):
 		print(username + ": " + message)
 
 
-		commands = None
-		if ("," in message):
-			commands = [x.strip() for x in message.split(",")]
-		else:
-			commands = [x.strip() for x in message.split(" ")]
+		plan = chatParser.parse(username, message)
+		commands = plan.commands
 
 		cmd = "none"
 
@@ -771,38 +982,18 @@ class Client(object):
 			twitchBot.chat(msg)
 
 		if(len(commands) == 1 and commands[0] == "!commands"):
-			msg = "(mods only): \"!restartscript\", \"!restartserver\" \"!giveplus [user]\", \"!ban [user]\", \"!unban [user]\", \"!removeplus [user]\", \"!disablechat\", \"!enablechat\", \"!disablegoto\", \"!enablegoto\", \"!setturnlength [lengthInMS]\", \"!setforfeitlength [lengthInMS]\" (plus only): \"!disableinternet\", \"!enableinternet\", \"!fixcontrollers\" (anyone): \"!restart1\", \"!restart2\", \"!restart3\", \"!pluslist\", \"!banlist\", \"!goto [game]\""
+			msg = "(mods only): \"!restartscript\", \"!restartserver\" \"!giveplus [user]\", \"!ban [user]\", \"!unban [user]\", \"!removeplus [user]\", \"!disablechat\", \"!enablechat\", \"!disablegoto\", \"!enablegoto\", \"!setturnlength [lengthInMS]\", \"!setforfeitlength [lengthInMS]\", \"!flightdump\" (plus only): \"!disableinternet\", \"!enableinternet\", \"!fixcontrollers\" (anyone): \"!restart1\", \"!restart2\", \"!restart3\", \"!pluslist\", \"!banlist\", \"!queuestats\", \"!portstats\", \"!goto [game]\""
 			twitchBot.chat(msg)
 
-		valid = True
-		for cmd in commands:
-			if (cmd not in validCommands and "+" not in cmd):
-				valid = False
-			if ("plus" in cmd and username not in pluslist):
-				valid = False
-			if ("home" in cmd and username not in modlist):
-				valid = False
-
-			if ("!restartserver" in cmd and username not in modlist):
-				valid = False
-			if ("!restartscript" in cmd and username not in modlist):
-				valid = False
-
-			if ("!enablegoto" in cmd and username not in modlist):
-				valid = False
-			if ("!disablegoto" in cmd and username not in modlist):
-				valid = False
-
-			if ("lockon" in cmd):
-				self.lockon = not self.lockon
-
-			if(self.voting):
-				if((cmd == "voteyea" or cmd == "yea") and username not in voted):
-					voted.append(username)
-					self.yeaVotes += 1
-				if((cmd == "votenay" or cmd == "nay") and username not in voted):
-					voted.append(username)
-					self.nayVotes += 1
+		if (plan.lockon % 2):
+			self.lockon = not self.lockon
+
+		if(self.voting and plan.vote is not None and username not in voted):
+			voted.add(username)
+			if(plan.vote == "yea"):
+				self.yeaVotes += 1
+			else:
+				self.nayVotes += 1
 
 		if len(commands) == 2:
 
@@ -811,11 +1002,11 @@ class Client(object):
 				msg = "Giving plus permission to: " + commands[1]
 				twitchBot.chat(msg)
 
-				pluslist.append(commands[1])
+				pluslist.add(commands[1])
 
 				# write pluslist to file:
 				with open("pluslist.pkl", "wb") as f:
-					pickle.dump([pluslist], f)
+					pickle.dump([sorted(pluslist)], f)
 
 			if (commands[0] == "!removeplus" and username in modlist):
 
@@ -823,12 +1014,11 @@ class Client(object):
 				twitchBot.chat(msg)
 
 				# revoke plus permission:
-				if commands[1] in pluslist:
-					pluslist.remove(commands[1])
+				pluslist.discard(commands[1])
 
 				# write pluslist to file:
 				with open("pluslist.pkl", "wb") as f:
-					pickle.dump([pluslist], f)
+					pickle.dump([sorted(pluslist)], f)
 
 
 			if (commands[0] == "!ban" and username in modlist):
@@ -885,6 +1075,14 @@ class Client(object):
 					msg += user + ","
 				twitchBot.chat(msg)
 
+			if (cmd == "!queuestats"):
+				twitchBot.chat(commandQueue.summary())
+
+			if (cmd == "!portstats"):
+				for controller in [controller1, controller2, controller3, controller4]:
+					if controller.writer is not None:
+						twitchBot.chat(controller.writer.summary())
+
 			if (cmd == "!banlist"):
 				msg = "ban list: "
 				for user in banlist:
@@ -908,10 +1106,13 @@ class Client(object):
 				twitchBot.chat("Restarting the server! maybe @fosse if you're using this!")
 				self.socketio.emit("restart server")
 
+			if(cmd == "!flightdump" and username in modlist):
+				twitchBot.chat("Dumped the flight recorder to " + recorder.dump())
+
 			if(cmd == "!restartscript"):
 				twitchBot.chat("Restarting the python script!")
 				with open("pluslist.pkl", "wb") as f:
-					pickle.dump([pluslist], f)
+					pickle.dump([sorted(pluslist)], f)
 				os.system("taskkill /f /im python.exe")
 
 			if (commands[0] == "!disablegoto" and username in modlist):
@@ -1079,661 +1280,75 @@ class Client(object):
 		if(not self.chatEnabled):
 			return
 
-		if(len(commands) > 20):
-			valid = False
-
-		if (not valid):
+		if (not plan.valid):
 			commands = []
 
 		for cmd in commands:
-			commandQueue.append(cmd)
+			commandQueue.push(username, cmd)
 
 
 
 	def decreaseQueue(self):
+		# runs every tick, 120 times a second.
 
-		#sleep(0.0001)
-
-		self.end = time.clock()
-		diffInMilliSeconds = (self.end - self.start)*1000
-		if(diffInMilliSeconds > 8.33333):
-			self.start = time.clock()
-			#controller1.send(controller1.output)
-
-			if(len(commandQueue) > 0):
-				nextCommands.append(commandQueue[0])
-				del commandQueue[0]
-
-			duration = 0
-			reset = 1
-
-			if(self.lockon == True):
-				controller1.zl = 1
-				reset = 0
-
-			if(len(nextCommands) > 0):
-				# print(nextCommands)
-				cmd = nextCommands[-1]
-				del nextCommands[-1]
-
-				if(cmd == "sssleft" or cmd == "sssl"):
-					controller1.LX = STICK_MIN
-					duration = 0.01
-					reset = 1
-				if(cmd == "sssright" or cmd == "sssr"):
-					controller1.LX = STICK_MAX
-					duration = 0.01
-					reset = 1
-				if(cmd == "sssup" or cmd == "sssu"):
-					controller1.LY = STICK_MIN
-					duration = 0.01
-					reset = 1
-				if(cmd == "sssdown" or cmd == "sssd"):
-					controller1.LY = STICK_MAX
-					duration = 0.01
-					reset = 1
-
-				if(cmd == "ssleft" or cmd == "ssl"):
-					controller1.LX = STICK_MIN
-					duration = 0.1
-					reset = 1
-				if(cmd == "ssright" or cmd == "ssr"):
-					controller1.LX = STICK_MAX
-					duration = 0.1
-					reset = 1
-				if(cmd == "ssup" or cmd == "ssu"):
-					controller1.LY = STICK_MIN
-					duration = 0.1
-					reset = 1
-				if(cmd == "ssdown" or cmd == "ssd"):
-					controller1.LY = STICK_MAX
-					duration = 0.1
-					reset = 1
-
-				if(cmd == "sleft" or cmd == "sl"):
-					controller1.LX = STICK_MIN
-					duration = 0.3
-					reset = 1
-				if(cmd == "sright" or cmd == "sr"):
-					controller1.LX = STICK_MAX
-					duration = 0.3
-					reset = 1
-				if(cmd == "sup" or cmd == "su"):
-					controller1.LY = STICK_MIN
-					duration = 0.3
-					reset = 1
-				if(cmd == "sdown" or cmd == "sd"):
-					controller1.LY = STICK_MAX
-					duration = 0.3
-					reset = 1
-
-				if(cmd == "left" or cmd == "l"):
-				# if(cmd == "left"):
-					controller1.LX = STICK_MIN
-					duration = 0.6
-					reset = 1
-				if(cmd == "right" or cmd == "r"):
-				# if(cmd == "right"):
-					controller1.LX = STICK_MAX
-					duration = 0.6
-					reset = 1
-				if(cmd == "up" or cmd == "u"):
-					controller1.LY = STICK_MIN
-					duration = 0.6
-					reset = 1
-				if(cmd == "down" or cmd == "d"):
-					controller1.LY = STICK_MAX
-					duration = 0.6
-					reset = 1
-
-				if(cmd == "hleft" or cmd == "hl"):
-					controller1.LX = STICK_MIN
-					duration = 1.5
-					reset = 1
-				if(cmd == "hright" or cmd == "hr"):
-					controller1.LX = STICK_MAX
-					duration = 1.5
-					reset = 1
-				if(cmd == "hup" or cmd == "hu"):
-					controller1.LY = STICK_MIN
-					duration = 1.5
-					reset = 1
-				if(cmd == "hdown" or cmd == "hd"):
-					controller1.LY = STICK_MAX
-					duration = 1.5
-					reset = 1
-
-				if(cmd == "hhleft"):
-					controller1.LX = STICK_MIN
-					duration = 4.0
-					reset = 1
-				if(cmd == "hhright"):
-					controller1.LX = STICK_MAX
-					duration = 4.0
-					reset = 1
-				if(cmd == "hhup"):
-					controller1.LY = STICK_MIN
-					duration = 4.0
-					reset = 1
-				if(cmd == "hhdown"):
-					controller1.LY = STICK_MAX
-					duration = 4.0
-					reset = 1
-
-				
-				if(cmd == "dleft" or cmd == "dl"):
-					controller1.dpad = DPAD_LEFT
-					duration = 0.3
-					reset = 1
-				if(cmd == "dright" or cmd == "dr"):
-					controller1.dpad = DPAD_RIGHT
-					duration = 0.3
-					reset = 1
-				if(cmd == "dup" or cmd == "du"):
-					controller1.dpad = DPAD_UP
-					duration = 0.3
-					reset = 1
-				if(cmd == "ddown" or cmd == "dd"):
-					controller1.dpad = DPAD_DOWN
-					duration = 0.3
-					reset = 1
-
-
-
-				if(cmd == "slook left" or cmd == "sll"):
-					controller1.RX = STICK_MIN
-					duration = 0.1
-					reset = 1
-				if(cmd == "slook right" or cmd == "slr"):
-					controller1.RX = STICK_MAX
-					duration = 0.1
-					reset = 1
-				if(cmd == "slook up" or cmd == "slu"):
-					controller1.RY = STICK_MIN
-					duration = 0.1
-					reset = 1
-				if(cmd == "slook down" or cmd == "sld"):
-					controller1.RY = STICK_MAX
-					duration = 0.1
-					reset = 1
-
-				if(cmd == "look left" or cmd == "ll"):
-					controller1.RX = STICK_MIN
-					duration = 0.3
-					reset = 1
-				if(cmd == "look right" or cmd == "lr"):
-					controller1.RX = STICK_MAX
-					duration = 0.3
-					reset = 1
-				if(cmd == "look up" or cmd == "lu"):
-					controller1.RY = STICK_MIN
-					duration = 0.3
-					reset = 1
-				if(cmd == "look down" or cmd == "ld"):
-					controller1.RY = STICK_MAX
-					duration = 0.3
-					reset = 1
-
-				if(cmd == "hlook left" or cmd == "hll"):
-					controller1.RX = STICK_MIN
-					duration = 0.6
-					reset = 1
-				if(cmd == "hlook right" or cmd == "hlr"):
-					controller1.RX = STICK_MAX
-					duration = 0.6
-					reset = 1
-				if(cmd == "hlook up" or cmd == "hlu"):
-					controller1.RY = STICK_MIN
-					duration = 0.6
-					reset = 1
-				if(cmd == "hlook down" or cmd == "hld"):
-					controller1.RY = STICK_MAX
-					duration = 0.6
-					reset = 1
-				
-				if(cmd == "a"):
-					controller1.a = 1
-					duration = 0.3
-					reset = 1
-				if(cmd == "ha"):
-					controller1.a = 1
-					duration = 0.5
-					reset = 1
-				if(cmd == "sb"):
-					controller1.b = 1
-					duration = 0.1
-					reset = 1
-				if(cmd == "b"):
-					controller1.b = 1
-					duration = 0.4
-					reset = 1
-				if(cmd == "hb"):
-					controller1.b = 1
-					duration = 0.5
-					reset = 1
-				if(cmd == "hhb"):
-					controller1.b = 1
-					duration = 0.8
-					reset = 1
-				if(cmd == "hhhb"):
-					controller1.b = 1
-					duration = 1.8
-					reset = 1
-				if(cmd == "x"):
-					controller1.x = 1
-					duration = 0.3
-					reset = 1
-				if(cmd == "hx"):
-					controller1.x = 1
-					duration = 0.5
-					reset = 1
-				if(cmd == "y"):
-					controller1.y = 1
-					duration = 0.3
-					reset = 1
-				if(cmd == "hy"):
-					controller1.y = 1
-					duration = 0.7
-					reset = 1
-				if(cmd == "lstick"):
-					controller1.lstick = 1
-					duration = 0.1
-					reset = 1
-				if(cmd == "rstick"):
-					controller1.rstick = 1
-					duration = 0.1
-					reset = 1
-				if(cmd == "l"):
-					controller1.l = 1
-					duration = 0.1
-					reset = 1
-				if(cmd == "r"):
-					controller1.r = 1
-					duration = 0.1
-					reset = 1
-				if(cmd == "hr"):
-					controller1.r = 1
-					duration = 1
-					reset = 1
-				if(cmd == "zl"):
-					controller1.zl = 1
-					duration = 0.1
-					reset = 1
-				if(cmd == "zr"):
-					controller1.zr = 1
-					duration = 0.1
-					reset = 1
-				if(cmd == "minus"):
-					controller1.minus = 1
-					duration = 0.1
-					reset = 1
-				if(cmd == "plus"):
-					controller1.plus = 1
-					duration = 0.1
-					reset = 1
-				if(cmd == "home"):
-					controller1.home = 1
-					duration = 0.1
-					reset = 1
-
-				if(cmd == "long jump"):
-					controller1.LY = STICK_MIN
-					duration = 0.6
-					nextCommands.insert(0, "long jump2")
-					reset = 0
-				if(cmd == "long jump2"):
-					controller1.LY = STICK_MIN
-					controller1.zl = 1
-					duration = 0.01
-					nextCommands.insert(0, "long jump3")
-					reset = 0
-				if(cmd == "long jump3"):
-					controller1.LY = STICK_MIN
-					controller1.b = 1
-					duration = 0.1
-					nextCommands.insert(0, "long jump4")
-					reset = 0
-				if(cmd == "long jump4"):
-					controller1.LY = STICK_MIN
-					controller1.b = 1
-					controller1.zl = 0
-					duration = 1
-					reset = 1
-
-				if(cmd == "jump forward"):
-					controller1.LY = STICK_MIN
-					duration = 0.3
-					nextCommands.insert(0, "jump forward2")
-					reset = 0
-				if(cmd == "jump forward2"):
-					controller1.LY = STICK_MIN
-					controller1.b = 1
-					duration = 0.4
-					reset = 1
-
-				if(cmd == "jump back"):
-					controller1.LY = STICK_MAX
-					duration = 0.3
-					nextCommands.insert(0, "jump forward2")
-					reset = 0
-				if(cmd == "jump back2"):
-					controller1.LY = STICK_MAX
-					controller1.b = 1
-					duration = 0.4
-					reset = 1
-
-				if(cmd == "cap bounce"):
-					# b, y, sdive, hy, y, sdive
-					nextCommands.insert(0, "b")
-					nextCommands.insert(0, "y")
-					nextCommands.insert(0, "sdive")
-					nextCommands.insert(0, "hy")
-					nextCommands.insert(0, "y")
-					nextCommands.insert(0, "sdive")
-
-				if(cmd == "swim"):
-					# b, b, b, b
-					nextCommands.insert(0, "b")
-					nextCommands.insert(0, "b")
-					nextCommands.insert(0, "b")
-					nextCommands.insert(0, "b")
-
-
-				if(cmd == "sdive"):
-					controller1.zl = 1
-					duration = 0.1
-					nextCommands.insert(0, "sdive2")
-					reset = 0
-				if(cmd == "sdive2"):
-					controller1.y = 1
-					duration = 0.1
-					reset = 1
-
-				if(cmd == "dive"):
-					controller1.b = 1
-					duration = 0.1
-					nextCommands.insert(0, "dive2")
-					reset = 0
-				if(cmd == "dive2"):
-					controller1.zl = 1
-					duration = 0.01
-					nextCommands.insert(0, "dive3")
-					reset = 0
-				if(cmd == "dive3"):
-					controller1.y = 1
-					duration = 0.1
-					reset = 1
-
-				if(cmd == "hdive"):
-					controller1.b = 1
-					duration = 0.2
-					nextCommands.insert(0, "hdive2")
-					reset = 0
-				if(cmd == "hdive2"):
-					controller1.zl = 1
-					duration = 0.01
-					nextCommands.insert(0, "hdive3")
-					reset = 0
-				if(cmd == "hdive3"):
-					controller1.y = 1
-					duration = 0.1
-					reset = 1
-
-				if(cmd == "roll"):
-					controller1.zl = 1
-					duration = 0.01
-					nextCommands.insert(0, "roll2")
-					reset = 0
-				if(cmd == "roll2"):
-					controller1.y = 1
-					duration = 0.1
-					reset = 1
-
-				if(cmd == "backflip" or cmd == "bf" or cmd == "back flip"):
-					controller1.zl = 1
-					duration = 0.01
-					nextCommands.insert(0, "backflip2")
-					reset = 0
-				if(cmd == "backflip2"):
-					controller1.b = 1
-					duration = 0.1
-					reset = 1
-
-				if(cmd == "ground pound" or cmd == "gp" or cmd == "groundpound"):
-					controller1.b = 1
-					duration = 0.01
-					nextCommands.insert(0, "ground pound2")
-					reset = 0
-				if(cmd == "ground pound2"):
-					controller1.zl = 1
-					duration = 0.1
-					reset = 1
-
-
-
-				if(cmd == "sprint"):
-					controller1.LY = STICK_MIN
-					controller1.b = 1
-					duration = 0.6
-					reset = 1
-				if(cmd == "hsprint"):
-					controller1.LY = STICK_MIN
-					controller1.b = 1
-					duration = 1.5
-					reset = 1
-				if(cmd == "hhsprint"):
-					controller1.LY = STICK_MIN
-					controller1.b = 1
-					duration = 3
-					reset = 1
-
-
-
-
-				d = 0.001
-
-				if(cmd == "spin"):
-					controller1.LX = STICK_CENTER
-					controller1.LY = STICK_MIN
-					duration = d
-					nextCommands.insert(0, "spin2")
-					reset = 0
-				if(cmd == "spin2"):
-					controller1.LX = STICK_MAX
-					controller1.LY = STICK_MIN
-					duration = d
-					nextCommands.insert(0, "spin3")
-					reset = 0
-				if(cmd == "spin3"):
-					controller1.LX = STICK_MAX
-					controller1.LY = STICK_CENTER
-					duration = d
-					nextCommands.insert(0, "spin4")
-					reset = 0
-				if(cmd == "spin4"):
-					controller1.LX = STICK_CENTER
-					controller1.LY = STICK_MAX
-					duration = d
-					nextCommands.insert(0, "spin5")
-					reset = 0
-				if(cmd == "spin5"):
-					controller1.LX = STICK_MIN
-					controller1.LY = STICK_MAX
-					duration = d
-					nextCommands.insert(0, "spin6")
-					reset = 0
-				if(cmd == "spin6"):
-					controller1.LX = STICK_MIN
-					controller1.LY = STICK_CENTER
-					duration = d
-					nextCommands.insert(0, "spin7")
-					reset = 0
-				if(cmd == "spin7"):
-					controller1.LX = STICK_MIN
-					controller1.LY = STICK_MIN
-					duration = d
-					nextCommands.insert(0, "spin8")
-					reset = 0
-				if(cmd == "spin8"):
-					controller1.LX = STICK_CENTER
-					controller1.LY = STICK_MIN
-					duration = d
-					nextCommands.insert(0, "spin9")
-					reset = 0
-				if(cmd == "spin9"):
-					controller1.LX = STICK_CENTER
-					controller1.LY = STICK_MIN
-					duration = d
-					nextCommands.insert(0, "spin10")
-					reset = 0
-				if(cmd == "spin10"):
-					controller1.LX = STICK_MAX
-					controller1.LY = STICK_MIN
-					duration = d
-					nextCommands.insert(0, "spin11")
-					reset = 0
-				if(cmd == "spin11"):
-					controller1.LX = STICK_MAX
-					controller1.LY = STICK_CENTER
-					duration = d
-					nextCommands.insert(0, "spin12")
-					reset = 0
-				if(cmd == "spin12"):
-					controller1.LX = STICK_CENTER
-					controller1.LY = STICK_MAX
-					duration = d
-					nextCommands.insert(0, "spin13")
-					reset = 0
-				if(cmd == "spin13"):
-					controller1.LX = STICK_MIN
-					controller1.LY = STICK_MAX
-					duration = d
-					nextCommands.insert(0, "spin14")
-					reset = 0
-				if(cmd == "spin14"):
-					controller1.LX = STICK_MIN
-					controller1.LY = STICK_CENTER
-					duration = d
-					nextCommands.insert(0, "spin15")
-					reset = 0
-				if(cmd == "spin15"):
-					controller1.LX = STICK_MIN
-					controller1.LY = STICK_MIN
-					duration = d
-					nextCommands.insert(0, "spin16")
-					reset = 0
-				if(cmd == "spin16"):
-					controller1.LX = STICK_CENTER
-					controller1.LY = STICK_MIN
-					duration = d
-					#nextCommands.insert(0, "spin6")
-					reset = 1
-
-
-				if("+" in cmd):
-					btns = [x.strip() for x in cmd.split("+")]
-
-					for btn in btns:
-						duration = 0.3
-						reset = 1
-
-						if("s" in btn):
-							duration = 0.01
-						if("h" in btn):
-							duration = 0.6
-						if("hh" in btn):
-							duration = 1.5
-						if("hhh" in btn):
-							duration = 5
-
-						btn = btn.replace("s","")
-						btn = btn.replace("h","")
-
-						if(btn == "left"):
-							controller1.LX = STICK_MIN
-						if(btn == "rigt"):
-							controller1.LX = STICK_MAX
-						if(btn == "up"):
-							controller1.LY = STICK_MIN
-						if(btn == "down"):
-							controller1.LY = STICK_MAX
-						if(btn == "dleft"):
-							controller1.dpad = DPAD_LEFT
-						if(btn == "drigt"):
-							controller1.dpad = DPAD_RIGHT
-						if(btn == "dup"):
-							controller1.dpad = DPAD_UP
-						if(btn == "ddown"):
-							controller1.dpad = DPAD_DOWN
-						
-						if(btn == "look left"):
-							controller1.RX = STICK_MIN
-						if(btn == "look rigt"):
-							controller1.RX = STICK_MAX
-						if(btn == "look up"):
-							controller1.RY = STICK_MIN
-						if(btn == "look down"):
-							controller1.RY = STICK_MAX
-						if(btn == "a"):
-							controller1.a = 1
-						if(btn == "b"):
-							controller1.b = 1
-						if(btn == "x"):
-							controller1.x = 1
-						if(btn == "y"):
-							controller1.y = 1
-						if(btn == "l"):
-							controller1.l = 1
-						if(btn == "r"):
-							controller1.r = 1
-						if(btn == "zl"):
-							controller1.zl = 1
-						if(btn == "zr"):
-							controller1.zr = 1
-						if(btn == "minus"):
-							controller1.minus = 1
-				send_and_reset(duration, reset)
-
-
-
-	def loop(self):
-
-		# control switch here:
-
-		self.botend = time.clock()
-		diffInMilliSeconds = (self.botend - self.botstart)*1000
-		if(diffInMilliSeconds > 1000*60*5):
-			self.botstart = time.clock()
-
-			self.socketio.emit("joinSecure", {"room": "controller", "password": ROOM_SECRET})
-			self.socketio.emit("banlist", banlist)
-			self.socketio.emit("modlist", modlist)
-			self.socketio.emit("pluslist", pluslist)
-			self.socketio.emit("sublist", sublist)
-			
-			msg = "Join the discord server! https://discord.gg/ARTbddH\
-			hate the stream delay? go here! https://twitchplaysnintendoswitch.com"
-			twitchBot.chat(msg)
-
-		self.controllerEnd = time.clock()
-		diffInMilliSeconds2 = (self.controllerEnd - self.controllerStart)*1000
-		if(diffInMilliSeconds2 > 6000):
-			self.controllerStart = time.clock()
+		# the move being played is still being held.
+		if(clock.monotonic() < self.moveEnd):
+			return
 
-			self.socketio.emit("joinSecure", {"room": "controller", "password": ROOM_SECRET})
-			self.socketio.emit("banlist", banlist)
-			self.socketio.emit("modlist", modlist)
-			self.socketio.emit("pluslist", pluslist)
-			self.socketio.emit("sublist", sublist)
+		duration = 0
+		reset = 1
+		output = None
+		changes = ()
+
+		if(self.lockon == True):
+			changes = (("zl", 1),)
+			reset = 0
+
+		# finish the move being played before starting the next one.
+		cmd = nextCommands.popleft() if nextCommands else commandQueue.pop()
+		if(cmd is not None):
+			move = moves.get(cmd) if isinstance(cmd, str) else None
+			if(move is None and isinstance(cmd, str) and "+" in cmd):
+				move = comboMove(cmd)
+			if(move is not None):
+				# a neutral controller can take the prebuilt line as is.
+				if(controller1.output == neutralOutput and not self.lockon):
+					output = move.frame
+				changes = changes + move.changes
+				duration = move.duration
+				if(move.reset is not None):
+					reset = move.reset
+				nextCommands.extendleft(move.then)
+			self.moveEnd = presses.press(controller1, changes, duration, reset, output)
+
+
+
+	def announce(self):
+		self.rejoin()
+
+		msg = "Join the discord server! https://discord.gg/ARTbddH\
+		hate the stream delay? go here! https://twitchplaysnintendoswitch.com"
+		twitchBot.chat(msg)
 
+	def rejoin(self):
+		self.socketio.emit("joinSecure", {"room": "controller", "password": ROOM_SECRET})
+		self.socketio.emit("banlist", banlist)
+		self.socketio.emit("modlist", sorted(modlist))
+		self.socketio.emit("pluslist", sorted(pluslist))
+		self.socketio.emit("sublist", sublist)
 
 		# get modlist:
 		# with urllib.request.urlopen("https://tmi.twitch.tv/group/user/twitchplaysconsoles/chatters") as url:
 		# 	data = json.loads(url.read().decode())
 		# 	print(data)
 
-
+	def readChat(self):
 		response = twitchBot.stayConnected()
+		if(response == ""):
+			# the socket is closed, and would otherwise stay readable forever.
+			print("Twitch chat disconnected.")
+			scheduler.unwatch(twitchBot.sock)
+			return
 		if(response != "none"):
 			# prevent crash
 			try:
@@ -1746,9 +1361,16 @@ class Client(object):
 			except:
 				pass
 
-		self.decreaseQueue()
+if os.name == "nt":
+	# let sleeps and select() wake within a millisecond instead of 15.
+	ctypes.windll.winmm.timeBeginPeriod(1)
 
+# everything runs from timers and chat socket readiness, and sleeps in between.
+scheduler = Scheduler(clock)
+presses = PressEngine(scheduler)
 client = Client()
-while True:
-	client.loop()
-	sleep(0.0001)
\ No newline at end of file
+scheduler.every(1 / 120, client.decreaseQueue)
+scheduler.every(6, client.rejoin)
+scheduler.every(60 * 5, client.announce)
+scheduler.watch(twitchBot.sock, client.readChat)
+scheduler.run()
\ No newline at end of file
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import random
+
+from websockets.asyncio.client import connect
+from websockets.asyncio.server import serve, broadcast
+from websockets.exceptions import ConnectionClosed, InvalidHandshake
+
+from switchcontroller.statebus import StateBus, bus_state, neutral_state
+from switchcontroller.clock import Clock
+
+# the event loop sleeps in real time, so turns are timed by the wall clock too.
+clock = Clock()
+
+
+# Browsers send controller states as binary messages of 7 bytes, packed like
+# struct.pack('>BHBBBB', hat, buttons, lx, ly, rx, ry), and JSON text messages:
+#   {"queue": slot}   wait for a turn on a controller slot
+#   {"leave": true}   give up a turn or a place in the queue
+# The server broadcasts {"turns": [[player, seconds left, queue length], ...]} to
+# everyone, and sends {"turn": slot, "seconds": n} to a player whose turn starts.
+# Only the player whose turn it is can drive a slot. Their states go straight to
+# a StateBus, which keeps only the latest state per slot for bridge.py --bus.
+
+
+class Player():
+
+	def __init__(self, id, websocket, rate, burst):
+		self.id = id
+		self.websocket = websocket
+		self.rate = rate
+		self.burst = burst
+		self.tokens = burst
+		self.refilled = clock.monotonic()
+		self.slot = None
+
+	def allow(self, now):
+		# token bucket: `rate` messages per second, up to `burst` at once.
+		self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+		self.refilled = now
+		if self.tokens < 1:
+			return False
+		self.tokens -= 1
+		return True
+
+
+class Slot():
+
+	def __init__(self, n):
+		self.n = n
+		self.owner = None
+		self.queue = collections.deque()
+		self.turn_end = 0
+		self.last_input = 0
+
+
+class ServerStats():
+
+	def __init__(self):
+		self.connections = 0
+		self.peak = 0
+		self.states = 0
+		self.applied = 0
+		self.limited = 0
+		self.not_owner = 0
+		self.bad = 0
+		self.turns = 0
+
+
+class InputServer():
+
+	def __init__(self, bus=None, slots=4, first_slot=0, rate=120, burst=30, turn_length=30, forfeit=10):
+		self.bus = bus
+		self.slots = [Slot(first_slot + n) for n in range(slots)]
+		self.rate = rate
+		self.burst = burst
+		self.turn_length = turn_length
+		self.forfeit = forfeit
+		self.ids = itertools.count(1)
+		self.connections = set()
+		# the event loop only holds weak references to tasks, so pending sends are kept here.
+		self.tasks = set()
+		self.stats = ServerStats()
+
+	async def handler(self, websocket):
+		player = Player(next(self.ids), websocket, self.rate, self.burst)
+		self.connections.add(websocket)
+		self.stats.connections += 1
+		self.stats.peak = max(self.stats.peak, len(self.connections))
+		try:
+			async for message in websocket:
+				if isinstance(message, bytes):
+					self.on_state(player, message)
+				else:
+					self.on_command(player, message)
+		except ConnectionClosed:
+			pass
+		finally:
+			self.connections.discard(websocket)
+			self.leave(player)
+
+	def on_state(self, player, message):
+		stats = self.stats
+		stats.states += 1
+		now = clock.monotonic()
+		if not player.allow(now):
+			stats.limited += 1
+			return
+		slot = player.slot
+		if slot is None or slot.owner is not player:
+			stats.not_owner += 1
+			return
+		if len(message) != bus_state.size:
+			stats.bad += 1
+			return
+		slot.last_input = now
+		if self.bus is not None:
+			self.bus.publish(slot.n, message)
+		stats.applied += 1
+
+	def on_command(self, player, message):
+		if not player.allow(clock.monotonic()):
+			self.stats.limited += 1
+			return
+		try:
+			command = json.loads(message)
+		except ValueError:
+			self.stats.bad += 1
+			return
+		if not isinstance(command, dict):
+			self.stats.bad += 1
+		elif 'queue' in command:
+			slot = command['queue']
+			if player.slot is None and isinstance(slot, int) and 0 <= slot < len(self.slots):
+				player.slot = self.slots[slot]
+				player.slot.queue.append(player)
+		elif 'leave' in command:
+			self.leave(player)
+
+	def leave(self, player):
+		slot = player.slot
+		if slot is None:
+			return
+		player.slot = None
+		if slot.owner is player:
+			self.end_turn(slot)
+		elif player in slot.queue:
+			slot.queue.remove(player)
+
+	def end_turn(self, slot):
+		slot.owner = None
+		# let go of everything the last player was holding.
+		if self.bus is not None:
+			self.bus.publish(slot.n, neutral_state)
+
+	def start_turn(self, slot, now):
+		player = slot.queue.popleft()
+		slot.owner = player
+		slot.turn_end = now + self.turn_length
+		slot.last_input = now
+		self.stats.turns += 1
+		task = asyncio.ensure_future(self.send(player, {'turn': slot.n, 'seconds': self.turn_length}))
+		self.tasks.add(task)
+		task.add_done_callback(self.tasks.discard)
+
+	async def send(self, player, message):
+		try:
+			await player.websocket.send(json.dumps(message))
+		except ConnectionClosed:
+			pass
+
+	async def turns(self, interval=0.25):
+		while True:
+			now = clock.monotonic()
+			for slot in self.slots:
+				owner = slot.owner
+				if owner is not None and (now > slot.turn_end or now - slot.last_input > self.forfeit):
+					owner.slot = None
+					self.end_turn(slot)
+				if slot.owner is None and slot.queue:
+					self.start_turn(slot, now)
+			# broadcast skips clients that can't keep up instead of queueing for them.
+			broadcast(self.connections, json.dumps({'turns': [
+				[slot.owner.id if slot.owner else None, max(0, round(slot.turn_end - now)) if slot.owner else 0, len(slot.queue)]
+				for slot in self.slots]}))
+			await asyncio.sleep(interval)
+
+	def print_stats(self):
+		stats = self.stats
+		print('{:d} connections, {:d} at peak, {:d} turns.'.format(stats.connections, stats.peak, stats.turns))
+		print('{:d} states received, {:d} applied, {:d} rate limited, {:d} from players without a turn, {:d} bad messages.'.format(
+			stats.states, stats.applied, stats.limited, stats.not_owner, stats.bad))
+
+
+async def run_server(server, host, port):
+	# per-connection compression buffers cost far more memory than they save on 7-byte states.
+	async with serve(server.handler, host, port, compression=None, max_size=1024):
+		print('Accepting browser input on ws://{:s}:{:d}/.'.format(host, port))
+		await server.turns()
+
+
+async def load_client(url, slot, rate, duration, stats):
+	try:
+		async with connect(url, compression=None) as websocket:
+			stats['connected'] += 1
+			if slot is not None:
+				await websocket.send(json.dumps({'queue': slot}))
+			end = clock.monotonic() + duration
+
+			async def receive():
+				async for message in websocket:
+					stats['received'] += 1
+
+			receiver = asyncio.ensure_future(receive())
+			while clock.monotonic() < end:
+				if slot is not None:
+					await websocket.send(bus_state.pack(random.randrange(9), random.randrange(1 << 14),
+														random.randrange(256), random.randrange(256), 128, 128))
+					stats['sent'] += 1
+					await asyncio.sleep(1 / rate)
+				else:
+					await asyncio.sleep(end - clock.monotonic())
+			receiver.cancel()
+	except (OSError, InvalidHandshake, ConnectionClosed):
+		stats['failed'] += 1
+
+
+async def load_test(url, clients, players, slots, rate, duration):
+	"""Opens `clients` connections to a running server, `players` of which queue
+	for slots and send states at `rate` per second, for `duration` seconds."""
+	stats = collections.Counter()
+	start = clock.monotonic()
+	await asyncio.gather(*[
+		load_client(url, n % slots if n < players else None, rate, duration, stats)
+		for n in range(clients)])
+	print('Load test: {:d} of {:d} clients connected, {:d} failed, {:d} states sent, {:d} messages received in {:.1f} s.'.format(
+		stats['connected'], clients, stats['failed'], stats['sent'], stats['received'], clock.monotonic() - start))
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--host', type=str, default='0.0.0.0', help='Address to listen on. Default: 0.0.0.0.')
+	parser.add_argument('--port', type=int, default=8765, help='Port to listen on. Default: 8765.')
+	parser.add_argument('--bus', type=str, default=None, help='StateBus to publish to, created by bridge.py --bus. Without it states are only counted. Default: None.')
+	parser.add_argument('--slots', type=int, default=4, help='Controller slots players can take turns on. Default: 4.')
+	parser.add_argument('--first-slot', type=int, default=0, help='StateBus slot of the first controller. Each slot must have one publisher, so move this up when other frontends share the bus. Default: 0.')
+	parser.add_argument('--rate', type=float, default=120, help='Messages per second allowed per connection. Default: 120.')
+	parser.add_argument('--burst', type=float, default=30, help='Messages a connection may send at once before rate limiting starts. Default: 30.')
+	parser.add_argument('--turn-length', type=float, default=30, help='Seconds per turn. Default: 30.')
+	parser.add_argument('--forfeit', type=float, default=10, help='Seconds without input before a turn is forfeit. Default: 10.')
+	parser.add_argument('--load-test', type=str, default=None, help='Instead of serving, load test the server at this ws:// URL.')
+	parser.add_argument('--clients', type=int, default=1000, help='Connections opened by --load-test. Default: 1000.')
+	parser.add_argument('--players', type=int, default=8, help='Connections that queue for turns and send states in --load-test. Default: 8.')
+	parser.add_argument('--duration', type=float, default=10, help='Seconds --load-test runs for. Default: 10.')
+	args = parser.parse_args()
+
+	if args.load_test is not None:
+		asyncio.run(load_test(args.load_test, args.clients, args.players, args.slots, 60, args.duration))
+		exit(0)
+
+	bus = StateBus(args.bus) if args.bus is not None else None
+	server = InputServer(bus, args.slots, args.first_slot, args.rate, args.burst, args.turn_length, args.forfeit)
+	try:
+		asyncio.run(run_server(server, args.host, args.port))
+	except KeyboardInterrupt:
+		print('\nExiting due to keyboard interrupt.')
+	server.print_stats()
+	if bus is not None:
+		bus.close()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# bridge.py and the controller package run from the repository root, they aren't installed.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
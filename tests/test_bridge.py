@@ -0,0 +1,44 @@
+import itertools
+import time
+
+from controller.switchcontroller.bridge import Bridge
+from controller.switchcontroller.clock import VirtualClock
+from controller.switchcontroller.frames import button_names, neutral_state
+
+
+def wait_for(condition, timeout=5):
+    # the frame loop runs in its own thread, on virtual time that passes as fast as it can.
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_pushed_states_reach_the_board_and_callbacks(tmp_path, capsys):
+    acked = []
+    path = tmp_path / 'run.txt'
+    with Bridge('emulated', emulate=True, record=str(path), clock=VirtualClock()) as bridge:
+        bridge.on_ack(lambda frame, write_ns, ack_ns: acked.append((bytes(frame), ack_ns - write_ns)))
+        wait_for(lambda: len(acked) >= 3)
+        bridge.push_state(8, button_names['a'], 128, 128, 128, 128)
+        wait_for(lambda: bridge.link.ser.state == bytes.fromhex('08000480808080'))
+        bridge.release_state()
+        wait_for(lambda: acked[-1][0] == neutral_state)
+        source = bridge.push_source(itertools.repeat(b'02000080808080\n'), priority=2)
+        wait_for(lambda: acked[-1][0] == b'02000080808080\n')
+        bridge.remove_source(source)
+    assert acked[0][0] == neutral_state
+    assert max(latency for frame, latency in acked) <= 8000000
+    frames = path.read_bytes().splitlines(True)
+    assert frames[:3] == [neutral_state] * 3
+    assert b'08000480808080\n' in frames and frames[-1] in (neutral_state, b'02000080808080\n')
+    assert 'Emulated' in capsys.readouterr().out
+
+
+def test_stop_returns_while_the_board_is_silent():
+    clock = VirtualClock()
+    bridge = Bridge('emulated', emulate=True, clock=clock).start()
+    # a board that stops acking, and keeps quiet through resyncs.
+    bridge.link.ser.period_ns = 10 ** 12
+    bridge.stop()
+    assert bridge.thread is None
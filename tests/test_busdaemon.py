@@ -0,0 +1,31 @@
+import uuid
+
+from controller.switchcontroller.busdaemon import BusDaemon
+from controller.switchcontroller.frames import neutral_state
+from controller.switchcontroller.statebus import StateBus, bus_state
+
+
+class Link(object):
+    def __init__(self, port):
+        self.port = port
+        self.frames = []
+
+    def write(self, message):
+        self.frames.append(bytes(message))
+
+
+def test_each_board_gets_its_slot_and_frames_are_reencoded_only_on_change():
+    name = 'test-bus-' + uuid.uuid4().hex[:8]
+    with StateBus(name, slots=4, create=True) as bus:
+        links = [Link('a'), Link('b')]
+        daemon = BusDaemon(bus, links, [0, 3])
+        daemon.write(0)
+        daemon.write(1)
+        bus.publish(3, bus_state.pack(2, 4, 0, 255, 128, 128))
+        for n in range(3):
+            daemon.write(0)
+            daemon.write(1)
+    assert links[0].frames == [neutral_state] * 4
+    assert links[1].frames == [neutral_state] + [b'02000400ff8080\n'] * 3
+    assert daemon.written == [4, 4]
+    assert daemon.changes == [1, 2]
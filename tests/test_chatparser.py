@@ -0,0 +1,58 @@
+from controller.switchcontroller.chatparser import ChatParser
+
+moves = ["a", "b", "x", "up", "left", "lockon", "long jump", "plus", "home", "yea", "nay"]
+parts = {"a", "b", "x", "up", "left"}
+
+
+def parser(max_commands=20):
+    roles = {"plus": {"subscriber"}, "mod": {"moderator"}}
+    return ChatParser(moves + ["!restartserver"], [("plus", "plus"), ("home", "mod"), ("!restart", "mod")], roles,
+                      lambda part: part in parts, max_commands)
+
+
+def test_messages_split_on_commas_or_spaces():
+    chat = parser()
+    assert chat.parse("viewer", "a b up").commands == ["a", "b", "up"]
+    # commas allow commands with spaces in them.
+    plan = chat.parse("viewer", "long jump, a,lockon")
+    assert plan.commands == ["long jump", "a", "lockon"]
+    assert plan.valid and plan.lockon == 1
+    assert not chat.parse("viewer", "long jump a").valid
+
+
+def test_compounds_are_valid_when_every_part_is():
+    chat = parser()
+    assert chat.parse("viewer", "a+b").valid
+    # split on commas, the parts may have spaces around them.
+    assert chat.parse("viewer", "up + x, a").valid
+    # split on spaces, "+" isn't a command.
+    assert not chat.parse("viewer", "up + x").valid
+    assert not chat.parse("viewer", "a+jump").valid
+    # a compound is only checked once, the cache gives the same answer again.
+    assert not chat.parse("viewer", "a+jump").valid
+    assert not parser().parse("viewer", "a+").valid
+
+
+def test_roles_and_the_command_limit():
+    chat = parser()
+    assert not chat.parse("viewer", "plus").valid
+    assert chat.parse("subscriber", "plus").valid
+    assert not chat.parse("subscriber", "a home").valid
+    assert chat.parse("moderator", "!restartserver").valid
+    assert chat.parse("viewer", " ".join(["a"] * 20)).valid
+    assert not chat.parse("viewer", " ".join(["a"] * 21)).valid
+    assert parser(max_commands=2).parse("viewer", "a b").valid
+    assert not parser(max_commands=2).parse("viewer", "a b x").valid
+
+
+def test_roles_changed_later_apply_at_once():
+    chat = parser()
+    assert not chat.parse("newmod", "home").valid
+    chat.roles["mod"].add("newmod")
+    assert chat.parse("newmod", "home").valid
+
+
+def test_the_first_vote_counts():
+    chat = parser()
+    assert chat.parse("viewer", "a nay yea").vote == "nay"
+    assert chat.parse("viewer", "a b").vote is None
@@ -0,0 +1,50 @@
+from controller.switchcontroller.clock import VirtualClock
+from controller.switchcontroller.commandqueue import CommandQueue
+
+
+def drain(queue):
+    commands = []
+    while True:
+        command = queue.pop()
+        if command is None:
+            return commands
+        commands.append(command)
+
+
+def test_users_take_turns_in_the_order_they_started():
+    queue = CommandQueue(clock=VirtualClock())
+    for n in range(5):
+        queue.push("spammer", "s{:d}".format(n))
+    queue.push("quiet", "q0")
+    queue.push("other", "o0")
+    queue.push("quiet", "q1")
+    assert len(queue) == 8
+    assert drain(queue) == ["s0", "q0", "o0", "s1", "q1", "s2", "s3", "s4"]
+    assert len(queue) == 0 and not queue.queues
+
+
+def test_full_queues_drop_new_commands():
+    queue = CommandQueue(per_user=2, max_total=3, clock=VirtualClock())
+    assert queue.push("a", 1) and queue.push("a", 2)
+    assert not queue.push("a", 3)
+    assert queue.push("b", 1)
+    assert not queue.push("c", 1)
+    assert queue.dropped_full == 2
+    assert drain(queue) == [1, 1, 2]
+
+
+def test_stale_commands_are_dropped_not_played():
+    clock = VirtualClock()
+    queue = CommandQueue(max_age=15.0, clock=clock)
+    queue.push("early", "old")
+    clock.sleep(10)
+    queue.push("late", "new")
+    queue.push("early", "newer")
+    clock.sleep(6)
+    # dropping a stale command doesn't cost its user their turn.
+    assert queue.pop() == "newer"
+    assert queue.pop() == "new"
+    assert queue.pop() is None
+    metrics = queue.metrics()
+    assert (metrics["played"], metrics["dropped_stale"], metrics["depth"]) == (2, 1, 0)
+    assert metrics["wait_max"] == 6
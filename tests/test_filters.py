@@ -0,0 +1,27 @@
+from controller.switchcontroller.filters import axis_table, build_filter
+from controller.switchcontroller.frames import button_names, pack_state
+
+
+def test_deadzone_centres_both_sides():
+    table = axis_table(deadzone=10)
+    assert table[128 - 10:128 + 10] == [128] * 20
+    assert table[128 - 11] == 128 - 11
+    assert table[128 + 10] == 128 + 10
+    assert axis_table() == list(range(256))
+
+
+def test_curve_keeps_the_ends_and_leaves_the_deadzone_smoothly():
+    table = axis_table(deadzone=10, curve=2.0)
+    assert (table[0], table[255]) == (0, 255)
+    assert table[128 + 10] == 128 + 0
+    assert table[128 - 11] == 128 - 0
+    assert table == sorted(table)
+
+
+def test_remap_mask_and_turbo():
+    a, b, x = button_names['a'], button_names['b'], button_names['x']
+    apply = build_filter(remap={a: b, b: a}, mask=0xffff & ~x, turbo=b, turbo_period=4)
+    state = pack_state(2, a | x, 1, 2, 3, 4)
+    # a is remapped to b, which turbo releases for half of every 4 polls.
+    assert [apply(state, poll) for poll in range(4)] == [pack_state(2, b, 1, 2, 3, 4)] * 2 + [pack_state(2, 0, 1, 2, 3, 4)] * 2
+    assert build_filter()(state, 3) == state
@@ -0,0 +1,57 @@
+import os
+import signal
+import sys
+import threading
+
+from controller.switchcontroller.clock import VirtualClock
+from controller.switchcontroller.flightrecorder import FlightRecorder, read_flight
+
+
+def test_the_ring_wraps_and_dumps_oldest_first(tmp_path, capsys):
+    clock = VirtualClock()
+    recorder = FlightRecorder(seconds=1, rate=3, clock=clock)
+    for n in range(5):
+        recorder.record(n % 2, '{:d}8000080808080\n'.format(n).encode())
+        clock.sleep(0.008)
+    recorder.record(1, b'x' * 50)
+
+    frames = read_flight(recorder.dump(str(tmp_path / 'wrapped.bin')))
+    assert [(port, frame[:1]) for ns, port, frame in frames] == [(1, b'3'), (0, b'4'), (1, b'x')]
+    assert frames[1][0] - frames[0][0] == 8000000
+    # frames longer than a record are cut short, not spilled into the next one.
+    assert frames[2][2] == b'x' * 38
+    assert 'dumped 3 frames' in capsys.readouterr().out
+
+    short = FlightRecorder(seconds=1, rate=3, clock=clock)
+    short.record(2, b'08000080808080\n')
+    assert [frame[1:] for frame in read_flight(short.dump(str(tmp_path / 'short.bin')))] == [(2, b'08000080808080\n')]
+
+
+def test_installed_recorder_dumps_on_signal_and_uncaught_exceptions(tmp_path, monkeypatch):
+    crashes = []
+    monkeypatch.setattr(sys, 'excepthook', lambda *args: crashes.append(args[0]))
+    monkeypatch.setattr(threading, 'excepthook', lambda args: crashes.append(args.exc_type))
+    previous = signal.getsignal(signal.SIGUSR1)
+    path = tmp_path / 'flight.bin'
+    recorder = FlightRecorder(seconds=1, rate=10, path=str(path))
+    recorder.record(0, b'08000080808080\n')
+    try:
+        recorder.install()
+        os.kill(os.getpid(), signal.SIGUSR1)
+        assert len(read_flight(str(path))) == 1
+    finally:
+        signal.signal(signal.SIGUSR1, previous)
+
+    path.unlink()
+    sys.excepthook(ValueError, ValueError('boom'), None)
+    assert path.exists()
+
+    path.unlink()
+    def fail():
+        raise KeyError('boom')
+    thread = threading.Thread(target=fail)
+    thread.start()
+    thread.join()
+    assert path.exists()
+    # the hooks that were there before still run.
+    assert crashes == [ValueError, KeyError]
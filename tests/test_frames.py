@@ -0,0 +1,42 @@
+import binascii
+import random
+import struct
+
+from controller.switchcontroller.frames import (FrameEncoder, button_names, full_mask, neutral_state, pack_state,
+                                                parse_buttons, parse_fields)
+
+
+def reference(hat, buttons, lx, ly, rx, ry):
+    return binascii.hexlify(struct.pack('>BHBBBB', hat, buttons, lx, ly, rx, ry)) + b'\n'
+
+
+def test_encoders_match_pack_and_hexlify():
+    rng = random.Random(30)
+    encoder = FrameEncoder()
+    for n in range(1000):
+        state = (rng.randrange(9), rng.randrange(1 << 14), rng.randrange(256), rng.randrange(256),
+                 rng.randrange(256), rng.randrange(256))
+        expected = reference(*state)
+        assert bytes(encoder.encode(*state)) == expected
+        assert bytes(encoder.encode_state(pack_state(*state))) == expected
+        assert bytes(encoder.encode_raw(b'xx' + struct.pack('>BHBBBB', *state), 2)) == expected
+
+
+def test_neutral_state():
+    assert neutral_state == reference(8, 0, 128, 128, 128, 128)
+
+
+def test_encoder_reuses_its_buffer():
+    encoder = FrameEncoder()
+    first = encoder.encode(8, 0, 128, 128, 128, 128)
+    encoder.encode(0, 4, 0, 0, 255, 255)
+    # a frame is only valid until the next call, callers that keep one copy it.
+    assert bytes(first) == reference(0, 4, 0, 0, 255, 255)
+
+
+def test_parse_buttons_and_fields():
+    assert parse_buttons('') == 0
+    assert parse_buttons('a, B,zr') == button_names['a'] | button_names['b'] | button_names['zr']
+    assert parse_fields('all') == full_mask
+    assert parse_fields('hat,rstick') == 0xff << 48 | 0xffff
+    assert parse_fields('a,lstick') == button_names['a'] << 32 | 0xffff << 16
@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+
+import sdl2
+
+from controller.switchcontroller.clock import VirtualClock
+from controller.switchcontroller.idlemode import IdleMode
+
+
+class Link(object):
+    timeout = 0.05
+
+    def __init__(self):
+        self.drained = 0
+        self.misses = 0
+
+    def drain(self):
+        self.drained += 1
+        return 0
+
+    def missed(self):
+        self.misses += 1
+
+
+def test_parks_only_after_the_state_stays_put():
+    clock = VirtualClock()
+    idle = IdleMode(after=1.0, clock=clock)
+    assert not idle.unchanged(b'08000080808080\n')
+    clock.sleep(0.6)
+    assert not idle.unchanged(b'08000080808080\n')
+    assert not idle.unchanged(b'08000480808080\n')
+    clock.sleep(1.0)
+    assert idle.unchanged(b'08000480808080\n')
+
+
+def test_a_parked_loop_watches_the_link_until_a_keypress(capsys):
+    read, write = os.pipe()
+    key = threading.Timer(0.2, os.write, (write, b'q'))
+    try:
+        idle = IdleMode(interval=0.01, stdin=read)
+        link = Link()
+        key.start()
+        idle.park(link)
+    finally:
+        key.join()
+        os.close(read)
+        os.close(write)
+    assert idle.parks == 1
+    # a silent board is reported to the watchdog every ack timeout.
+    assert link.drained > 10
+    assert link.misses >= 2
+    idle.print_stats()
+    assert 'Idle: parked 1 times' in capsys.readouterr().out
+
+
+def test_a_keypress_wakes_the_loop_without_waiting_for_the_interval():
+    sdl2.SDL_Init(sdl2.SDL_INIT_EVENTS)
+    read, write = os.pipe()
+    sent = []
+
+    def press():
+        sent.append(time.perf_counter())
+        os.write(write, b'q')
+
+    key = threading.Timer(0.05, press)
+    try:
+        idle = IdleMode(interval=1.0, stdin=read)
+        key.start()
+        idle.park(Link())
+        woken = time.perf_counter()
+    finally:
+        key.join()
+        os.close(read)
+        os.close(write)
+        sdl2.SDL_Quit()
+    assert woken - sent[0] < 0.1
+    assert not [thread for thread in threading.enumerate() if thread.name == 'idle waker']
@@ -0,0 +1,65 @@
+import os
+import socket
+import struct
+import uuid
+
+from controller.switchcontroller.clock import VirtualClock
+from controller.switchcontroller.ingest import SocketIngest
+
+state = struct.Struct('>BHBBBB')
+
+
+def frame(*fields):
+    return state.pack(*fields).hex().encode() + b'\n'
+
+
+def test_states_are_played_one_per_frame_and_held(tmp_path):
+    clock = VirtualClock()
+    path = str(tmp_path / 'ingest.sock')
+    with SocketIngest(path, hold=0.5, clock=clock) as ingest:
+        states = ingest.states()
+        assert next(states) is None
+
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        client.sendto(state.pack(8, 4, 128, 128, 128, 128) + state.pack(8, 2, 128, 128, 128, 128), path)
+        assert bytes(next(states)) == frame(8, 4, 128, 128, 128, 128)
+        assert bytes(next(states)) == frame(8, 2, 128, 128, 128, 128)
+        # the last state is held, then the source defers.
+        clock.sleep(0.4)
+        assert bytes(next(states)) == frame(8, 2, 128, 128, 128, 128)
+        clock.sleep(0.2)
+        assert next(states) is None
+        client.close()
+    assert not os.path.exists(path)
+
+
+def test_newest_datagram_wins_and_bad_ones_are_counted(tmp_path):
+    path = str(tmp_path / 'ingest.sock')
+    with SocketIngest(path, clock=VirtualClock()) as ingest:
+        states = ingest.states()
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        client.sendto(state.pack(0, 1, 0, 0, 0, 0) * 3, path)
+        client.sendto(b'\x08\x00', path)
+        client.sendto(state.pack(4, 0, 255, 255, 255, 255), path)
+        assert bytes(next(states)) == frame(4, 0, 255, 255, 255, 255)
+        stats, = ingest.clients.values()
+        assert (stats.datagrams, stats.received, stats.sent, stats.coalesced, stats.bad) == (3, 4, 1, 3, 1)
+        client.close()
+
+
+def test_stats_name_abstract_and_unbound_clients(tmp_path, capsys):
+    path = str(tmp_path / 'ingest.sock')
+    name = 'test-ingest-' + uuid.uuid4().hex[:8]
+    with SocketIngest(path, clock=VirtualClock()) as ingest:
+        states = ingest.states()
+        abstract = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        abstract.bind('\0' + name)
+        abstract.sendto(state.pack(8, 4, 128, 128, 128, 128), path)
+        unbound = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        unbound.sendto(state.pack(8, 2, 128, 128, 128, 128), path)
+        assert bytes(next(states)) == frame(8, 2, 128, 128, 128, 128)
+        abstract.close()
+        unbound.close()
+    out = capsys.readouterr().out
+    assert 'Ingest client @{:s}: 1 datagrams, 1 states received, 0 sent, 1 coalesced'.format(name) in out
+    assert 'Ingest client <unbound>: 1 datagrams' in out
@@ -0,0 +1,79 @@
+import itertools
+
+from controller.switchcontroller.clock import VirtualClock
+from controller.switchcontroller.frames import FrameEncoder, neutral_state, pack_state, parse_fields
+from controller.switchcontroller.inputstack import InputStack, StateSource
+from controller.switchcontroller.sinks import Tee
+
+
+def frames(*state):
+    line = bytes(FrameEncoder().encode(*state))
+    return itertools.repeat(line)
+
+
+def frame(*state):
+    return bytes(FrameEncoder().encode(*state))
+
+
+def test_higher_sources_win_and_covered_ones_wait():
+    with Tee() as tee, InputStack(tee) as stack:
+        counted = []
+
+        def low():
+            for n in itertools.count():
+                counted.append(n)
+                yield frame(1, 0, 10, 10, 10, 10)
+
+        stack.push(low())
+        top = stack.push(frames(2, 4, 20, 20, 20, 20), priority=1)
+        assert bytes(next(stack)) == frame(2, 4, 20, 20, 20, 20)
+        assert counted == []
+        stack.pause(top)
+        assert bytes(next(stack)) == frame(1, 0, 10, 10, 10, 10)
+        stack.resume(top)
+        # equal priorities stack LIFO.
+        stack.push(frames(3, 8, 30, 30, 30, 30), priority=1)
+        assert bytes(next(stack)) == frame(3, 8, 30, 30, 30, 30)
+        assert counted == [0]
+
+
+def test_partial_sources_merge_by_field():
+    with Tee() as tee, InputStack(tee) as stack:
+        stack.push(frames(1, 2, 10, 11, 12, 13))
+        stack.push(frames(8, 4, 50, 51, 52, 53), priority=1, mask=parse_fields('buttons,rstick'))
+        assert bytes(next(stack)) == frame(1, 4, 10, 11, 52, 53)
+
+
+def test_masked_merges_reparse_only_changed_frames():
+    encoder = FrameEncoder()
+    with Tee() as tee, InputStack(tee) as stack:
+        stack.push(frames(1, 2, 10, 11, 12, 13))
+        # an encoder's buffer, which changes in place like the ingest and macro sources.
+        source = stack.push(itertools.repeat(encoder.encode(8, 4, 50, 51, 52, 53)), priority=1, mask=parse_fields('buttons,rstick'))
+        assert bytes(next(stack)) == frame(1, 4, 10, 11, 52, 53)
+        encoder.encode(8, 8, 60, 61, 62, 63)
+        assert bytes(next(stack)) == frame(1, 8, 10, 11, 62, 63)
+
+        # a parse makes a new packed int, so an unchanged frame must keep the same one,
+        # and every merge is encoded into the stack's own buffer rather than a copy.
+        state = source.state
+        for n in range(1000):
+            assert next(stack) is stack.encoder.view
+            assert source.state is state
+        assert bytes(stack.encoder.view) == frame(1, 8, 10, 11, 62, 63)
+
+
+def test_deferring_and_finished_sources():
+    clock = VirtualClock()
+    with Tee() as tee, InputStack(tee) as stack:
+        stack.push(iter([frame(1, 0, 1, 1, 1, 1)]))
+        source = StateSource(clock=clock)
+        stack.push(source.states(), priority=1)
+        source.set(pack_state(2, 4, 128, 128, 128, 128), hold=0.1)
+        assert bytes(next(stack)) == frame(2, 4, 128, 128, 128, 128)
+        clock.sleep(0.2)
+        assert bytes(next(stack)) == frame(1, 0, 1, 1, 1, 1)
+        # the one below has finished, so nothing is left to say.
+        assert bytes(next(stack)) == neutral_state
+        source.set(pack_state(3, 0, 128, 128, 128, 128))
+        assert bytes(next(stack)) == frame(3, 0, 128, 128, 128, 128)
@@ -0,0 +1,77 @@
+import os
+import select
+import threading
+import time
+from contextlib import ExitStack
+
+import pytest
+
+termios = pytest.importorskip('termios')
+
+from controller.switchcontroller.lockstep import LockstepPlayer
+from controller.switchcontroller.seriallink import SerialWatchdog
+
+
+def board(period, received):
+    """A board on a pty that acks every `period` seconds, like the firmware."""
+    import pty
+    import tty
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(period):
+            try:
+                while select.select([master], [], [], 0)[0]:
+                    received.extend(os.read(master, 4096))
+                os.write(master, b'U')
+            except OSError:
+                return
+
+    threading.Thread(target=run, daemon=True).start()
+    return os.ttyname(slave), stop
+
+
+@pytest.mark.parametrize('tolerance', [0, 2])
+def test_boards_play_every_frame_in_step(tmp_path, capsys, tolerance):
+    frames = [b'0800%02x80808080\n' % n for n in range(40)]
+    path = tmp_path / 'play.txt'
+    path.write_bytes(b''.join(frames))
+    received = [bytearray(), bytearray()]
+    ports = [board(0.004, received[0]), board(0.012, received[1])]
+    try:
+        with ExitStack() as stack:
+            links = [stack.enter_context(SerialWatchdog(port, 115200, timeout=0.5)) for port, stop in ports]
+            player = LockstepPlayer(str(path), links, tolerance=tolerance)
+            player.run()
+            # let the boards read the last frame.
+            time.sleep(0.05)
+    finally:
+        for port, stop in ports:
+            stop.set()
+
+    for data in received:
+        assert bytes(data) == b''.join(frames)
+    # the fast board waited for the slow one.
+    assert player.stalls[0] > 0
+    # a board holds once it is more than `tolerance` frames ahead.
+    assert max(player.max_lead) == tolerance + 1
+
+
+class Link(object):
+    def __init__(self):
+        self.frames = []
+
+    def write(self, message):
+        self.frames.append(message)
+
+
+def test_the_slowest_board_always_advances(tmp_path):
+    path = tmp_path / 'play.txt'
+    path.write_bytes(b''.join(b'0800%02x80808080\n' % n for n in range(5)))
+    player = LockstepPlayer(str(path), [Link(), Link()], tolerance=0)
+    for n in (0, 0, 1, 1, 1, 0):
+        player.advance(n)
+    assert player.positions == [2, 2]
+    assert player.stalls == [1, 1]
@@ -0,0 +1,23 @@
+import numpy as np
+
+from controller.switchcontroller.frames import FrameEncoder
+from controller.switchcontroller.macros import build_macro, macro_states
+
+
+def test_macro_table_matches_the_encoder():
+    rng = np.random.default_rng(33)
+    steps = 200
+    hats = rng.integers(0, 9, steps)
+    buttons = rng.integers(0, 1 << 14, steps)
+    axes = rng.integers(0, 256, (steps, 4))
+    durations = rng.integers(0, 4, steps)
+
+    encoder = FrameEncoder()
+    expected = []
+    for n in range(steps):
+        line = bytes(encoder.encode(int(hats[n]), int(buttons[n]), *(int(v) for v in axes[n])))
+        expected.extend([line] * int(durations[n]))
+
+    table = build_macro(hats, buttons, axes, durations)
+    assert table.shape == (sum(durations), 15)
+    assert [bytes(line) for line in macro_states(table)] == expected
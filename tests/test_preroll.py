@@ -0,0 +1,47 @@
+import io
+
+from controller.switchcontroller.preroll import PreRoll
+
+
+def line(n):
+    return b'0800%02x80808080\n' % n
+
+
+def test_ring_keeps_the_newest_frames_oldest_first():
+    preroll = PreRoll(seconds=1, rate=4)
+    for n in range(3):
+        preroll.write(line(n))
+    f = io.BytesIO()
+    assert preroll.save(f) == 3
+    assert f.getvalue() == line(0) + line(1) + line(2)
+
+    for n in range(3, 10):
+        preroll.write(line(n))
+    f = io.BytesIO()
+    assert preroll.save(f) == 4
+    assert f.getvalue() == b''.join(line(n) for n in range(6, 10))
+
+
+def test_crlf_frames_are_kept_and_bad_ones_counted(capsys):
+    preroll = PreRoll(seconds=1, rate=4)
+    preroll.write(line(1)[:-1] + b'\r\n')
+    preroll.write(b'0800\n')
+    f = io.BytesIO()
+    assert preroll.save(f) == 1
+    assert f.getvalue() == line(1)
+    preroll.close()
+    assert 'dropped 1 frames' in capsys.readouterr().out
+
+
+def test_replay_plays_a_snapshot_until_replayed_again():
+    preroll = PreRoll(seconds=1, rate=4)
+    for n in range(6):
+        preroll.write(line(n))
+    first = preroll.replay()
+    assert bytes(next(first)) == line(2)
+    # frames written meanwhile don't change what is being replayed.
+    preroll.write(line(6))
+    assert bytes(next(first)) == line(3)
+    second = preroll.replay()
+    assert [bytes(view) for view in second] == [line(n) for n in range(3, 7)]
+    assert list(first) == []
@@ -0,0 +1,64 @@
+from controller.switchcontroller.clock import VirtualClock
+from controller.switchcontroller.pressengine import PressEngine
+from controller.switchcontroller.scheduler import Scheduler
+
+
+class Controller(object):
+    def __init__(self):
+        self.a = 0
+        self.b = 0
+        self.dpad = 8
+        self.output = None
+        self.sent = []
+
+    def getOutput(self):
+        self.output = (self.dpad, self.a, self.b)
+
+    def send(self, output):
+        self.sent.append(output)
+
+
+def run_until(scheduler, seconds):
+    scheduler.after(seconds - scheduler.clock.monotonic(), scheduler.stop)
+    scheduler.run()
+
+
+def test_a_release_leaves_a_newer_press_alone():
+    scheduler = Scheduler(VirtualClock())
+    engine = PressEngine(scheduler)
+    controller = Controller()
+    assert engine.press(controller, [("a", 1)], 0.5) == 0.5
+    run_until(scheduler, 0.2)
+    engine.press(controller, [("a", 1)], 0.5)
+    run_until(scheduler, 0.6)
+    # the first press ended at 0.5 s, but the second still holds a.
+    assert controller.a == 1
+    run_until(scheduler, 0.8)
+    assert controller.a == 0
+    assert controller.sent == [(8, 1, 0), (8, 1, 0), (8, 0, 0)]
+    assert engine.pending == 0
+
+
+def test_presses_on_different_fields_overlap():
+    scheduler = Scheduler(VirtualClock())
+    engine = PressEngine(scheduler)
+    controller = Controller()
+    engine.press(controller, [("a", 1)], 0.5)
+    engine.press(controller, [("b", 1)], 0.2)
+    run_until(scheduler, 0.3)
+    assert (controller.a, controller.b) == (1, 0)
+    run_until(scheduler, 0.6)
+    assert controller.sent == [(8, 1, 0), (8, 1, 1), (8, 1, 0), (8, 0, 0)]
+
+
+def test_held_steps_are_released_with_the_move_that_resets():
+    scheduler = Scheduler(VirtualClock())
+    engine = PressEngine(scheduler, neutral=Controller())
+    controller = Controller()
+    engine.press(controller, [("dpad", 0)], 0.1, reset=0)
+    run_until(scheduler, 0.5)
+    assert controller.dpad == 0
+    engine.press(controller, [("a", 1)], 0.1, output="prebuilt")
+    run_until(scheduler, 0.7)
+    assert (controller.dpad, controller.a) == (8, 0)
+    assert controller.sent == [(0, 0, 0), "prebuilt", (8, 0, 0)]
@@ -0,0 +1,41 @@
+import time
+
+from controller.switchcontroller.profiler import Profiler, stage_encode, stage_input, stage_names
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_stage_timers_split_the_loop(capsys):
+    with Profiler('stages', frames=3) as profiler:
+        while True:
+            busy(0.001)
+            profiler.stages.lap(stage_input)
+            busy(0.003)
+            profiler.stages.lap(stage_encode)
+            if profiler.count():
+                break
+    totals = profiler.stages.totals
+    assert totals[stage_encode] > totals[stage_input] > 0
+    out = capsys.readouterr().out
+    assert 'Stage timers over 3 frames:' in out
+    assert all(name in out for name in stage_names)
+
+
+def test_sampler_sees_the_main_thread(tmp_path, capsys):
+    path = tmp_path / 'profile.txt'
+    with Profiler('sample', output=str(path), interval=0.001):
+        for n in range(50):
+            time.sleep(0.002)
+    summary = path.read_text()
+    assert 'test_sampler_sees_the_main_thread' in summary
+    assert 'Profile written to' in capsys.readouterr().out
+
+
+def test_no_profile_never_stops_the_loop(capsys):
+    with Profiler(None, frames=1) as profiler:
+        assert not any(profiler.count() for n in range(5))
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,70 @@
+import random
+import threading
+import time
+
+from controller.switchcontroller.remote import RemoteIngest, remote_frames, remote_header, remote_packet, remote_send
+
+
+def frames(session, count):
+    # ly tells the sessions apart, lx counts up so the order can be checked.
+    return [b'080000%02x%02x8080\n' % (n, session) for n in range(count)]
+
+
+def test_remote_send_through_loss_jitter_and_restart():
+    random.seed(43)
+    with RemoteIngest(('127.0.0.1', 0), hold=0.5) as ingest:
+        address = ingest.sock.getsockname()
+        first, second = frames(0x10, 150), frames(0x20, 150)
+
+        def send():
+            remote_send(address, first, loss=0.1, jitter=0.01)
+            # restarted well within `hold`, numbering from 1 again.
+            remote_send(address, second, loss=0.1, jitter=0.01)
+
+        sender = threading.Thread(target=send)
+        sender.start()
+        played = []
+        states = ingest.states()
+        end = None
+        while end is None or time.monotonic() < end:
+            frame = next(states)
+            played.append(None if frame is None else bytes(frame))
+            if end is None and not sender.is_alive():
+                end = time.monotonic() + 1.0
+            time.sleep(0.008)
+        sender.join()
+
+    sent = [frame for frame in played if frame is not None]
+    # nothing from the first run after the second one started.
+    switch = next(n for n, frame in enumerate(sent) if frame in second)
+    assert set(sent[:switch]) <= set(first)
+    assert set(sent[switch:]) <= set(second)
+    # each run plays in order, with repeats for frames that were lost.
+    for run in (sent[:switch], sent[switch:]):
+        lx = [int(frame[6:8], 16) for frame in run]
+        assert lx == sorted(lx)
+    # the restart didn't leave the second run counted as late.
+    assert len(set(sent[switch:])) >= 0.9 * len(second)
+    assert sent[-1] == second[-1]
+    assert ingest.stats.restarts == 1
+    # and the source defers again once the sender is gone.
+    assert played[-1] is None
+
+
+def test_late_packets_do_not_keep_remote_play_alive():
+    ingest = RemoteIngest(('127.0.0.1', 0), hold=0.5)
+    frame = bytes.fromhex('08000080808080')
+    ingest.receive(remote_packet(1, 5, 0, [frame]), 0)
+    ingest.play_seq = 5
+    received = ingest.last_time
+    ingest.receive(remote_packet(1, 4, 0, [frame]), 0)
+    assert ingest.stats.late == 1
+    assert ingest.last_time == received
+
+
+def test_packets_carry_only_the_changed_bytes():
+    frames = [bytes.fromhex('08000080808080'), bytes.fromhex('08000480808080'), bytes.fromhex('02000400ff8080')]
+    packet = remote_packet(7, 12, 345, frames)
+    # a mask byte per frame, then nothing changed from neutral, then one byte, then three.
+    assert len(packet) == remote_header.size + 3 + 0 + 1 + 3
+    assert remote_frames(packet) == (7, 12, 345, frames)
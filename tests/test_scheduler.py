@@ -0,0 +1,63 @@
+import socket
+
+from controller.switchcontroller.clock import VirtualClock
+from controller.switchcontroller.scheduler import Scheduler
+
+
+def test_repeating_timers_keep_their_phase():
+    clock = VirtualClock()
+    scheduler = Scheduler(clock)
+    ticks = []
+
+    def tick():
+        ticks.append(clock.monotonic_ns())
+        # work that takes a while doesn't push the next tick back.
+        clock.sleep(0.003)
+
+    timer = scheduler.every(0.1, tick)
+    for n in range(1000):
+        scheduler.run_once()
+    # due times are float seconds, virtual sleeps round up to the next ns, and that's all the error there is.
+    assert all(abs(tick - n * 100000000) <= 1 for n, tick in enumerate(ticks, 1))
+    assert timer.runs == 1000
+    assert timer.late_max <= 2e-9
+
+
+def test_missed_runs_are_skipped_not_bunched():
+    clock = VirtualClock()
+    scheduler = Scheduler(clock)
+    ticks = []
+    scheduler.every(0.1, lambda: ticks.append(clock.monotonic_ns()))
+    scheduler.after(0.15, lambda: clock.sleep(0.32))
+    for n in range(5):
+        scheduler.run_once()
+    # the stall from 0.15 to 0.47 s makes the 0.2 s tick late and swallows the ones
+    # at 0.3 and 0.4 s, then the ticks are back on the 0.1 s grid.
+    assert [round(tick, -3) for tick in ticks] == [100000000, 470000000, 500000000, 600000000]
+
+
+def test_one_shots_run_in_order_and_can_be_cancelled():
+    clock = VirtualClock()
+    scheduler = Scheduler(clock)
+    order = []
+    scheduler.after(0.2, lambda: order.append("late"))
+    scheduler.after(0.1, lambda: order.append("early"))
+    scheduler.after(0.1, lambda: order.append("early too"))
+    scheduler.after(0.15, lambda: order.append("cancelled")).cancel()
+    scheduler.after(0.3, scheduler.stop)
+    scheduler.run()
+    assert order == ["early", "early too", "late"]
+    assert clock.monotonic() == 0.3
+
+
+def test_readable_sockets_are_dispatched():
+    scheduler = Scheduler()
+    a, b = socket.socketpair()
+    received = []
+    scheduler.watch(a, lambda: received.append(a.recv(16)))
+    b.send(b"hello")
+    scheduler.run_once(max_wait=1)
+    scheduler.unwatch(a)
+    a.close()
+    b.close()
+    assert received == [b"hello"]
@@ -0,0 +1,101 @@
+from controller.switchcontroller.clock import VirtualClock
+from controller.switchcontroller.seriallink import FirmwareEmulator, SerialWatchdog
+
+
+def test_emulator_acks_every_poll_and_applies_whole_lines():
+    clock = VirtualClock()
+    board = FirmwareEmulator(timeout=0.05, clock=clock)
+    assert board.read(1) == b'U'
+    assert board.polls == 1
+    clock.sleep(0.02)
+    assert board.in_waiting == 2
+
+    board.write(b'08000480808080\n')
+    assert bytes(board.state) == bytes.fromhex('08000480808080')
+    # a line of the wrong length is dropped, the last whole one stays.
+    board.write(b'0800\n')
+    assert bytes(board.state) == bytes.fromhex('08000480808080')
+    board.write(b'0f0000ff00ff0003\n')
+    board.reset_input_buffer()
+    assert board.read(3) == b'S03'
+
+
+def test_watchdog_counts_sequenced_frames(capsys):
+    clock = VirtualClock()
+    with SerialWatchdog('emulated', 115200, sequenced=True, emulate=True, clock=clock) as link:
+        for n in range(5):
+            link.write(b'08000080808080\n')
+            assert link.wait_ack()
+        link.wait_ack()
+    assert (link.sent, link.applied, link.lost) == (5, 5, 0)
+    assert link.latency_max <= 8000000
+    assert 'Emulated' in capsys.readouterr().out
+
+
+def test_missed_acks_resync_without_reopening():
+    with SerialWatchdog('emulated', 115200, attempts=1, emulate=True, clock=VirtualClock()) as link:
+        link.write(b'08000280808080\n')
+        for n in range(3):
+            link.missed()
+        assert (link.resyncs, link.reopens) == (3, 0)
+        assert link.outage_start is not None
+        assert link.wait_ack()
+        assert link.outage_start is None and len(link.outages) == 1
+        assert bytes(link.ser.state) == bytes.fromhex('08000280808080')
+
+        link.cancel()
+        assert not link.wait_ack()
+
+
+class FlakyPort(object):
+    """A port that opens fine, then fails its first `failures` writes."""
+
+    def __init__(self, failures, reads=()):
+        self.failures = failures
+        self.reads = list(reads)
+
+    def write(self, data):
+        if self.failures:
+            self.failures -= 1
+            raise OSError('write failed')
+        return len(data)
+
+    def read(self, size=1):
+        result = self.reads.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def reset_input_buffer(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FlakyWatchdog(SerialWatchdog):
+    def __init__(self, ports, **kwargs):
+        SerialWatchdog.__init__(self, 'flaky', 115200, max_backoff=0.01, clock=VirtualClock(), **kwargs)
+        self.ports = ports
+
+    def open(self):
+        self.ser = self.ports.pop(0)
+
+
+def test_a_port_that_fails_every_write_is_reopened_without_recursing():
+    # far more failed reopens than the recursion limit allows.
+    link = FlakyWatchdog([FlakyPort(0)] + [FlakyPort(1) for n in range(3000)] + [FlakyPort(0)])
+    link.open()
+    link.resync()
+    assert link.resyncs == 1
+    link.ser.failures = 1
+    link.resync()
+    assert (link.reopens, link.resyncs) == (3001, 2)
+    assert not link.ports
+
+
+def test_an_unplug_inside_a_sequenced_ack_reopens_the_port():
+    link = FlakyWatchdog([FlakyPort(0, [b'S', OSError('unplugged')]), FlakyPort(0, [b'U'])])
+    link.open()
+    assert link.wait_ack()
+    assert link.reopens == 1
@@ -0,0 +1,58 @@
+import threading
+
+from controller.switchcontroller.serialwriter import SerialWriter
+
+
+class GatedPort(object):
+    """A port that holds up each write until let through, failing the ones it is told to."""
+
+    def __init__(self, failures=()):
+        self.port = 'gated'
+        self.failures = set(failures)
+        self.written = []
+        self.entered = threading.Semaphore(0)
+        self.gate = threading.Semaphore(0)
+
+    def write(self, data):
+        self.entered.release()
+        self.gate.acquire()
+        if data in self.failures:
+            raise OSError('write failed')
+        self.written.append(data)
+        return len(data)
+
+
+def test_lines_sent_while_the_port_is_busy_are_replaced_by_the_latest():
+    port = GatedPort()
+    writer = SerialWriter(port)
+    writer.send(b'0\n')
+    # the writer is stuck in the first write, so only the last of these is kept.
+    port.entered.acquire()
+    for line in (b'1\n', b'2\n', b'3\n'):
+        writer.send(line)
+    for n in range(2):
+        port.gate.release()
+    port.entered.acquire()
+    writer.close()
+    assert port.written == [b'0\n', b'3\n']
+    stats = writer.stats()
+    assert (stats['writes'], stats['replaced'], stats['errors']) == (2, 2, 0)
+    assert stats['latency_max'] >= stats['latency_mean'] > 0
+    assert writer.summary().startswith('gated: 2 writes, 2 replaced, 0 errors')
+    assert not writer.thread.is_alive()
+
+
+def test_a_failed_write_is_counted_and_the_writer_carries_on():
+    port = GatedPort(failures=[b'bad\n'])
+    writer = SerialWriter(port, name='flaky')
+    writer.send(b'bad\n')
+    port.entered.acquire()
+    port.gate.release()
+    writer.send(b'good\n')
+    port.entered.acquire()
+    port.gate.release()
+    writer.close()
+    assert port.written == [b'good\n']
+    assert (writer.writes, writer.errors) == (1, 1)
+    assert isinstance(writer.lastError, OSError)
+    assert writer.thread.name == 'writer flaky'
@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+from controller.switchcontroller.sinks import NullSink, Tee, ThreadedSink, add_sink
+
+
+class GatedSink(object):
+    """Records what it is sent, and holds up each write until let through."""
+
+    def __init__(self):
+        self.written = []
+        self.entered = threading.Semaphore(0)
+        self.gate = threading.Semaphore(0)
+
+    def write(self, message):
+        self.entered.release()
+        self.gate.acquire()
+        self.written.append(bytes(message))
+
+    def close(self):
+        pass
+
+
+def test_tee_writes_the_same_frame_everywhere(tmp_path, capsys):
+    path = tmp_path / 'out.txt'
+    frame = bytearray(b'08000080808080\n')
+    with Tee() as tee:
+        files = add_sink(tee, 'file:' + str(path))
+        nulls = add_sink(tee, 'null@drop')
+        tee.write(frame)
+        frame[5] = ord('4')
+        tee.write(frame)
+    assert path.read_bytes() == b'08000080808080\n08000480808080\n'
+    assert files.stats.written == 2
+    assert nulls.policy == 'drop'
+    assert 'Sink file:' in capsys.readouterr().out
+
+    with pytest.raises(Exception):
+        Tee().add(NullSink(), 'null', 'sometimes')
+
+
+@pytest.mark.parametrize('policy, kept', [('drop', b'1'), ('latest', b'3')])
+def test_threaded_sinks_shed_frames_by_policy(policy, kept):
+    sink = GatedSink()
+    stage = ThreadedSink(sink, 'gated', policy)
+    stage.write(b'0')
+    # the worker is busy with the first frame, so only one more fits.
+    sink.entered.acquire()
+    for n in b'123':
+        stage.write(bytes([n]))
+    for n in range(2):
+        sink.gate.release()
+    stage.close()
+    assert sink.written == [b'0', kept]
+    assert (stage.stats.written, stage.stats.dropped) == (2, 2)
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+import uuid
+
+from controller.switchcontroller.statebus import StateBus, bus_state, neutral_state
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# every byte of a published state is the same, so a torn copy shows up as a mix.
+publisher = '''
+import sys
+from controller.switchcontroller.statebus import StateBus, bus_state
+with StateBus(sys.argv[1]) as bus:
+    for n in range(int(sys.argv[2])):
+        bus.publish(1, bytes([n & 0xff]) * bus_state.size)
+'''
+
+
+def test_readers_never_see_a_torn_state():
+    name = 'test-bus-' + uuid.uuid4().hex[:8]
+    with StateBus(name, slots=2, create=True) as bus:
+        out = bytearray(bus_state.size)
+        assert bus.read(1, out) == 0 and out == neutral_state
+
+        # another process, like a real frontend, so the publisher runs alongside the reader.
+        writer = subprocess.Popen([sys.executable, '-c', publisher, name, '200000'], cwd=root)
+        last = reads = 0
+        while writer.poll() is None or reads == 0:
+            before = bytes(out)
+            seq = bus.read(1, out)
+            assert seq >= last, (seq, last)
+            if seq & 1:
+                # the publisher was stopped mid-write for every retry, out is left alone.
+                assert out == before
+            elif seq:
+                assert len(set(out)) == 1, out.hex()
+            last = seq
+            reads += 1
+        assert writer.returncode == 0
+        assert bus.read(1, out) == 400000 and out == bytes([199999 & 0xff]) * bus_state.size
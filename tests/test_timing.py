@@ -0,0 +1,36 @@
+import pytest
+
+from controller.switchcontroller.timing import analyze_timing, read_timing, timing_header, timing_magic, timing_record, timing_version
+
+
+def sidecar(path, records):
+    with open(path, 'wb') as f:
+        f.write(timing_header.pack(timing_magic, timing_version))
+        for write_ns, ack_ns in records:
+            f.write(timing_record.pack(write_ns, ack_ns))
+    return str(path)
+
+
+def test_missed_polls_and_gaps_are_reported(tmp_path, capsys):
+    period = 8000000
+    acks = [n * period for n in range(1, 11)] + [13 * period, 14 * period]
+    path = sidecar(tmp_path / 'run.timing', [(ack - 1000000, ack) for ack in acks])
+    assert read_timing(path)[0] == (7000000, 8000000)
+
+    analyze_timing(path, worst=1)
+    out = capsys.readouterr().out
+    assert '12 frames' in out
+    assert 'nominal period 8.000 ms' in out
+    assert 'Write to ack: mean 1.000 ms' in out
+    assert 'Missed polls: 2.' in out
+    assert 'frame 10: 24.000 ms' in out
+
+
+def test_other_files_are_refused(tmp_path, capsys):
+    path = tmp_path / 'run.txt'
+    path.write_bytes(b'080000808080\n' * 4)
+    with pytest.raises(Exception):
+        read_timing(str(path))
+
+    analyze_timing(sidecar(tmp_path / 'short.timing', [(0, 1)]))
+    assert 'Not enough frames' in capsys.readouterr().out
@@ -0,0 +1,76 @@
+import asyncio
+import importlib.util
+import json
+import os
+import sys
+
+from websockets.asyncio.client import connect
+from websockets.asyncio.server import serve
+
+from controller.switchcontroller.clock import VirtualClock
+from controller.switchcontroller.statebus import bus_state, neutral_state
+
+# websocket-server.py imports switchcontroller the way the other controller scripts do.
+controller = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'controller')
+sys.path.insert(0, controller)
+spec = importlib.util.spec_from_file_location('websocket_server', os.path.join(controller, 'websocket-server.py'))
+websocket_server = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(websocket_server)
+
+
+class Bus(object):
+    def __init__(self):
+        self.published = []
+
+    def publish(self, slot, state):
+        self.published.append((slot, bytes(state)))
+
+
+def test_token_bucket_allows_bursts_then_the_rate(monkeypatch):
+    clock = VirtualClock()
+    monkeypatch.setattr(websocket_server, 'clock', clock)
+    player = websocket_server.Player(1, None, rate=10, burst=3)
+    assert [player.allow(0) for n in range(4)] == [True, True, True, False]
+    # one token back every tenth of a second, never more than the burst.
+    assert player.allow(0.1)
+    assert not player.allow(0.15)
+    assert [player.allow(10) for n in range(4)] == [True, True, True, False]
+
+
+async def receive_turn(websocket):
+    while True:
+        message = json.loads(await asyncio.wait_for(websocket.recv(), 5))
+        if 'turn' in message:
+            return message
+
+
+async def play_turns():
+    bus = Bus()
+    server = websocket_server.InputServer(bus, slots=2, turn_length=30, forfeit=10)
+    async with serve(server.handler, '127.0.0.1', 0) as ws_server:
+        url = 'ws://127.0.0.1:{:d}/'.format(ws_server.sockets[0].getsockname()[1])
+        turns = asyncio.ensure_future(server.turns(interval=0.01))
+        async with connect(url) as first, connect(url) as second:
+            await first.send(json.dumps({'queue': 1}))
+            assert await receive_turn(first) == {'turn': 1, 'seconds': 30}
+            await second.send(json.dumps({'queue': 1}))
+            await first.send(bus_state.pack(8, 4, 128, 128, 128, 128))
+            # only the player whose turn it is drives the slot.
+            await second.send(bus_state.pack(8, 2, 128, 128, 128, 128))
+
+            await first.send(json.dumps({'leave': True}))
+            assert await receive_turn(second) == {'turn': 1, 'seconds': 30}
+            await second.send(bus_state.pack(8, 8, 128, 128, 128, 128))
+            await first.send(bus_state.pack(8, 1, 128, 128, 128, 128))
+            await asyncio.sleep(0.05)
+        turns.cancel()
+    return server, bus
+
+
+def test_turns_hand_over_and_only_the_owner_drives_a_slot():
+    server, bus = asyncio.run(play_turns())
+    assert bus.published == [(1, bus_state.pack(8, 4, 128, 128, 128, 128)), (1, neutral_state),
+                             (1, bus_state.pack(8, 8, 128, 128, 128, 128)), (1, neutral_state)]
+    stats = server.stats
+    assert (stats.turns, stats.applied, stats.not_owner, stats.limited) == (2, 2, 2, 0)
+    assert not server.tasks